@@ -7,19 +7,59 @@ Date: 21 Janvier 2026
 """
 
 import os
+import csv
+import io
 import json
 import uuid
 import re
-from datetime import datetime
+import atexit
+import bisect
+import codecs
+import glob
+import hashlib
+import multiprocessing
+import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from decimal import Decimal
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, suppress
+from datetime import date, datetime, time as time_of_day
 from pathlib import Path
 from functools import wraps
 
+import chardet
+import httpx
+import numpy as np
+import orjson
 import pandas as pd
-from flask import Flask, request, jsonify, send_file
+import pyarrow as pa
+import pyarrow.compute as pc
+from chardet.universaldetector import UniversalDetector
+from flask import Flask, Request, request, jsonify, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
+from postgrest.exceptions import APIError, generate_default_error_message
+from postgrest.types import ReturnMethod
+from postgrest.utils import SyncClient
 from supabase import create_client, Client
 
+try:
+    import psycopg
+except ImportError:  # Dépendance optionnelle: chargeur COPY indisponible
+    psycopg = None
+
+try:
+    import python_calamine
+except ImportError:  # Dépendance optionnelle: lecteur Excel calamine indisponible
+    python_calamine = None
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -44,6 +84,142 @@ CORS(app, resources={
 ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
 MAX_PREVIEW_ROWS = 10
 
+# Formats de date essayés dans l'ordre par parse_date
+DATE_FORMATS = [
+    '%Y-%m-%d',      # ISO: 2026-01-21
+    '%d/%m/%Y',      # FR: 21/01/2026
+    '%d/%m/%y',      # FR court: 21/01/26
+    '%m/%d/%Y',      # US: 01/21/2026
+    '%Y/%m/%d',      # ISO alternatif
+    '%d-%m-%Y',      # FR avec tirets
+    '%d.%m.%Y',      # Format allemand
+]
+
+# Formats date + heure essayés dans l'ordre par parse_datetime
+DATETIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%d-%m-%Y %H:%M:%S',
+]
+
+# Nombre de valeurs distinctes examinées pour déduire le format d'une colonne date
+DATE_INFERENCE_SAMPLE = 1000
+
+# Valeurs non vides examinées par colonne pour détecter les colonnes
+# date + heure à séparer (split_datetime)
+DATETIME_DETECTION_SAMPLE = int(os.getenv('DATETIME_DETECTION_SAMPLE', 100))
+
+# Inférence des types SQL: lignes examinées par colonne pour /api/process
+# (import_create examine toute la colonne) et part minimale de valeurs
+# convertibles pour retenir un type autre que TEXT
+TYPE_INFERENCE_SAMPLE = int(os.getenv('TYPE_INFERENCE_SAMPLE', 10000))
+TYPE_INFERENCE_MIN_CONFIDENCE = float(os.getenv('TYPE_INFERENCE_MIN_CONFIDENCE', 1.0))
+
+# Origine des dates série Excel
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# Dialecte des CSV: octets examinés pour le détecter, et moteur Pandas des
+# lectures complètes ('c', ou 'pyarrow': plus rapide, mais convertit les
+# dates ISO en objets date). Les lectures par morceaux utilisent toujours 'c'.
+CSV_SNIFF_BYTES = int(os.getenv('CSV_SNIFF_BYTES', 65536))
+CSV_ENGINE = os.getenv('CSV_ENGINE', 'c')
+
+# Lecteur Excel des lectures complètes: 'auto' (selon le type et la taille du
+# fichier), ou imposé: 'calamine', 'openpyxl' (lecture seule), 'xlrd' (XLS).
+# Au-delà de EXCEL_STREAM_BYTES, auto préfère openpyxl en lecture seule:
+# environ 6x plus lent que calamine, mais avec un pic mémoire 1,6x plus bas.
+EXCEL_ENGINE = os.getenv('EXCEL_ENGINE', 'auto')
+EXCEL_STREAM_BYTES = int(os.getenv('EXCEL_STREAM_BYTES', 20971520))
+
+# Cache des DataFrames parsés (budget mémoire en octets, par worker)
+PARSE_CACHE_MAX_BYTES = int(os.getenv('PARSE_CACHE_MAX_BYTES', 268435456))
+
+# Aperçu paginé: lignes par record batch des instantanés Arrow, taille max
+# d'une page, et nombre de vues filtrées/triées gardées en mémoire
+SNAPSHOT_BATCH_ROWS = int(os.getenv('SNAPSHOT_BATCH_ROWS', 65536))
+PREVIEW_PAGE_MAX_ROWS = int(os.getenv('PREVIEW_PAGE_MAX_ROWS', 1000))
+SNAPSHOT_VIEW_CACHE_SIZE = 16
+
+# Mémoïsation de la normalisation: résultats gardés par règle (valeurs
+# distinctes) et part max de valeurs distinctes pour passer par factorize
+NORMALIZE_MEMO_SIZE = int(os.getenv('NORMALIZE_MEMO_SIZE', 100000))
+NORMALIZE_MEMO_MAX_RATIO = 0.5
+
+# Import en flux: taille des morceaux lus et seuil d'activation automatique
+STREAM_CHUNK_ROWS = int(os.getenv('STREAM_CHUNK_ROWS', 10000))
+STREAM_AUTO_BYTES = int(os.getenv('STREAM_AUTO_BYTES', 20971520))
+
+# Import multi-onglets: processus de lecture/normalisation en parallèle
+SHEET_WORKERS = int(os.getenv('SHEET_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Insertion Supabase: taille initiale des batches, requêtes simultanées,
+# et cibles de taille (octets JSON) / latence servant à ajuster les batches
+IMPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_MIN_ROWS = 100
+IMPORT_BATCH_MAX_ROWS = int(os.getenv('IMPORT_BATCH_MAX_ROWS', 5000))
+IMPORT_CONCURRENCY = int(os.getenv('IMPORT_CONCURRENCY', 4))
+IMPORT_BATCH_TARGET_BYTES = int(os.getenv('IMPORT_BATCH_TARGET_BYTES', 2097152))
+IMPORT_BATCH_TARGET_SECONDS = float(os.getenv('IMPORT_BATCH_TARGET_SECONDS', 2.0))
+
+# Nouvelles tentatives d'un batch en échec transitoire (réseau, 5xx, verrous),
+# avec un délai exponentiel à partir de IMPORT_RETRY_BASE_DELAY secondes
+IMPORT_MAX_RETRIES = int(os.getenv('IMPORT_MAX_RETRIES', 3))
+IMPORT_RETRY_BASE_DELAY = float(os.getenv('IMPORT_RETRY_BASE_DELAY', 0.5))
+
+# Base d'état locale (jobs, etc.), par défaut dans le volume des uploads
+STATE_DB_PATH = os.getenv('STATE_DB_PATH') or os.path.join(app.config['UPLOAD_FOLDER'], '.state', 'rms_sync.db')
+
+# File de jobs d'import: threads par worker, attente entre deux scrutations,
+# délai sans nouvelles au-delà duquel un job 'running' est considéré abandonné
+# et intervalle du signal de vie d'un job en cours (même sans progression)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 1))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 1.0))
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', 600))
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', 30.0))
+JOB_PROGRESS_INTERVAL = 1.0
+
+# Pool de connexions HTTP du client Supabase partagé (par worker): connexions
+# max, connexions gardées ouvertes et durée de vie d'une connexion inactive (s)
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv('SUPABASE_POOL_MAX_CONNECTIONS', 20))
+SUPABASE_POOL_KEEPALIVE = int(os.getenv('SUPABASE_POOL_KEEPALIVE', 10))
+SUPABASE_KEEPALIVE_SECONDS = float(os.getenv('SUPABASE_KEEPALIVE_SECONDS', 60.0))
+
+# Durée de vie (s) du cache du schéma Supabase (tables et colonnes)
+SCHEMA_CACHE_TTL = int(os.getenv('SCHEMA_CACHE_TTL', 300))
+# Lignes demandées par page à get_all_columns_with_types(): au plus le
+# max-rows de PostgREST (1000 sur Supabase), qui tronque sans erreur
+SCHEMA_PAGE_ROWS = int(os.getenv('SCHEMA_PAGE_ROWS', 1000))
+
+# Taille des blocs lus et hashés pendant l'enregistrement d'un upload (octets)
+UPLOAD_CHUNK_BYTES = int(os.getenv('UPLOAD_CHUNK_BYTES', 1048576))
+
+# Réception en flux des uploads: octets analysés par chardet pour détecter
+# l'encodage, et début du fichier gardé pour lire l'en-tête et l'aperçu CSV
+UPLOAD_ENCODING_SAMPLE = int(os.getenv('UPLOAD_ENCODING_SAMPLE', 65536))
+UPLOAD_HEAD_BYTES = int(os.getenv('UPLOAD_HEAD_BYTES', 65536))
+
+# Durée de vie (s) du cache des templates d'import
+TEMPLATE_CACHE_TTL = int(os.getenv('TEMPLATE_CACHE_TTL', 300))
+
+# Chargement direct Postgres (mode Create): chaîne de connexion (désactivé si
+# vide), format COPY ('csv' ou 'binary') et lignes envoyées par écriture
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+COPY_FORMAT = os.getenv('COPY_FORMAT', 'csv')
+COPY_CHUNK_ROWS = int(os.getenv('COPY_CHUNK_ROWS', 50000))
+
+# Métriques (/api/metrics): dernières observations gardées par série pour
+# calculer les quantiles de latence (p50, p95)
+METRICS_WINDOW = int(os.getenv('METRICS_WINDOW', 1000))
+
+# Observations gardées en mémoire par chaque worker et écrites dans la base
+# d'état toutes les METRICS_FLUSH_SECONDS secondes, ou dès que
+# METRICS_FLUSH_SIZE sont en attente
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 10))
+METRICS_FLUSH_SIZE = int(os.getenv('METRICS_FLUSH_SIZE', 500))
+
 # ============================================================================
 # ROUTES STATIQUES
 # ============================================================================
@@ -68,15 +244,84 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+# Client Supabase partagé par tous les threads d'un processus. Les workers
+# Gunicorn forkés reconstruisent le leur (les sockets ne se partagent pas).
+_supabase_lock = threading.Lock()
+_supabase_pool = {'pid': None, 'config': None, 'client': None, 'created_at': None}
+_supabase_stats = {'created': 0, 'reused': 0, 'rebuilt': 0}
+
+
+def _build_supabase_client(supabase_url, supabase_key):
+    """Crée un client Supabase dont la session PostgREST garde ses connexions ouvertes."""
+    client = create_client(supabase_url, supabase_key)
+    session = client.postgrest.session
+
+    client.postgrest.session = SyncClient(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_POOL_KEEPALIVE,
+            keepalive_expiry=SUPABASE_KEEPALIVE_SECONDS,
+        ),
+    )
+    session.close()
+    return client
+
+
 def get_supabase_client():
-    """Crée et retourne un client Supabase."""
+    """
+    Retourne le client Supabase du processus (créé au premier appel).
+    Le client est reconstruit si SUPABASE_URL / SUPABASE_KEY changent ou
+    après un fork.
+    """
     supabase_url = os.getenv('SUPABASE_URL')
     supabase_key = os.getenv('SUPABASE_KEY')
     
     if not supabase_url or not supabase_key:
         raise ValueError("Configuration Supabase manquante dans .env")
     
-    return create_client(supabase_url, supabase_key)
+    config = (supabase_url, supabase_key)
+    pid = os.getpid()
+    
+    with _supabase_lock:
+        if _supabase_pool['pid'] == pid and _supabase_pool['config'] == config:
+            _supabase_stats['reused'] += 1
+            return _supabase_pool['client']
+        
+        previous = _supabase_pool['client'] if _supabase_pool['pid'] == pid else None
+        client = _build_supabase_client(supabase_url, supabase_key)
+        _supabase_pool.update(pid=pid, config=config, client=client, created_at=time.time())
+        _supabase_stats['created'] += 1
+        
+        if previous is not None:
+            # Configuration modifiée: fermer les connexions de l'ancien client
+            _supabase_stats['rebuilt'] += 1
+            previous.postgrest.session.close()
+    
+    return client
+
+
+def get_supabase_pool_stats():
+    """Statistiques du client partagé et de son pool de connexions HTTP."""
+    with _supabase_lock:
+        stats = dict(_supabase_stats, pid=os.getpid(), active=_supabase_pool['pid'] == os.getpid())
+        client = _supabase_pool['client'] if stats['active'] else None
+        created_at = _supabase_pool['created_at']
+    
+    stats['max_connections'] = SUPABASE_POOL_MAX_CONNECTIONS
+    stats['keepalive_seconds'] = SUPABASE_KEEPALIVE_SECONDS
+    
+    if client is not None:
+        stats['age_seconds'] = round(time.time() - created_at, 1)
+        # Connexions ouvertes du pool httpcore (attribut interne, si disponible)
+        pool = getattr(getattr(client.postgrest.session, '_transport', None), '_pool', None)
+        connections = list(getattr(pool, 'connections', []))
+        stats['connections_open'] = len(connections)
+        stats['connections_idle'] = sum(1 for conn in connections if conn.is_idle())
+    
+    return stats
 
 
 def ensure_upload_folder():
@@ -84,6 +329,67 @@ def ensure_upload_folder():
     Path(app.config['UPLOAD_FOLDER']).mkdir(parents=True, exist_ok=True)
 
 
+def check_uploaded_file(files):
+    """
+    Vérifie le fichier envoyé dans le champ "file" d'un formulaire.
+    Retourne (réponse d'erreur, code HTTP) ou None si le fichier est valide.
+    """
+    if 'file' not in files:
+        return {'error': 'Aucun fichier fourni'}, 400
+    
+    if files['file'].filename == '':
+        return {'error': 'Nom de fichier vide'}, 400
+    
+    if not allowed_file(files['file'].filename):
+        return {'error': 'Type de fichier non autorisé. Formats acceptés: CSV, XLSX, XLS'}, 400
+    
+    return None
+
+
+def save_uploaded_file(file):
+    """
+    Enregistre un fichier reçu dans UPLOAD_FOLDER sous le nom <sha256>.<ext>,
+    le hash étant calculé pendant la copie sur disque. Un contenu déjà
+    présent n'est pas réécrit: les envois identiques partagent le fichier,
+    ses caches (parsing, instantanés) et ses métadonnées. Chaque envoi ajoute
+    une référence au registre des uploads (voir release_upload).
+    Retourne (nom du fichier, extension).
+    """
+    ensure_upload_folder()
+    
+    file_ext = file.filename.rsplit('.', 1)[1].lower()
+    
+    if isinstance(file.stream, UploadSpool):
+        # Déjà écrit et hashé pendant la réception du formulaire
+        file_hash = file.stream.finish()
+        filename = f"{file_hash}.{file_ext}"
+        register_upload(filename, file.stream.path, file_hash)
+        return filename, file_ext
+    
+    tmp_path = os.path.join(app.config['UPLOAD_FOLDER'], f".{uuid.uuid4()}.upload")
+    digest = hashlib.sha256()
+    
+    try:
+        with open(tmp_path, 'wb') as f:
+            for block in iter(lambda: file.stream.read(UPLOAD_CHUNK_BYTES), b''):
+                digest.update(block)
+                f.write(block)
+        filename = f"{digest.hexdigest()}.{file_ext}"
+        register_upload(filename, tmp_path, digest.hexdigest())
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    return filename, file_ext
+
+
+def as_bool(value):
+    """Interprète un booléen JSON ou un champ de formulaire ("true", "1", "on")."""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on', 'oui')
+    return bool(value)
+
+
 def snake_case(text):
     """
     Convertit un texte en snake_case.
@@ -161,8 +467,7 @@ def parse_date(value):
     if isinstance(value, (int, float)):
         # Excel serial date (nombre de jours depuis 1899-12-30)
         try:
-            excel_epoch = datetime(1899, 12, 30)
-            date = excel_epoch + pd.Timedelta(days=int(value))
+            date = EXCEL_EPOCH + pd.Timedelta(days=int(value))
             return date.strftime('%Y-%m-%d')
         except:
             return None
@@ -172,18 +477,7 @@ def parse_date(value):
     if not value_str:
         return None
     
-    # Liste des formats à essayer
-    date_formats = [
-        '%Y-%m-%d',      # ISO: 2026-01-21
-        '%d/%m/%Y',      # FR: 21/01/2026
-        '%d/%m/%y',      # FR court: 21/01/26
-        '%m/%d/%Y',      # US: 01/21/2026
-        '%Y/%m/%d',      # ISO alternatif
-        '%d-%m-%Y',      # FR avec tirets
-        '%d.%m.%Y',      # Format allemand
-    ]
-    
-    for fmt in date_formats:
+    for fmt in DATE_FORMATS:
         try:
             date = datetime.strptime(value_str, fmt)
             return date.strftime('%Y-%m-%d')
@@ -204,8 +498,7 @@ def parse_datetime(value):
     # Si c'est un timestamp Excel (nombre)
     if isinstance(value, (int, float)):
         try:
-            excel_epoch = datetime(1899, 12, 30)
-            dt = excel_epoch + pd.Timedelta(days=int(value))
+            dt = EXCEL_EPOCH + pd.Timedelta(days=int(value))
             return dt.strftime('%Y-%m-%d'), dt.strftime('%H:%M:%S')
         except:
             return None, None
@@ -214,16 +507,7 @@ def parse_datetime(value):
     value_str = str(value).strip()
     
     # Essayer de parser directement comme datetime
-    datetime_formats = [
-        '%Y-%m-%d %H:%M:%S',
-        '%Y-%m-%dT%H:%M:%S',
-        '%d/%m/%Y %H:%M',
-        '%d/%m/%Y %H:%M:%S',
-        '%Y-%m-%d %H:%M',
-        '%d-%m-%Y %H:%M:%S',
-    ]
-    
-    for fmt in datetime_formats:
+    for fmt in DATETIME_FORMATS:
         try:
             dt = datetime.strptime(value_str, fmt)
             return dt.strftime('%Y-%m-%d'), dt.strftime('%H:%M:%S')
@@ -259,14 +543,564 @@ def clean_text(value):
     return value_str if value_str else None
 
 
-def normalize_dataframe(df, column_types=None, split_datetime=False):
+# ============================================================================
+# MOTEUR DE NORMALISATION VECTORISÉ
+# Mêmes résultats que clean_number / parse_date / clean_text, mais calculés
+# colonne par colonne (méthodes .str de Pandas, NumPy) au lieu de cellule par
+# cellule. Les cas rares non couverts repassent par les fonctions unitaires.
+# ============================================================================
+
+# Espaces (milliers) et symboles de devises supprimés par clean_number
+_NUMBER_DELETE_TABLE = dict.fromkeys(map(ord, '\xa0 €$£¥'))
+
+# Caractères de contrôle supprimés par clean_text
+_CONTROL_CHARS_TABLE = dict.fromkeys(range(32))
+
+# Forme générale d'une date texte acceptée par l'un des DATE_FORMATS
+_DATE_SHAPE_PATTERN = r'\d{1,4}[-/.] ?\d{1,2}[-/.] ?\d{1,4}'
+
+# Bornes (en jours) acceptées par pd.Timedelta pour les dates série Excel
+_EXCEL_SERIAL_MAX_DAYS = 106751
+
+_text_delete_table = None
+
+
+def _get_text_delete_table():
+    """
+    Table pour str.translate qui supprime les marques combinantes (Mn)
+    et les caractères de contrôle, comme clean_text.
+    Construite une seule fois, au premier usage.
+    """
+    global _text_delete_table
+
+    if _text_delete_table is None:
+        table = dict.fromkeys(range(32))
+        table.update(dict.fromkeys(
+            cp for cp in range(sys.maxunicode + 1)
+            if unicodedata.category(chr(cp)) == 'Mn'
+        ))
+        _text_delete_table = table
+
+    return _text_delete_table
+
+
+def _value_kinds(series):
+    """
+    Classe les cellules d'une Series.
+    Retourne (masque des nulles, masque des chaînes); les autres positions
+    sont des valeurs natives (nombres, dates...).
+    """
+    null_mask = series.isna().to_numpy()
+
+    if series.dtype != object:
+        return null_mask, np.zeros(len(series), dtype=bool)
+
+    kind = pd.api.types.infer_dtype(series, skipna=True)
+    if kind == 'string':
+        return null_mask, ~null_mask
+    if kind == 'empty':
+        return null_mask, np.zeros(len(series), dtype=bool)
+
+    str_mask = series.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    return null_mask, str_mask
+
+
+def _float_or_nan(value):
+    """float() tolérant: NaN si la chaîne n'est pas un nombre."""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _strings_to_float(values):
+    """Convertit un tableau de chaînes déjà nettoyées en float64."""
+    try:
+        return values.astype('float64')
+    except (ValueError, TypeError):
+        return np.array([_float_or_nan(v) for v in values], dtype='float64')
+
+
+def _float_result(values, index):
+    """
+    Construit la Series résultat d'une conversion numérique.
+    Une colonne entièrement vide reste en objet (None), comme avec apply().
+    """
+    if np.isnan(values).all():
+        return pd.Series([None] * len(values), index=index, dtype=object)
+    return pd.Series(values, index=index, dtype='float64')
+
+
+def clean_number_series(series):
+    """
+    Version vectorisée de clean_number.
+    Gère les formats français (1 000,50) et anglais (1000.50) et les devises.
+    """
+    if series.empty or pd.api.types.is_bool_dtype(series.dtype):
+        return series.apply(clean_number)
+
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return _float_result(series.to_numpy(dtype='float64', na_value=np.nan), series.index)
+
+    null_mask, str_mask = _value_kinds(series)
+    values = series.to_numpy(dtype=object)
+    result = np.full(len(series), np.nan)
+
+    # Valeurs natives (int, float, dates...): règles unitaires
+    other_mask = ~null_mask & ~str_mask
+    if other_mask.any():
+        result[other_mask] = np.array(
+            [clean_number(v) for v in values[other_mask]], dtype='float64'
+        )
+
+    if str_mask.any():
+        text = pd.Series(values[str_mask], dtype=object).str.strip()\
+            .str.translate(_NUMBER_DELETE_TABLE)
+
+        # Virgule décimale si pas de point, ou si elle précède le point
+        has_comma = text.str.contains(',', regex=False).to_numpy(dtype=bool)
+        has_dot = text.str.contains('.', regex=False).to_numpy(dtype=bool)
+        french = has_comma & ~has_dot
+        both = np.flatnonzero(has_comma & has_dot)
+        if len(both):
+            mixed = text.iloc[both]
+            french[both] = (mixed.str.find(',') < mixed.str.find('.')).to_numpy(dtype=bool)
+        if french.any():
+            text[french] = text[french].str.replace(',', '.', regex=False)
+
+        result[str_mask] = _strings_to_float(text.to_numpy(dtype=object))
+
+    return _float_result(result, series.index)
+
+
+def _excel_serials_to_dates(numbers):
+    """Convertit des dates série Excel (float64) en chaînes YYYY-MM-DD (ou None)."""
+    result = np.full(len(numbers), None, dtype=object)
+
+    with np.errstate(invalid='ignore'):
+        days = np.trunc(numbers)
+        valid = np.isfinite(days) & (np.abs(days) <= _EXCEL_SERIAL_MAX_DAYS)
+
+    if valid.any():
+        dates = np.datetime64(EXCEL_EPOCH.date()) + days[valid].astype('timedelta64[D]')
+        result[valid] = np.datetime_as_string(dates, unit='D')
+
+    return result
+
+
+def _format_dates(dates):
+    """Formate une Series datetime64 sans NaT en chaînes YYYY-MM-DD."""
+    if getattr(dates.dt, 'tz', None) is not None:
+        dates = dates.dt.tz_localize(None)
+    return np.datetime_as_string(dates.to_numpy(dtype='datetime64[D]'), unit='D').astype(object)
+
+
+def _parse_date_strings(values, date_format=None):
+    """
+    Parse un tableau de chaînes avec DATE_FORMATS, format par format,
+    dans le même ordre de priorité que parse_date. Un date_format donné
+    (format déduit de la colonne) est essayé en premier.
+    """
+    text = pd.Series(values, dtype=object).str.strip()
+    result = np.full(len(text), None, dtype=object)
+    remaining = np.flatnonzero(text.str.len().to_numpy() > 0)
+
+    formats = DATE_FORMATS
+    if date_format:
+        formats = [date_format] + [fmt for fmt in DATE_FORMATS if fmt != date_format]
+
+    for fmt in formats:
+        if len(remaining) == 0:
+            break
+        parsed = pd.to_datetime(text.iloc[remaining], format=fmt, errors='coerce')
+        parsed_mask = parsed.notna().to_numpy()
+        if parsed_mask.any():
+            result[remaining[parsed_mask]] = _format_dates(parsed[parsed_mask])
+        remaining = remaining[~parsed_mask]
+
+    # Dates valides pour strptime mais hors des bornes de Pandas: règles unitaires
+    if len(remaining):
+        leftovers = text.iloc[remaining]
+        shaped = leftovers.str.fullmatch(_DATE_SHAPE_PATTERN).to_numpy(dtype=bool)
+        if shaped.any():
+            result[remaining[shaped]] = [parse_date(v) for v in leftovers[shaped]]
+
+    return result
+
+
+def parse_date_series(series, date_format=None):
+    """
+    Version vectorisée de parse_date.
+    Gère: dates natives, dates série Excel, dates ISO / FR / US en texte.
+    Avec date_format (voir infer_date_format), les dates texte sont lues
+    d'abord avec ce format; les autres formats ne servent qu'aux exceptions.
+    """
+    if series.empty or pd.api.types.is_bool_dtype(series.dtype):
+        return series.apply(parse_date)
+
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        result = np.full(len(series), None, dtype=object)
+        present = series.notna().to_numpy()
+        result[present] = _format_dates(series[present])
+        return pd.Series(result, index=series.index, dtype=object)
+
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        numbers = series.to_numpy(dtype='float64', na_value=np.nan)
+        return pd.Series(_excel_serials_to_dates(numbers), index=series.index, dtype=object)
+
+    null_mask, str_mask = _value_kinds(series)
+    values = series.to_numpy(dtype=object)
+    result = np.full(len(series), None, dtype=object)
+
+    other_mask = ~null_mask & ~str_mask
+    if other_mask.any():
+        result[other_mask] = [parse_date(v) for v in values[other_mask]]
+
+    if str_mask.any():
+        result[str_mask] = _parse_date_strings(values[str_mask], date_format)
+
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+def infer_date_format(series):
+    """
+    Déduit le format des dates texte d'une colonne sur un échantillon de
+    DATE_INFERENCE_SAMPLE valeurs distinctes: le format de DATE_FORMATS qui
+    en reconnaît le plus l'emporte. Une seule date du type 21/01 ou 01/21
+    suffit donc à trancher entre JJ/MM et MM/JJ; si toutes les valeurs sont
+    ambiguës, l'ordre de DATE_FORMATS (français d'abord) départage.
+
+    Returns:
+        Le format retenu, ou None si la colonne ne contient pas de date texte
+    """
+    if series.dtype != object or series.empty:
+        return None
+
+    _, str_mask = _value_kinds(series)
+    if not str_mask.any():
+        return None
+
+    sample = pd.Series(series[str_mask].unique()[:DATE_INFERENCE_SAMPLE], dtype=object).str.strip()
+    best_format, best_count = None, 0
+
+    for fmt in DATE_FORMATS:
+        count = int(pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum())
+        if count > best_count:
+            best_format, best_count = fmt, count
+
+    return best_format
+
+
+def column_rule(spec):
+    """
+    Lit une règle de column_types: 'date' / 'numeric' / 'text' / 'time' /
+    'boolean', ou un objet
+    {"type": "date", "format": "%d/%m/%Y"} pour imposer le format des dates.
+
+    Returns:
+        (type, format ou None)
+    """
+    if isinstance(spec, dict):
+        return spec.get('type'), spec.get('format')
+    return spec, None
+
+
+def pin_date_formats(column_types, date_formats):
+    """
+    Retourne column_types avec les formats de date retenus rendus explicites
+    ({"type": "date", "format": ...}), prêt à être stocké dans un template ou
+    réutilisé pour les morceaux suivants d'un même fichier.
+    """
+    pinned = dict(column_types or {})
+    for col, date_format in date_formats.items():
+        col_type, current = column_rule(pinned.get(col))
+        if col_type == 'date' and not current:
+            pinned[col] = {'type': 'date', 'format': date_format}
+    return pinned
+
+
+def clean_text_series(series):
+    """
+    Version vectorisée de clean_text.
+    Supprime les accents et caractères de contrôle.
+    """
+    if series.empty:
+        return series.apply(clean_text)
+
+    null_mask, str_mask = _value_kinds(series)
+    values = series.to_numpy(dtype=object)
+    result = np.full(len(series), None, dtype=object)
+
+    present = ~null_mask
+    if present.any():
+        text = pd.Series(values[present], dtype=object)
+        non_str = ~str_mask[present]
+        if non_str.any():
+            text[non_str] = text[non_str].map(str)
+
+        text = text.str.strip()
+
+        # Les chaînes ASCII n'ont pas d'accents: seuls les contrôles sont à retirer
+        ascii_mask = text.map(str.isascii).to_numpy(dtype=bool)
+        if ascii_mask.any():
+            text[ascii_mask] = text[ascii_mask].str.translate(_CONTROL_CHARS_TABLE)
+        if not ascii_mask.all():
+            text[~ascii_mask] = text[~ascii_mask].str.normalize('NFD')\
+                .str.translate(_get_text_delete_table())
+
+        result[present] = text.where(text != '', None).to_numpy(dtype=object)
+
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+# LRU des résultats par règle: {règle: OrderedDict(valeur -> résultat)}
+_normalize_memo = {}
+_normalize_memo_lock = threading.Lock()
+
+
+def memoized_series(series, rule, func):
+    """
+    Applique func (règle vectorisée, Series -> Series) une seule fois par
+    valeur distincte d'une colonne de chaînes, puis replace les résultats
+    via les codes de pd.factorize.
+
+    Les résultats par valeur restent dans un LRU borné (NORMALIZE_MEMO_SIZE
+    par règle), partagé entre morceaux de lecture et imports. Les colonnes
+    non textuelles ou peu répétitives (plus de NORMALIZE_MEMO_MAX_RATIO de
+    valeurs distinctes) passent directement par func, sans remplir le LRU.
+    """
+    if series.dtype != object or len(series) < 2:
+        return func(series)
+
+    null_mask, str_mask = _value_kinds(series)
+    if not (null_mask | str_mask).all():
+        return func(series)
+
+    codes, uniques = pd.factorize(series)
+    if len(uniques) > len(series) * NORMALIZE_MEMO_MAX_RATIO:
+        return func(series)
+
+    # Dernière position: résultat d'une cellule vide (code -1)
+    results = np.empty(len(uniques) + 1, dtype=object)
+    missing = []
+
+    with _normalize_memo_lock:
+        memo = _normalize_memo.setdefault(rule, OrderedDict())
+        for position, value in enumerate(uniques):
+            if value in memo:
+                memo.move_to_end(value)
+                results[position] = memo[value]
+            else:
+                missing.append(position)
+
+    if missing:
+        computed = func(pd.Series(uniques[missing], dtype=object)).to_numpy(dtype=object)
+        results[missing] = computed
+
+        with _normalize_memo_lock:
+            memo = _normalize_memo.setdefault(rule, OrderedDict())
+            for position, value in zip(missing, computed):
+                memo[uniques[position]] = value
+            while len(memo) > NORMALIZE_MEMO_SIZE:
+                memo.popitem(last=False)
+
+    results[-1] = func(pd.Series([None], dtype=object)).iloc[0]
+    values = results[codes]
+
+    if rule == 'numeric':
+        return _float_result(np.array(values, dtype='float64'), series.index)
+    return pd.Series(values, index=series.index, dtype=object)
+
+
+def clear_normalize_memo():
+    """Vide le LRU de mémoïsation (toutes règles)."""
+    with _normalize_memo_lock:
+        _normalize_memo.clear()
+
+
+def apply_column_rule(series, spec):
+    """
+    Applique une règle de column_types à une colonne.
+
+    Returns:
+        (Series convertie, format de date retenu ou None)
+    """
+    col_type, date_format = column_rule(spec)
+
+    if col_type == 'date':
+        date_format = date_format or infer_date_format(series)
+        series = memoized_series(
+            series, ('date', date_format),
+            lambda values: parse_date_series(values, date_format)
+        )
+        return series, date_format
+    if col_type == 'numeric':
+        return memoized_series(series, 'numeric', clean_number_series), None
+    if col_type == 'text':
+        return memoized_series(series, 'text', clean_text_series), None
+    if col_type == 'time':
+        return memoized_series(series, 'time', parse_time_series), None
+    if col_type == 'boolean':
+        return memoized_series(series, 'boolean', clean_boolean_series), None
+    return series, None
+
+
+def _split_datetime_strings(values):
+    """
+    Sépare un tableau de chaînes en (dates, heures), format par format
+    (DATETIME_FORMATS puis DATE_FORMATS), comme parse_datetime.
+    """
+    text = pd.Series(values, dtype=object).str.strip()
+    dates = np.full(len(text), None, dtype=object)
+    times = np.full(len(text), None, dtype=object)
+    remaining = np.flatnonzero(text.str.len().to_numpy() > 0)
+
+    for fmt in DATETIME_FORMATS:
+        if len(remaining) == 0:
+            break
+        parsed = pd.to_datetime(text.iloc[remaining], format=fmt, errors='coerce')
+        parsed_mask = parsed.notna().to_numpy()
+        if parsed_mask.any():
+            stamps = np.datetime_as_string(parsed[parsed_mask].to_numpy(dtype='datetime64[s]'), unit='s')
+            positions = remaining[parsed_mask]
+            dates[positions] = stamps.astype('U10').astype(object)
+            times[positions] = pd.Series(stamps).str[11:].to_numpy(dtype=object)
+        remaining = remaining[~parsed_mask]
+
+    if len(remaining):
+        # Date et heure hors des bornes de Pandas: règle unitaire
+        leftovers = text.iloc[remaining]
+        timed = leftovers.str.contains(':', regex=False).to_numpy(dtype=bool)
+        for position, value in zip(remaining[timed], leftovers[timed]):
+            dates[position], times[position] = parse_datetime(value)
+        remaining = remaining[~timed]
+
+    if len(remaining):
+        # Date seule: pas d'heure
+        dates[remaining] = _parse_date_strings(text.iloc[remaining].to_numpy(dtype=object))
+
+    return dates, times
+
+
+def split_datetime_series(series):
+    """
+    Version vectorisée de parse_datetime: retourne (dates, heures), deux
+    tableaux objet de chaînes YYYY-MM-DD / HH:MM:SS (ou None).
+    Chaque valeur distincte n'est séparée qu'une fois.
+    """
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+
+    # Dernière position: résultat d'une cellule vide (code -1)
+    dates = np.full(len(uniques) + 1, None, dtype=object)
+    times = np.full(len(uniques) + 1, None, dtype=object)
+
+    null_mask, str_mask = _value_kinds(uniques)
+    values = uniques.to_numpy(dtype=object)
+
+    if str_mask.any():
+        dates[:-1][str_mask], times[:-1][str_mask] = _split_datetime_strings(values[str_mask])
+
+    other = np.flatnonzero(~null_mask & ~str_mask)
+    if len(other):
+        numeric = np.array([isinstance(values[i], (int, float, np.number)) for i in other], dtype=bool)
+        if numeric.any():
+            # Dates série Excel: partie entière seulement, à minuit
+            serial_dates = _excel_serials_to_dates(values[other[numeric]].astype('float64'))
+            dates[other[numeric]] = serial_dates
+            times[other[numeric]] = np.where(pd.notna(serial_dates), '00:00:00', None)
+        for position in other[~numeric]:
+            dates[position], times[position] = parse_datetime(values[position])
+
+    return dates[codes], times[codes]
+
+
+def detect_datetime_columns(df, sample_rows=None):
+    """
+    Colonnes (noms du DataFrame) contenant des dates avec heure, à séparer
+    en date_ et heure_. Une colonne est retenue si toutes les valeurs non
+    vides de son échantillon se lisent comme des dates et qu'au moins une
+    porte une heure autre que minuit. Les colonnes numériques ne sont
+    jamais détectées (les dates série Excel se désignent explicitement).
+
+    Le résultat peut être enregistré (template) et repassé tel quel à
+    normalize_dataframe via split_datetime.
+    """
+    sample_rows = sample_rows or DATETIME_DETECTION_SAMPLE
+    columns = []
+
+    for col in df.columns:
+        series = df[col]
+        if series.dtype != object and not pd.api.types.is_datetime64_any_dtype(series.dtype):
+            continue
+
+        sample = series.dropna().head(sample_rows)
+        if sample.dtype == object:
+            sample = sample[sample.astype(str).str.strip() != '']
+        if sample.empty:
+            continue
+
+        dates, times = split_datetime_series(sample)
+        if pd.notna(dates).all() and (pd.notna(times) & (times != '00:00:00')).any():
+            columns.append(col)
+
+    return columns
+
+
+def split_datetime_columns(df, columns):
+    """
+    Remplace chaque colonne de columns par date_<col> et heure_<col>
+    (une colonne déjà préfixée date_ garde son nom pour la partie date),
+    ajoutées en une seule fois à la fin du DataFrame.
+    """
+    columns = [col for col in columns if col in df.columns]
+    if not columns:
+        return df
+
+    new_columns = {}
+    for col in columns:
+        dates, times = split_datetime_series(df[col])
+        new_columns[col if col.startswith('date_') else f"date_{col}"] = dates
+        if not col.startswith('heure_'):
+            new_columns[f"heure_{col}"] = times
+
+    kept = df.drop(columns=[col for col in df.columns if col in columns or col in new_columns])
+    return pd.concat([kept, pd.DataFrame(new_columns, index=df.index)], axis=1)
+
+
+def drop_duplicate_columns(df):
+    """
+    Garde la dernière colonne de chaque nom en double ("Prix TTC" et
+    "prix_ttc" après snake_case, ou après column_mapping), comme le faisait
+    to_dict(orient='records') à l'insertion.
+    """
+    if df.columns.is_unique:
+        return df
+    return df.loc[:, ~df.columns.duplicated(keep='last')]
+
+
+def rename_columns(df, column_mapping):
+    """Applique column_mapping (noms source -> noms cible) sans laisser de doublons."""
+    return drop_duplicate_columns(df.rename(columns=column_mapping))
+
+
+def normalize_dataframe(df, column_types=None, split_datetime=False, date_formats=None,
+                        datetime_columns=None):
     """
     Normalise un DataFrame selon les règles de typage.
     
     Args:
         df: DataFrame Pandas à normaliser
-        column_types: Dict {colonne: type} ('date', 'numeric', 'text')
-        split_datetime: Si True, sépare les colonnes datetime en date_ et heure_
+        column_types: Dict {colonne: type} ('date', 'numeric', 'text', 'time',
+            'boolean'), ou
+            {colonne: {"type": "date", "format": ...}} (voir column_rule)
+        split_datetime: Si True, sépare les colonnes datetime (détectées par
+            detect_datetime_columns) en date_ et heure_; une liste désigne
+            directement les colonnes à séparer (noms en snake_case)
+        date_formats: Dict optionnel, rempli avec {colonne: format} pour les
+            colonnes date (format imposé ou déduit par infer_date_format)
+        datetime_columns: Liste optionnelle, remplie avec les colonnes
+            séparées (à réutiliser pour les morceaux suivants ou un template)
     
     Returns:
         DataFrame normalisé
@@ -278,68 +1112,26 @@ def normalize_dataframe(df, column_types=None, split_datetime=False):
     
     # Normaliser les noms de colonnes en snake_case
     df.columns = [snake_case(col) for col in df.columns]
+    df = drop_duplicate_columns(df)
     
-    # Si split_datetime, détecter et séparer les colonnes datetime
+    # Si split_datetime, détecter puis séparer les colonnes datetime
     if split_datetime:
-        new_columns = {}
-        for col in df.columns:
-            if 'date' in col.lower() and col not in df.columns:
-                continue
-            
-            # Vérifier si la colonne contient des timestamps
-            sample_values = df[col].dropna().head(10)
-            if sample_values.empty:
-                continue
-            
-            # Tester si c'est une colonne datetime
-            has_date = False
-            has_time = False
-            
-            for val in sample_values:
-                if isinstance(val, (int, float)):
-                    has_date = True
-                    if val % 1 != 0:
-                        has_time = True
-                    break
-                
-                val_str = str(val)
-                if ' ' in val_str and ':' in val_str:
-                    has_date = True
-                    has_time = True
-                    break
-                elif '/' in val_str or '-' in val_str:
-                    has_date = True
-            
-            if has_date:
-                date_col = f"date_{col}" if not col.startswith('date_') else col
-                time_col = f"heure_{col}" if not col.startswith('heure_') else None
-                
-                # Séparer les valeurs
-                dates = []
-                heures = []
-                for val in df[col]:
-                    d, h = parse_datetime(val)
-                    dates.append(d)
-                    heures.append(h)
-                
-                df[date_col] = dates
-                if time_col:
-                    df[time_col] = heures
-                
-                # Supprimer la colonne originale
-                df = df.drop(columns=[col])
+        if isinstance(split_datetime, (list, tuple)):
+            columns = [col for col in split_datetime if col in df.columns]
+        else:
+            columns = detect_datetime_columns(df)
+        if datetime_columns is not None:
+            datetime_columns[:] = columns
+        df = split_datetime_columns(df, columns)
     
     # Appliquer les types forcés
-    for col, col_type in column_types.items():
+    for col, spec in column_types.items():
         if col not in df.columns:
             continue
         
-        if col_type == 'date':
-            df[col] = df[col].apply(parse_date)
-        elif col_type == 'numeric':
-            df[col] = df[col].apply(clean_number)
-        elif col_type == 'text':
-            df[col] = df[col].apply(clean_text)
+        df[col], date_format = apply_column_rule(df[col], spec)
+        if date_formats is not None and date_format:
+            date_formats[col] = date_format
     
     # Remplacer les valeurs NaN/None par None
     df = df.where(pd.notnull(df), None)
@@ -347,28 +1139,2676 @@ def normalize_dataframe(df, column_types=None, split_datetime=False):
     return df
 
 
+def _json_column(series):
+    """
+    Valeurs d'une colonne prêtes pour JSON (liste Python): NaN/NA -> None,
+    dates et durées pandas en texte. Conversion faite une fois par colonne.
+    """
+    numpy_dtype = isinstance(series.dtype, np.dtype)
+    if numpy_dtype and (series.dtype.kind in 'biu' or (series.dtype.kind == 'f' and not series.isna().any())):
+        return series.tolist()
+
+    values = series.astype(object)
+    if series.dtype.kind in 'mM':
+        values = values.map(str)
+    elif pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty', 'integer', 'floating', 'boolean'):
+        # Colonne mixte: dates et durées pandas éventuelles en texte
+        values = values.map(lambda v: str(v) if isinstance(v, (pd.Timestamp, pd.Timedelta)) else v)
+    return values.where(series.notna(), None).tolist()
+
+
+def _json_default(value):
+    """Types que orjson ne sérialise pas seul (Timestamp en colonne objet, Decimal...)."""
+    if isinstance(value, (pd.Timestamp, pd.Timedelta, Decimal)):
+        return str(value)
+    if value is pd.NA or value is pd.NaT:
+        return None
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
 def dataframe_to_json_records(df):
     """
     Convertit un DataFrame en liste de dictionnaires pour Supabase.
     """
-    records = df.to_dict(orient='records')
-    
-    # Nettoyer les valeurs pour Supabase
-    for record in records:
-        for key, value in record.items():
-            if pd.isna(value):
-                record[key] = None
-            elif isinstance(value, (pd.Timestamp, pd.Timedelta)):
-                record[key] = str(value)
-            elif isinstance(value, (int, float)) and not isinstance(value, bool):
-                # Vérifier si c'est un NaN masqué
-                try:
-                    if value != value:  # NaN check
-                        record[key] = None
-                except:
-                    pass
+    return JsonRecords(df).rows(0, len(df))
+
+
+class JsonRecords:
+    """
+    Lignes d'un DataFrame à insérer, sérialisées en JSON batch par batch.
     
-    return records
+    Chaque colonne est convertie une seule fois (NaN -> null, dates en
+    texte), puis payload(début, fin) produit directement les octets JSON
+    d'un batch avec orjson: pas de liste de dicts pour tout le fichier ni
+    de seconde sérialisation par le client PostgREST.
+    """
+
+    def __init__(self, df):
+        self.columns = [str(col) for col in df.columns]
+        # Par position: des noms en double (mapping, snake_case) gardent la
+        # dernière valeur, comme to_dict(orient="records")
+        self.values = [_json_column(df.iloc[:, i]) for i in range(df.shape[1])]
+        self.length = len(df)
+
+    def __len__(self):
+        return self.length
+
+    def rows(self, start, stop):
+        """Dictionnaires des lignes [start, stop) (valeurs déjà converties)."""
+        if not self.values:
+            return [{} for _ in range(start, min(stop, self.length))]
+        return [dict(zip(self.columns, row)) for row in zip(*(values[start:stop] for values in self.values))]
+
+    def payload(self, start, stop):
+        """
+        Octets JSON du batch [start, stop).
+        
+        Limite: un dict par ligne reste construit (sur le batch seulement),
+        car orjson sérialise les dicts en C. Assembler les lignes à partir
+        de fragments JSON par colonne a été mesuré 20 à 50 % plus lent en
+        Python (frames RMS et ETL de 50 000 lignes).
+        """
+        return orjson.dumps(self.rows(start, stop), default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+# ============================================================================
+# INFÉRENCE DES TYPES SQL
+# Propose pour chaque colonne un type PostgreSQL (INTEGER, NUMERIC(p,s),
+# DATE, TIME, BOOLEAN...) avec les mêmes règles françaises que clean_number
+# et parse_date, et la part des valeurs qui s'y convertissent (confiance).
+# ============================================================================
+
+# Valeurs reconnues par clean_boolean_series (après strip et minuscules)
+_BOOLEAN_VALUES = {
+    'true': True, 'vrai': True, 'oui': True, 'yes': True,
+    'false': False, 'faux': False, 'non': False, 'no': False,
+}
+
+# Heure texte: HH:MM ou HH:MM:SS
+_TIME_PATTERN = r'\d{1,2}:\d{2}(?::\d{2})?'
+
+# Identifiants à zéros non significatifs (codes, n° de chambre): restent du texte
+_LEADING_ZERO_PATTERN = r'[+-]?0\d.*'
+
+# NUMERIC(p,s): décimales max, précision max, et chiffres entiers ajoutés
+# en marge pour les imports suivants dans la même table
+_NUMERIC_MAX_SCALE = 6
+_NUMERIC_MAX_PRECISION = 38
+_NUMERIC_HEADROOM_DIGITS = 3
+
+
+def clean_boolean_series(series):
+    """
+    Convertit oui/non, vrai/faux, true/false, yes/no et les booléens natifs
+    en True/False. Les autres valeurs deviennent None.
+    """
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return series.astype(object)
+
+    null_mask, str_mask = _value_kinds(series)
+    values = series.to_numpy(dtype=object)
+    result = np.full(len(series), None, dtype=object)
+
+    other = np.flatnonzero(~null_mask & ~str_mask)
+    for position in other:
+        if isinstance(values[position], (bool, np.bool_)):
+            result[position] = bool(values[position])
+
+    if str_mask.any():
+        mapped = pd.Series(values[str_mask], dtype=object).str.strip().str.lower().map(_BOOLEAN_VALUES)
+        result[str_mask] = mapped.astype(object).where(mapped.notna(), None).to_numpy(dtype=object)
+
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+def parse_time_series(series):
+    """
+    Convertit des heures (texte HH:MM[:SS], datetime.time, Timestamp) au
+    format SQL HH:MM:SS. Les autres valeurs deviennent None.
+    """
+    result = np.full(len(series), None, dtype=object)
+
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        present = series.notna().to_numpy()
+        result[present] = series[present].dt.strftime('%H:%M:%S').to_numpy(dtype=object)
+        return pd.Series(result, index=series.index, dtype=object)
+
+    null_mask, str_mask = _value_kinds(series)
+    values = series.to_numpy(dtype=object)
+
+    for position in np.flatnonzero(~null_mask & ~str_mask):
+        if isinstance(values[position], (time_of_day, datetime)):
+            result[position] = values[position].strftime('%H:%M:%S')
+
+    if str_mask.any():
+        text = pd.Series(values[str_mask], dtype=object).str.strip()
+        shaped = text.str.fullmatch(_TIME_PATTERN).to_numpy(dtype=bool)
+        if shaped.any():
+            candidates = text[shaped]
+            candidates = candidates.where(candidates.str.count(':') == 2, candidates + ':00')
+            parsed = pd.to_datetime(candidates, format='%H:%M:%S', errors='coerce')
+            formatted = parsed.dt.strftime('%H:%M:%S').astype(object).where(parsed.notna(), None)
+            positions = np.flatnonzero(str_mask)[shaped]
+            result[positions] = formatted.to_numpy(dtype=object)
+
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+def _numeric_sql_type(numbers):
+    """Type SQL le plus précis pour des nombres finis (tableau float64 non vide)."""
+    max_abs = float(np.abs(numbers).max())
+
+    if np.all(numbers == np.trunc(numbers)):
+        if max_abs < 2 ** 31:
+            return 'INTEGER'
+        if max_abs < 2 ** 63:
+            return 'BIGINT'
+
+    for scale in range(_NUMERIC_MAX_SCALE + 1):
+        shifted = numbers * 10 ** scale
+        if np.allclose(shifted, np.round(shifted), rtol=0, atol=1e-6):
+            break
+    else:
+        return 'DOUBLE PRECISION'
+
+    precision = len(str(int(max_abs))) + scale + _NUMERIC_HEADROOM_DIGITS
+    if precision > _NUMERIC_MAX_PRECISION:
+        return 'DOUBLE PRECISION'
+    return f'NUMERIC({precision},{scale})'
+
+
+def infer_column_type(series, explicit_rule=None):
+    """
+    Propose un type SQL pour une colonne, normalisée ou brute.
+
+    Les colonnes déjà typées par Pandas (entiers, réels, dates, booléens)
+    gardent leur type. Les colonnes de texte sont testées avec les règles
+    boolean, numeric, date et time; la confiance est la part des valeurs
+    non vides que la meilleure règle convertit. En dessous de
+    TYPE_INFERENCE_MIN_CONFIDENCE, la colonne reste en TEXT et confidence
+    garde le score de cette règle écartée: TEXT à 0.99 signale une colonne
+    presque entièrement typée (quelques valeurs à corriger), TEXT à 0 une
+    colonne de texte pur.
+
+    Returns:
+        dict: sql_type, rule (règle column_types à appliquer avant
+        l'insertion, ou None), confidence, scores {type: part des
+        valeurs converties}
+    """
+    if explicit_rule == 'text':
+        return {'sql_type': 'TEXT', 'rule': None, 'confidence': 1.0, 'scores': {}}
+
+    present = series[series.notna()]
+    if present.dtype == object:
+        present = present[present.map(lambda v: not isinstance(v, str) or v.strip() != '').to_numpy(dtype=bool)]
+
+    if present.empty:
+        return {'sql_type': 'TEXT', 'rule': None, 'confidence': 0.0, 'scores': {}}
+
+    dtype = present.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return {'sql_type': 'BOOLEAN', 'rule': None, 'confidence': 1.0, 'scores': {'BOOLEAN': 1.0}}
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return {'sql_type': 'TIMESTAMP', 'rule': None, 'confidence': 1.0, 'scores': {'TIMESTAMP': 1.0}}
+    if pd.api.types.is_numeric_dtype(dtype):
+        numbers = present.to_numpy(dtype='float64')
+        numbers = numbers[np.isfinite(numbers)]
+        sql_type = _numeric_sql_type(numbers) if len(numbers) else 'DOUBLE PRECISION'
+        return {'sql_type': sql_type, 'rule': None, 'confidence': 1.0, 'scores': {'NUMERIC': 1.0}}
+
+    total = len(present)
+    present = present.reset_index(drop=True)
+    _, str_mask = _value_kinds(present)
+    text = present.where(~str_mask, present.astype(str).str.strip())
+
+    booleans = clean_boolean_series(text).notna().to_numpy()
+
+    numbers = clean_number_series(text)
+    numbers = numbers.to_numpy(dtype='float64', na_value=np.nan) if numbers.dtype == object \
+        else numbers.to_numpy()
+    leading_zero = str_mask & text.astype(str).str.fullmatch(_LEADING_ZERO_PATTERN).to_numpy(dtype=bool)
+    numeric = np.isfinite(numbers) & ~leading_zero
+
+    date_format = infer_date_format(text)
+    dates = parse_date_series(text, date_format).notna().to_numpy() & ~np.isfinite(numbers)
+
+    times = parse_time_series(text).notna().to_numpy()
+
+    candidates = [
+        ('BOOLEAN', booleans, 'boolean'),
+        ('NUMERIC', numeric, 'numeric'),
+        ('DATE', dates, {'type': 'date', 'format': date_format} if date_format else 'date'),
+        ('TIME', times, 'time'),
+    ]
+    scores = {name: round(float(mask.sum()) / total, 4) for name, mask, _ in candidates}
+    name, mask, rule = max(candidates, key=lambda candidate: scores[candidate[0]])
+    confidence = scores[name]
+
+    if confidence < TYPE_INFERENCE_MIN_CONFIDENCE or confidence == 0:
+        return {'sql_type': 'TEXT', 'rule': None, 'confidence': confidence, 'scores': scores}
+
+    sql_type = _numeric_sql_type(numbers[mask]) if name == 'NUMERIC' else name
+    return {'sql_type': sql_type, 'rule': rule, 'confidence': confidence, 'scores': scores}
+
+
+def infer_column_types(df, column_types=None, sample_rows=None):
+    """
+    Infère le type SQL de chaque colonne (voir infer_column_type).
+    Avec sample_rows, seules sample_rows lignes réparties sur la colonne
+    sont examinées; sinon toute la colonne.
+    """
+    column_types = column_types or {}
+
+    if sample_rows and len(df) > sample_rows:
+        df = df.iloc[::-(-len(df) // sample_rows)]
+
+    return {
+        col: infer_column_type(df[col], column_rule(column_types.get(col))[0])
+        for col in df.columns
+    }
+
+
+def apply_inferred_types(df, inferred):
+    """
+    Convertit les colonnes dont le type inféré demande une règle (texte
+    numérique, dates, heures, booléens), et passe les colonnes INTEGER /
+    BIGINT en entiers, pour que les valeurs insérées correspondent au
+    CREATE TABLE généré.
+    """
+    df = df.copy()
+
+    for col, info in inferred.items():
+        rule = info['rule']
+        if rule is not None:
+            df[col] = apply_column_rule(df[col], rule)[0]
+        if info['sql_type'] in ('INTEGER', 'BIGINT') and df[col].dtype != 'Int64':
+            df[col] = pd.array(
+                pd.to_numeric(df[col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan),
+                dtype='Int64'
+            )
+
+    return df
+
+
+# ============================================================================
+# DIALECTE DES CSV
+# Encodage, séparateur, guillemets, séparateur décimal et lignes avant
+# l'en-tête, détectés une fois sur le début du fichier puis gardés avec les
+# métadonnées de l'upload. Toutes les lectures CSV les reçoivent.
+# ============================================================================
+
+# Séparateurs candidats, par ordre de préférence à score égal
+_CSV_DELIMITERS = (';', ',', '\t', '|')
+
+# Encodages détectés par chardet remplacés par un sur-ensemble plus sûr
+_ENCODING_ALIASES = {'ascii': 'utf-8', 'iso-8859-1': 'cp1252', 'windows-1252': 'cp1252'}
+
+_DECIMAL_COMMA_PATTERN = re.compile(r'[+-]?\d+,\d+')
+_DECIMAL_DOT_PATTERN = re.compile(r'[+-]?\d+\.\d+')
+
+# Dialectes déjà connus: (chemin, mtime, taille) -> dialecte
+_csv_dialects = {}
+_csv_dialects_lock = threading.Lock()
+
+
+def normalize_encoding(encoding):
+    """Nom d'encodage chardet utilisable par Python (utf-8 par défaut)."""
+    encoding = (encoding or 'utf-8').lower()
+    return _ENCODING_ALIASES.get(encoding, encoding)
+
+
+def is_utf8(sample):
+    """Indique si des octets (éventuellement coupés en fin) sont de l'UTF-8 valide."""
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(sample):
+    """
+    Encodage d'un début de fichier. Un échantillon UTF-8 valide est lu en
+    UTF-8 (avec BOM: utf-8-sig): sur quelques lignes accentuées, chardet le
+    prend souvent pour MacRoman ou Latin-1.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if is_utf8(sample):
+        return 'utf-8'
+    return normalize_encoding(chardet.detect(sample)['encoding'])
+
+
+def _split_csv_line(line, delimiter, quotechar):
+    """Champs d'une ligne CSV (les guillemets sont respectés)."""
+    return next(csv.reader([line], delimiter=delimiter, quotechar=quotechar), [])
+
+
+def detect_csv_dialect(sample, encoding=None, truncated=False):
+    """
+    Déduit le dialecte d'un CSV à partir de ses premiers octets.
+
+    Le séparateur retenu est celui qui donne le plus souvent le même nombre
+    de champs (plus d'un) par ligne; l'en-tête est la première ligne ayant
+    ce nombre de champs, en majorité non vides. Le séparateur décimal est la virgule si les nombres
+    à virgule dominent (jamais avec le séparateur ',').
+
+    Args:
+        sample: Premiers octets du fichier
+        encoding: Encodage déjà connu (sinon voir detect_encoding)
+        truncated: True si sample s'arrête au milieu du fichier (la dernière
+            ligne, incomplète, est ignorée)
+
+    Returns:
+        dict: encoding, delimiter, quotechar, decimal, skiprows
+    """
+    if truncated and b'\n' in sample:
+        sample = sample[:sample.rfind(b'\n') + 1]
+
+    encoding = normalize_encoding(encoding) if encoding else detect_encoding(sample)
+    text = sample.decode(encoding, errors='replace')
+    filled = [(number, line) for number, line in enumerate(re.split(r'\r?\n', text)) if line.strip()]
+    quotechar = "'" if re.search(r"(^|[;,\t|])'", text, re.M) and '"' not in text else '"'
+
+    best = None
+    for delimiter in _CSV_DELIMITERS:
+        counts = [len(_split_csv_line(line, delimiter, quotechar)) for _, line in filled]
+        if not counts:
+            continue
+        fields = max(set(counts), key=lambda count: (counts.count(count), count))
+        score = (fields > 1, counts.count(fields), fields)
+        if best is None or score > best[0]:
+            best = (score, delimiter, fields, counts)
+
+    dialect = {'encoding': encoding, 'delimiter': ',', 'quotechar': quotechar, 'decimal': '.', 'skiprows': 0}
+    if best is None or not best[0][0]:
+        return dialect
+
+    # En-tête: première ligne au bon nombre de champs, en majorité remplis
+    # (un titre "Export RMS;;" en a autant mais presque tous vides)
+    _, delimiter, fields, counts = best
+    header = next(
+        (i for i, count in enumerate(counts) if count == fields and sum(
+            1 for value in _split_csv_line(filled[i][1], delimiter, quotechar) if value.strip()
+        ) * 2 > fields),
+        counts.index(fields)
+    )
+    dialect['delimiter'] = delimiter
+    dialect['skiprows'] = filled[header][0]
+
+    if delimiter != ',':
+        values = [
+            value.strip()
+            for _, line in filled[header + 1:]
+            for value in _split_csv_line(line, delimiter, quotechar)
+        ]
+        commas = sum(1 for value in values if _DECIMAL_COMMA_PATTERN.fullmatch(value))
+        dots = sum(1 for value in values if _DECIMAL_DOT_PATTERN.fullmatch(value))
+        if commas > dots:
+            dialect['decimal'] = ','
+
+    return dialect
+
+
+def _csv_dialect_key(file_path):
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+
+def remember_csv_dialect(file_path, dialect):
+    """Mémorise le dialecte d'un CSV (processus courant et registre des uploads)."""
+    with _csv_dialects_lock:
+        _csv_dialects[_csv_dialect_key(file_path)] = dialect
+    store_upload_dialect(os.path.basename(file_path), dialect)
+
+
+def csv_dialect(file_path):
+    """
+    Dialecte d'un CSV: mémoire du processus, puis registre des uploads,
+    sinon détection sur les CSV_SNIFF_BYTES premiers octets (mémorisée).
+    """
+    key = _csv_dialect_key(file_path)
+
+    with _csv_dialects_lock:
+        if key in _csv_dialects:
+            return _csv_dialects[key]
+
+    dialect = get_upload_dialect(os.path.basename(file_path))
+    if dialect is None:
+        with open(file_path, 'rb') as f:
+            sample = f.read(CSV_SNIFF_BYTES)
+        dialect = detect_csv_dialect(sample, truncated=len(sample) == CSV_SNIFF_BYTES)
+        store_upload_dialect(os.path.basename(file_path), dialect)
+
+    with _csv_dialects_lock:
+        _csv_dialects[key] = dialect
+    return dialect
+
+
+def csv_read_options(dialect):
+    """Arguments de pd.read_csv correspondant à un dialecte."""
+    options = {
+        'sep': dialect['delimiter'],
+        'quotechar': dialect['quotechar'],
+        'decimal': dialect['decimal'],
+        'encoding': dialect['encoding'],
+    }
+    if dialect['skiprows']:
+        options['skiprows'] = dialect['skiprows']
+    return options
+
+
+# ============================================================================
+# LECTEURS EXCEL
+# Toutes les lectures complètes d'un classeur passent par read_excel_file,
+# qui choisit le lecteur: calamine (Rust, XLSX et XLS) s'il est installé,
+# openpyxl en lecture seule (valeurs seules) pour les gros XLSX ou sans
+# calamine, xlrd pour les XLS sans calamine. Mêmes DataFrames que
+# pd.read_excel quel que soit le lecteur (sauf les cellules ne contenant
+# que des espaces, lues vides par calamine).
+# ============================================================================
+
+def _read_excel_calamine(file_path, sheet_name=None):
+    return pd.read_excel(file_path, sheet_name=sheet_name or 0, engine='calamine')
+
+
+def _read_excel_openpyxl(file_path, sheet_name=None):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        # Un seul morceau: inférence des types sur toute la colonne
+        df = next(_iter_sheet_chunks(sheet, sys.maxsize), None)
+    finally:
+        workbook.close()
+
+    return df if df is not None else pd.DataFrame()
+
+
+def _read_excel_xlrd(file_path, sheet_name=None):
+    return pd.read_excel(file_path, sheet_name=sheet_name or 0, engine='xlrd')
+
+
+# Lecteurs disponibles: nom -> (fonction de lecture, extensions gérées)
+EXCEL_READERS = {
+    'calamine': (_read_excel_calamine, ('xlsx', 'xls')),
+    'openpyxl': (_read_excel_openpyxl, ('xlsx',)),
+    'xlrd': (_read_excel_xlrd, ('xls',)),
+}
+
+
+def excel_engines_available():
+    """Lecteurs Excel utilisables dans cet environnement."""
+    return [name for name in EXCEL_READERS if name != 'calamine' or python_calamine is not None]
+
+
+def choose_excel_engine(file_path, engine=None):
+    """
+    Lecteur d'un classeur: engine ou EXCEL_ENGINE s'il est imposé et gère
+    ce type de fichier, sinon choix automatique selon le type et la taille.
+    """
+    file_ext = file_path.rsplit('.', 1)[1].lower()
+    engine = engine or EXCEL_ENGINE
+
+    if engine != 'auto':
+        if engine not in excel_engines_available():
+            raise ValueError(f"Lecteur Excel indisponible: {engine}")
+        if file_ext not in EXCEL_READERS[engine][1]:
+            raise ValueError(f"Le lecteur {engine} ne lit pas les fichiers .{file_ext}")
+        return engine
+
+    if file_ext == 'xlsx' and os.path.getsize(file_path) > EXCEL_STREAM_BYTES:
+        return 'openpyxl'
+    if python_calamine is not None:
+        return 'calamine'
+    return 'openpyxl' if file_ext == 'xlsx' else 'xlrd'
+
+
+def read_excel_file(file_path, sheet_name=None, engine=None):
+    """Lit un onglet (le premier par défaut) avec le lecteur choisi (voir choose_excel_engine)."""
+    reader, _ = EXCEL_READERS[choose_excel_engine(file_path, engine)]
+    return reader(file_path, sheet_name)
+
+
+# ============================================================================
+# CACHE DES FICHIERS PARSÉS
+# ============================================================================
+
+# LRU en mémoire: clé (chemin, onglet, mtime, taille) -> (DataFrame, octets)
+_parse_cache = OrderedDict()
+_parse_cache_bytes = 0
+_parse_cache_lock = threading.Lock()
+
+
+def _parse_cache_key(file_path, sheet_name=None):
+    """Construit la clé de cache d'un fichier (invalide dès qu'il est modifié)."""
+    stat = os.stat(file_path)
+    return (
+        os.path.abspath(file_path),
+        sheet_name if sheet_name else 0,
+        stat.st_mtime_ns,
+        stat.st_size
+    )
+
+
+def _parse_cache_disk_path(key, fmt):
+    """Chemin de la copie colonnaire stockée à côté de l'upload."""
+    digest = hashlib.md5(repr(key[1:]).encode('utf-8')).hexdigest()[:16]
+    return f"{key[0]}.{digest}.parsed.{fmt}"
+
+
+def _parse_source_file(file_path, sheet_name=None):
+    """Lit réellement le fichier source (sans cache)."""
+    file_ext = file_path.rsplit('.', 1)[1].lower()
+
+    if file_ext in ['xlsx', 'xls']:
+        return read_excel_file(file_path, sheet_name)
+    elif file_ext == 'csv':
+        dialect = csv_dialect(file_path)
+        # pyarrow ne compte pas les lignes sautées comme Pandas (lignes vides)
+        engine = CSV_ENGINE if not dialect['skiprows'] else 'c'
+        return pd.read_csv(file_path, engine=engine, **csv_read_options(dialect))
+
+    raise ValueError(f"Type de fichier non supporté: {file_ext}")
+
+
+def _write_frame_cache(df, key):
+    """
+    Écrit la copie colonnaire sur disque (Feather/Arrow).
+    Les colonnes de types mixtes, non représentables en Arrow, basculent
+    sur un pickle pour conserver exactement les valeurs lues.
+    """
+    feather_path = _parse_cache_disk_path(key, 'feather')
+    tmp_path = f"{feather_path}.{os.getpid()}.tmp"
+
+    try:
+        df.reset_index(drop=True).to_feather(tmp_path)
+        os.replace(tmp_path, feather_path)
+        return
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    pickle_path = _parse_cache_disk_path(key, 'pkl')
+    tmp_path = f"{pickle_path}.{os.getpid()}.tmp"
+    try:
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, pickle_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _read_frame_cache(key):
+    """Relit la copie colonnaire sur disque, ou None si absente."""
+    feather_path = _parse_cache_disk_path(key, 'feather')
+    if os.path.exists(feather_path):
+        return pd.read_feather(feather_path)
+
+    pickle_path = _parse_cache_disk_path(key, 'pkl')
+    if os.path.exists(pickle_path):
+        return pd.read_pickle(pickle_path)
+
+    return None
+
+
+def _remember_frame(key, df):
+    """Ajoute un DataFrame au LRU mémoire en respectant le budget d'octets."""
+    global _parse_cache_bytes
+
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    if size > PARSE_CACHE_MAX_BYTES:
+        return
+
+    with _parse_cache_lock:
+        if key in _parse_cache:
+            _parse_cache_bytes -= _parse_cache.pop(key)[1]
+
+        _parse_cache[key] = (df, size)
+        _parse_cache_bytes += size
+
+        while _parse_cache_bytes > PARSE_CACHE_MAX_BYTES and _parse_cache:
+            _, (_, evicted_size) = _parse_cache.popitem(last=False)
+            _parse_cache_bytes -= evicted_size
+
+
+def read_source_file(file_path, sheet_name=None):
+    """
+    Charge un fichier source (Excel/CSV) en DataFrame, via le cache.
+    Ordre de recherche: LRU mémoire, copie colonnaire sur disque, puis parsing.
+
+    Le DataFrame retourné est partagé entre les requêtes: ne pas le modifier
+    en place (normalize_dataframe travaille sur une copie).
+    """
+    key = _parse_cache_key(file_path, sheet_name)
+
+    with _parse_cache_lock:
+        if key in _parse_cache:
+            _parse_cache.move_to_end(key)
+            return _parse_cache[key][0]
+
+    try:
+        df = _read_frame_cache(key)
+    except Exception:
+        df = None
+
+    if df is None:
+        df = _parse_source_file(file_path, sheet_name)
+        _write_frame_cache(df, key)
+
+    _remember_frame(key, df)
+    return df
+
+
+def evict_parse_cache(file_path):
+    """Supprime toutes les entrées de cache (mémoire et disque) d'un upload."""
+    global _parse_cache_bytes
+
+    abs_path = os.path.abspath(file_path)
+
+    with _parse_cache_lock:
+        for key in [k for k in _parse_cache if k[0] == abs_path]:
+            _parse_cache_bytes -= _parse_cache.pop(key)[1]
+
+    for cache_path in glob.glob(f"{glob.escape(abs_path)}.*.parsed.*"):
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+
+
+# ============================================================================
+# INSTANTANÉS COLONNAIRES (APERÇU PAGINÉ)
+# Le résultat brut ou normalisé d'un onglet est écrit une fois en fichier
+# Arrow IPC non compressé, découpé en record batches, avec l'index des
+# positions de début de chaque batch dans les métadonnées du schéma. Les
+# pages sont lues par memory-map sans relancer l'ETL.
+# ============================================================================
+
+# LRU des vues filtrées/triées: (instantané, filtres, tri) -> indices des lignes
+_snapshot_views = OrderedDict()
+_snapshot_views_lock = threading.Lock()
+
+
+def _snapshot_path(file_path, sheet_name, column_types, split_datetime, normalized):
+    """Chemin de l'instantané pour un fichier et un jeu de paramètres ETL."""
+    split = list(split_datetime) if isinstance(split_datetime, (list, tuple)) else bool(split_datetime)
+    params = json.dumps([bool(normalized), column_types or {}, split], sort_keys=True)
+    key = _parse_cache_key(file_path, sheet_name) + (hashlib.md5(params.encode('utf-8')).hexdigest(),)
+    return _parse_cache_disk_path(key, 'snapshot.arrow')
+
+
+def _frame_to_arrow(df):
+    """
+    Convertit un DataFrame en table Arrow. Les colonnes de types mixtes,
+    non représentables en Arrow, sont converties en texte.
+    """
+    arrays = []
+    for col in df.columns:
+        try:
+            arrays.append(pa.array(df[col], from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            values = df[col]
+            arrays.append(pa.array(values.astype(str).where(values.notna(), None), type=pa.string()))
+
+    return pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns])
+
+
+def build_snapshot(file_path, sheet_name=None, column_types=None, split_datetime=False, normalized=True):
+    """
+    Retourne le chemin de l'instantané Arrow d'un onglet, en le créant si
+    besoin (lecture via le cache des fichiers parsés, puis normalisation).
+    """
+    snapshot_path = _snapshot_path(file_path, sheet_name, column_types, split_datetime, normalized)
+    if os.path.exists(snapshot_path):
+        return snapshot_path
+
+    with stage_span('read'):
+        df = read_source_file(file_path, sheet_name)
+    date_formats = {}
+    datetime_columns = []
+    if normalized:
+        with stage_span('normalize'):
+            df = normalize_dataframe(df, column_types or {}, split_datetime, date_formats, datetime_columns)
+
+    with stage_span('snapshot'):
+        table = _frame_to_arrow(df)
+        offsets = list(range(0, table.num_rows, SNAPSHOT_BATCH_ROWS))
+        schema = table.schema.with_metadata({
+            'row_offsets': json.dumps(offsets),
+            'num_rows': str(table.num_rows),
+            'date_formats': json.dumps(date_formats),
+            'datetime_columns': json.dumps(datetime_columns),
+            # Types SQL proposés: utiles au CREATE TABLE, donc pour le normalisé seulement
+            'inferred_types': json.dumps(
+                infer_column_types(df, column_types, TYPE_INFERENCE_SAMPLE) if normalized else {}
+            ),
+        })
+
+        tmp_path = f"{snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table.replace_schema_metadata(schema.metadata), max_chunksize=SNAPSHOT_BATCH_ROWS)
+            os.replace(tmp_path, snapshot_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    return snapshot_path
+
+
+def read_snapshot_metadata(snapshot_path):
+    """
+    Métadonnées d'un instantané: nombre de lignes, formats de date retenus,
+    colonnes date + heure détectées et types SQL proposés (instantané
+    normalisé, sur un échantillon de TYPE_INFERENCE_SAMPLE lignes).
+    """
+    with pa.memory_map(snapshot_path, 'r') as source:
+        metadata = pa.ipc.open_file(source).schema.metadata
+
+    return {
+        'num_rows': int(metadata[b'num_rows']),
+        'date_formats': json.loads(metadata.get(b'date_formats', b'{}')),
+        'datetime_columns': json.loads(metadata.get(b'datetime_columns', b'[]')),
+        'inferred_types': json.loads(metadata.get(b'inferred_types', b'{}')),
+    }
+
+
+def _read_snapshot_rows(reader, offsets, start, stop):
+    """Lit les lignes [start, stop) en ne touchant que les batches concernés."""
+    batches = []
+    index = max(0, bisect.bisect_right(offsets, start) - 1)
+
+    while index < len(offsets) and offsets[index] < stop:
+        batch = reader.get_batch(index)
+        low = max(0, start - offsets[index])
+        high = min(batch.num_rows, stop - offsets[index])
+        if high > low:
+            batches.append(batch.slice(low, high - low))
+        index += 1
+
+    return pa.Table.from_batches(batches, schema=reader.schema)
+
+
+def _filter_mask(table, filters):
+    """Masque des lignes correspondant à tous les filtres {colonne: valeur}."""
+    mask = None
+    for column, value in filters.items():
+        values = table[column]
+        if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+            condition = pc.match_substring(values, str(value), ignore_case=True)
+        else:
+            condition = pc.equal(values, pa.scalar(value).cast(values.type))
+        condition = pc.fill_null(condition, False)
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return mask
+
+
+def _snapshot_view(snapshot_path, table, filters, sort, descending):
+    """Indices des lignes filtrées et triées (mémorisés par vue)."""
+    key = (snapshot_path, json.dumps(filters, sort_keys=True, default=str), sort, descending)
+
+    with _snapshot_views_lock:
+        if key in _snapshot_views:
+            _snapshot_views.move_to_end(key)
+            return _snapshot_views[key]
+
+    indices = pa.array(np.arange(table.num_rows))
+    if filters:
+        indices = pc.filter(indices, _filter_mask(table, filters))
+    if sort:
+        order = pc.array_sort_indices(
+            pc.take(table[sort], indices),
+            order='descending' if descending else 'ascending',
+            null_placement='at_end'
+        )
+        indices = pc.take(indices, order)
+
+    with _snapshot_views_lock:
+        _snapshot_views[key] = indices
+        while len(_snapshot_views) > SNAPSHOT_VIEW_CACHE_SIZE:
+            _snapshot_views.popitem(last=False)
+
+    return indices
+
+
+def read_snapshot_page(snapshot_path, offset=0, limit=MAX_PREVIEW_ROWS, columns=None,
+                       filters=None, sort=None, descending=False):
+    """
+    Lit une page d'un instantané.
+
+    Sans filtre ni tri, seuls les record batches de la page sont lus.
+    Avec filtres ({colonne: valeur}, sous-chaîne insensible à la casse pour
+    le texte, égalité sinon) ou tri, les indices de la vue sont calculés une
+    fois puis réutilisés pour les pages suivantes.
+
+    Returns:
+        (DataFrame de la page, nombre de lignes de la vue, colonnes de l'instantané)
+    """
+    with pa.memory_map(snapshot_path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        offsets = json.loads(reader.schema.metadata[b'row_offsets'])
+        all_columns = reader.schema.names
+
+        unknown = [col for col in list(columns or []) + list(filters or {}) + ([sort] if sort else [])
+                   if col not in all_columns]
+        if unknown:
+            raise ValueError(f"Colonnes inconnues: {', '.join(unknown)}")
+
+        if filters or sort:
+            table = reader.read_all()
+            indices = _snapshot_view(snapshot_path, table, filters or {}, sort, descending)
+            total = len(indices)
+            page = table.take(indices[offset:offset + limit])
+        else:
+            total = int(reader.schema.metadata[b'num_rows'])
+            page = _read_snapshot_rows(reader, offsets, offset, min(offset + limit, total))
+
+        if columns:
+            page = page.select(columns)
+
+        # Copie hors du memory-map avant sa fermeture
+        return page.to_pandas(), total, all_columns
+
+
+# ============================================================================
+# LECTURE EN FLUX (STREAMING)
+# Lit un fichier par morceaux de STREAM_CHUNK_ROWS lignes pour borner la
+# mémoire des imports volumineux. Chaque morceau est un DataFrame construit
+# avec les mêmes règles que pd.read_excel / pd.read_csv.
+# ============================================================================
+
+def _convert_excel_cell(cell):
+    """Convertit une cellule openpyxl comme le lecteur Excel de Pandas."""
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    if cell.value is None:
+        return ''
+    elif cell.data_type == TYPE_ERROR:
+        return np.nan
+    elif cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        if value == cell.value:
+            return value
+        return float(cell.value)
+    return cell.value
+
+
+def _rows_to_dataframe(header, rows):
+    """Construit un DataFrame depuis des lignes brutes (inférence des types Pandas)."""
+    from pandas.io.parsers import TextParser
+
+    width = len(header)
+    data = [header] + [list(row[:width]) + [''] * (width - len(row)) for row in rows]
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+
+def _iter_sheet_chunks(sheet, chunk_rows):
+    """Lit un onglet openpyxl (lecture seule) par morceaux de DataFrame."""
+    width = sheet.max_column or 0
+    sheet.reset_dimensions()
+
+    header = None
+    rows = []
+    pending_empty = []
+
+    for row in sheet.rows:
+        values = [_convert_excel_cell(cell) for cell in row]
+        while values and values[-1] == '':
+            values.pop()
+
+        if header is None:
+            header = values + [''] * (max(width, len(values)) - len(values))
+            continue
+
+        # Les lignes vides finales sont ignorées (comme pd.read_excel)
+        if not values:
+            pending_empty.append(values)
+            continue
+        rows.extend(pending_empty)
+        pending_empty = []
+        rows.append(values)
+
+        if len(rows) >= chunk_rows:
+            yield _rows_to_dataframe(header, rows)
+            rows = []
+
+    if rows:
+        yield _rows_to_dataframe(header, rows)
+
+
+def _iter_xlsx_chunks(file_path, sheet_name, chunk_rows):
+    """Lit un onglet XLSX ligne à ligne (openpyxl en lecture seule)."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        yield from _iter_sheet_chunks(sheet, chunk_rows)
+    finally:
+        workbook.close()
+
+
+def iter_source_chunks(file_path, sheet_name=None, chunk_rows=None):
+    """
+    Itère sur un fichier source par morceaux de DataFrame.
+    CSV: pd.read_csv(chunksize) avec le dialecte du fichier; XLSX: openpyxl read_only.
+    Le format XLS (xlrd) ne se lit pas en flux: il est chargé puis découpé.
+    """
+    chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+    file_ext = file_path.rsplit('.', 1)[1].lower()
+
+    if file_ext == 'csv':
+        options = csv_read_options(csv_dialect(file_path))
+        with pd.read_csv(file_path, chunksize=chunk_rows, **options) as reader:
+            for chunk in reader:
+                yield chunk.reset_index(drop=True)
+    elif file_ext == 'xlsx':
+        yield from _iter_xlsx_chunks(file_path, sheet_name, chunk_rows)
+    elif file_ext == 'xls':
+        df = read_source_file(file_path, sheet_name)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].reset_index(drop=True)
+    else:
+        raise ValueError(f"Type de fichier non supporté: {file_ext}")
+
+
+# ============================================================================
+# LECTURE RAPIDE DES MÉTADONNÉES
+# Onglets, en-têtes, premières lignes et nombre de lignes d'un fichier sans
+# construire le DataFrame complet: le temps d'upload ne dépend plus de la
+# taille du fichier.
+# ============================================================================
+
+def _count_csv_rows(file_path, skiprows=0):
+    """
+    Compte les lignes de données d'un CSV (hors en-tête et lignes qui le
+    précèdent) par blocs binaires.
+    Les retours à la ligne à l'intérieur de champs entre guillemets sont
+    comptés comme des lignes: le total est alors une estimation haute.
+    """
+    lines = 0
+    last = b'\n'
+
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+
+    if last != b'\n':
+        lines += 1
+    return max(0, lines - 1 - skiprows)
+
+
+def sniff_source_file(file_path, sheet_name=None, preview_rows=None):
+    """
+    Lit les métadonnées d'un fichier source: onglets, en-têtes, premières
+    lignes et nombre total de lignes (hors en-tête).
+
+    XLSX: openpyxl en lecture seule, nombre de lignes tiré de la dimension
+    déclarée de l'onglet. XLS: xlrd. CSV: dialecte (voir csv_dialect),
+    pd.read_csv(nrows) et comptage rapide des lignes.
+
+    Returns:
+        dict avec 'sheets', 'headers', 'preview' (DataFrame) et 'total_rows',
+        plus 'dialect' pour un CSV
+    """
+    preview_rows = preview_rows or MAX_PREVIEW_ROWS
+    file_ext = file_path.rsplit('.', 1)[1].lower()
+
+    if file_ext == 'csv':
+        dialect = csv_dialect(file_path)
+        preview = pd.read_csv(file_path, nrows=preview_rows, **csv_read_options(dialect))
+        return {
+            'sheets': [],
+            'headers': list(preview.columns),
+            'preview': preview,
+            'total_rows': _count_csv_rows(file_path, dialect['skiprows']),
+            'dialect': dialect,
+        }
+
+    if file_ext == 'xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheets = workbook.sheetnames
+            if not sheets:
+                return {'sheets': [], 'headers': [], 'preview': None, 'total_rows': 0}
+
+            sheet = workbook[sheet_name or sheets[0]]
+            declared_rows = sheet.max_row
+            preview = next(_iter_sheet_chunks(sheet, preview_rows), None)
+
+            if declared_rows is None:
+                # Onglet sans dimension déclarée: comptage en flux
+                sheet.reset_dimensions()
+                declared_rows = sum(1 for _ in sheet.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+
+        if preview is None:
+            preview = pd.DataFrame()
+        return {
+            'sheets': sheets,
+            'headers': list(preview.columns),
+            'preview': preview,
+            'total_rows': max(0, declared_rows - 1),
+        }
+
+    if file_ext == 'xls':
+        import xlrd
+
+        book = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            sheets = book.sheet_names()
+            if not sheets:
+                return {'sheets': [], 'headers': [], 'preview': None, 'total_rows': 0}
+
+            name = sheet_name or sheets[0]
+            total_rows = max(0, book.sheet_by_name(name).nrows - 1)
+            preview = pd.read_excel(book, sheet_name=name, nrows=preview_rows, engine='xlrd')
+        finally:
+            book.release_resources()
+
+        return {
+            'sheets': sheets,
+            'headers': list(preview.columns),
+            'preview': preview,
+            'total_rows': total_rows,
+        }
+
+    raise ValueError(f"Type de fichier non supporté: {file_ext}")
+
+
+def _estimate_row_bytes(records, sample_size=50):
+    """Estime la taille JSON moyenne d'une ligne à partir d'un échantillon."""
+    if isinstance(records, JsonRecords):
+        rows = min(sample_size, len(records))
+        return max(1, len(records.payload(0, rows)) // rows) if rows else 1
+    sample = records[:sample_size]
+    if not sample:
+        return 1
+    return max(1, len(json.dumps(sample, default=str)) // len(sample))
+
+
+def _next_batch_rows(current_rows, row_bytes, latency=None, rows_sent=None):
+    """
+    Calcule la taille du prochain batch.
+    Plafonnée par la taille JSON cible, puis ajustée selon la latence observée
+    pour viser IMPORT_BATCH_TARGET_SECONDS par requête.
+    """
+    size_cap = IMPORT_BATCH_TARGET_BYTES // row_bytes
+    rows = current_rows
+
+    if latency and rows_sent:
+        target_rows = rows_sent / latency * IMPORT_BATCH_TARGET_SECONDS
+        # Lissage pour éviter les oscillations
+        rows = (current_rows + target_rows) / 2
+
+    return int(max(IMPORT_BATCH_MIN_ROWS, min(rows, size_cap, IMPORT_BATCH_MAX_ROWS)))
+
+
+# Codes PostgreSQL / PostgREST relevant d'un incident passager: connexion,
+# ressources épuisées, conflit de sérialisation, interblocage, timeout
+_TRANSIENT_PG_CODES = ('08', '53', '57P', 'PGRST000', 'PGRST001', 'PGRST002')
+_TRANSIENT_PG_ERRORS = {'40001', '40P01', '57014'}
+
+
+def is_transient_error(error):
+    """
+    Indique si une erreur d'insertion mérite une nouvelle tentative.
+    Les erreurs de données (contrainte, type, colonne inconnue) ne sont
+    jamais relancées.
+    """
+    if isinstance(error, httpx.TransportError):
+        return True
+
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        # Réponse non JSON (proxy, passerelle): le code est le statut HTTP
+        return code >= 500 or code == 429
+
+    code = str(code or '')
+    return code.startswith(_TRANSIENT_PG_CODES) or code in _TRANSIENT_PG_ERRORS
+
+
+def post_json_payload(supabase, table_name, payload, on_conflict=None):
+    """
+    Envoie un batch déjà sérialisé (octets JSON) à PostgREST, sans le
+    décoder ni le réencoder, en return=minimal. Les erreurs sont levées
+    comme par le client (APIError).
+    """
+    query = supabase.table(table_name)
+    if on_conflict:
+        query = query.upsert([], on_conflict=on_conflict, returning=ReturnMethod.minimal)
+    else:
+        query = query.insert([], returning=ReturnMethod.minimal)
+
+    response = query.session.request(
+        query.http_method, query.path, content=payload, params=query.params,
+        headers={**query.headers, 'Content-Type': 'application/json'}
+    )
+    if not response.is_success:
+        try:
+            raise APIError(response.json())
+        except ValueError:
+            raise APIError(generate_default_error_message(response))
+
+
+def insert_records(supabase, table_name, records, first_batch=0,
+                   concurrency=None, stop_on_error=False, on_batch=None,
+                   ranges=None, first_row=0, on_conflict=None):
+    """
+    Insère des records dans Supabase par batches, avec plusieurs requêtes
+    simultanées (IMPORT_CONCURRENCY). La taille des batches s'adapte à la
+    taille JSON des lignes et à la latence des batches précédents.
+
+    Un batch en échec transitoire (voir is_transient_error) est relancé
+    jusqu'à IMPORT_MAX_RETRIES fois avec un délai exponentiel.
+
+    Les erreurs sont collectées par batch (numérotation à partir de first_batch).
+    Avec stop_on_error, aucun nouveau batch n'est envoyé après une erreur et
+    celle-ci est relevée une fois les requêtes en cours terminées.
+
+    ranges limite l'envoi à des plages [début, fin) de records (reprise d'un
+    import); un batch ne chevauche jamais deux plages.
+    on_batch(lignes insérées, message d'erreur ou None, début, fin) est appelé
+    après chaque batch, avec des positions décalées de first_row.
+
+    Avec on_conflict (colonnes d'une contrainte unique, séparées par des
+    virgules), les batches sont envoyés en upsert: les lignes existantes
+    sont mises à jour.
+
+    records est une liste de dicts ou un JsonRecords: chaque batch est
+    alors sérialisé directement en octets et envoyé tel quel (les lignes
+    ne sont pas renvoyées par PostgREST, un batch accepté compte pour
+    toutes ses lignes).
+
+    Returns:
+        (nombre de lignes insérées, liste des erreurs, nombre de batches envoyés)
+    """
+    concurrency = max(1, concurrency or IMPORT_CONCURRENCY)
+    row_bytes = _estimate_row_bytes(records)
+    batch_rows = _next_batch_rows(IMPORT_BATCH_SIZE, row_bytes)
+
+    if ranges is None:
+        ranges = [(0, len(records))]
+    pending = deque((start, end) for start, end in ranges if end > start)
+
+    def send(batch):
+        for attempt in range(IMPORT_MAX_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                if isinstance(batch, tuple):
+                    rows, payload = batch
+                    post_json_payload(supabase, table_name, payload, on_conflict)
+                    return rows, time.perf_counter() - start
+                query = supabase.table(table_name)
+                if on_conflict:
+                    result = query.upsert(batch, on_conflict=on_conflict).execute()
+                else:
+                    result = query.insert(batch).execute()
+                return len(result.data) if result.data else 0, time.perf_counter() - start
+            except Exception as e:
+                if attempt == IMPORT_MAX_RETRIES or not is_transient_error(e):
+                    raise
+                time.sleep(IMPORT_RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    total_inserted = 0
+    errors = {}
+    first_exception = None
+    batch_number = first_batch
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while in_flight or (pending and first_exception is None):
+            # Remplir la fenêtre de requêtes simultanées
+            while pending and len(in_flight) < concurrency and first_exception is None:
+                start, end = pending.popleft()
+                stop = min(end, start + batch_rows)
+                if stop < end:
+                    pending.appendleft((stop, end))
+                batch_number += 1
+                if isinstance(records, JsonRecords):
+                    serialize_start = time.perf_counter()
+                    batch = (stop - start, records.payload(start, stop))
+                    record_stage('serialize', time.perf_counter() - serialize_start)
+                else:
+                    batch = records[start:stop]
+                in_flight[executor.submit(send, batch)] = (batch_number, start, stop)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                number, start, stop = in_flight.pop(future)
+                try:
+                    inserted, latency = future.result()
+                    total_inserted += inserted
+                    record_stage('insert_batch', latency)
+                    batch_rows = _next_batch_rows(batch_rows, row_bytes, latency, stop - start)
+                    if on_batch:
+                        on_batch(inserted, None, first_row + start, first_row + stop)
+                except Exception as e:
+                    errors[number] = f"Batch {number}: {str(e)}"
+                    if on_batch:
+                        on_batch(0, errors[number], first_row + start, first_row + stop)
+                    if stop_on_error and first_exception is None:
+                        first_exception = e
+
+    if first_exception is not None:
+        raise first_exception
+
+    return total_inserted, [errors[n] for n in sorted(errors)], batch_number - first_batch
+
+
+# ============================================================================
+# BASE D'ÉTAT LOCALE (SQLITE)
+# Partagée par les workers Gunicorn sans broker externe. Une connexion par
+# thread et par processus.
+# ============================================================================
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    rows_parsed INTEGER NOT NULL DEFAULT 0,
+    rows_inserted INTEGER NOT NULL DEFAULT 0,
+    batches_inserted INTEGER NOT NULL DEFAULT 0,
+    batches_failed INTEGER NOT NULL DEFAULT 0,
+    errors TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status, created_at);
+CREATE TABLE IF NOT EXISTS import_checkpoints (
+    file_hash TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    row_start INTEGER NOT NULL,
+    row_end INTEGER NOT NULL,
+    committed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_import_checkpoints_key
+    ON import_checkpoints(file_hash, sheet_name, table_name, row_start);
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    filename TEXT PRIMARY KEY,
+    refcount INTEGER NOT NULL,
+    metadata TEXT,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS row_hashes (
+    table_name TEXT NOT NULL,
+    key_columns TEXT NOT NULL,
+    key_hash INTEGER NOT NULL,
+    row_hash INTEGER NOT NULL,
+    PRIMARY KEY (table_name, key_columns, key_hash)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS metric_counters (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels, field)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS metric_window (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_metric_window_series ON metric_window(name, labels, id);
+"""
+
+_state_db_local = threading.local()
+
+
+def get_state_db():
+    """Retourne la connexion SQLite du thread courant (créée au premier appel)."""
+    conn = getattr(_state_db_local, 'conn', None)
+
+    if conn is None or _state_db_local.pid != os.getpid():
+        Path(STATE_DB_PATH).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(STATE_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(STATE_SCHEMA)
+        _state_db_local.conn = conn
+        _state_db_local.pid = os.getpid()
+
+    return conn
+
+
+def get_cache_version(name):
+    """Version courante d'un cache partagé (0 s'il n'a jamais été invalidé)."""
+    row = get_state_db().execute("SELECT version FROM cache_versions WHERE name = ?", (name,)).fetchone()
+    return row['version'] if row else 0
+
+
+def bump_cache_version(name):
+    """Invalide un cache dans tous les workers en incrémentant sa version."""
+    get_state_db().execute(
+        "INSERT INTO cache_versions (name, version) VALUES (?, 1) "
+        "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+        (name,)
+    )
+
+
+# ============================================================================
+# REPRISE DES IMPORTS (CHECKPOINTS)
+# Chaque batch inséré enregistre sa plage de lignes pour le couple
+# (hash du fichier, onglet, table). Un import relancé avec "resume": true
+# n'envoie que les plages manquantes ou en échec.
+# ============================================================================
+
+_file_hash_cache = {}
+_file_hash_lock = threading.Lock()
+
+
+def compute_file_hash(file_path):
+    """SHA-256 du contenu d'un fichier, mémorisé tant que mtime et taille sont inchangés."""
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+    with _file_hash_lock:
+        if key in _file_hash_cache:
+            return _file_hash_cache[key]
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            digest.update(block)
+
+    with _file_hash_lock:
+        _file_hash_cache[key] = digest.hexdigest()
+    return _file_hash_cache[key]
+
+
+def remember_file_hash(file_path, file_hash):
+    """Mémorise le hash d'un fichier déjà calculé ailleurs (pendant l'upload)."""
+    stat = os.stat(file_path)
+    with _file_hash_lock:
+        _file_hash_cache[(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)] = file_hash
+
+
+def _merge_ranges(ranges):
+    """Fusionne des plages [début, fin) triées qui se chevauchent ou se touchent."""
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class ImportCheckpoints:
+    """
+    Plages de lignes déjà insérées pour un fichier, un onglet et une table.
+    Les positions sont globales au fichier (tous morceaux de lecture confondus).
+    Sans resume, les checkpoints précédents sont effacés: l'import repart de zéro.
+    """
+
+    def __init__(self, file_path, sheet_name, table_name, resume=False):
+        self.key = (compute_file_hash(file_path), sheet_name or '', table_name)
+        db = get_state_db()
+
+        if resume:
+            rows = db.execute(
+                "SELECT row_start, row_end FROM import_checkpoints "
+                "WHERE file_hash = ? AND sheet_name = ? AND table_name = ? ORDER BY row_start",
+                self.key
+            ).fetchall()
+            self.committed = _merge_ranges((row['row_start'], row['row_end']) for row in rows)
+        else:
+            db.execute(
+                "DELETE FROM import_checkpoints WHERE file_hash = ? AND sheet_name = ? AND table_name = ?",
+                self.key
+            )
+            self.committed = []
+
+    def pending(self, start, end):
+        """Sous-plages de [start, end) restant à insérer, relatives à start."""
+        ranges = []
+        position = start
+
+        for committed_start, committed_end in self.committed:
+            if committed_end <= position:
+                continue
+            if committed_start >= end:
+                break
+            if committed_start > position:
+                ranges.append((position - start, committed_start - start))
+            position = committed_end
+
+        if position < end:
+            ranges.append((position - start, end - start))
+        return ranges
+
+    def commit(self, start, end):
+        """Enregistre une plage insérée avec succès."""
+        get_state_db().execute(
+            "INSERT INTO import_checkpoints "
+            "(file_hash, sheet_name, table_name, row_start, row_end, committed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            self.key + (start, end, time.time())
+        )
+
+
+# ============================================================================
+# RÉCEPTION DES UPLOADS EN FLUX
+# Werkzeug écrit chaque fichier d'un formulaire dans le flux fourni par
+# Request._get_file_stream. Les fichiers acceptés sont écrits directement
+# dans UPLOAD_FOLDER, hashés et analysés (encodage, lignes, en-tête) au fil
+# de la réception: à la fin du dernier bloc, il ne reste qu'à nommer le
+# fichier d'après son hash et à lire l'en-tête déjà en mémoire.
+# ============================================================================
+
+class UploadSpool:
+    """Fichier d'upload en cours de réception, écrit directement sur disque."""
+
+    def __init__(self, filename):
+        ensure_upload_folder()
+        self.path = os.path.join(app.config['UPLOAD_FOLDER'], f".{uuid.uuid4()}.upload")
+        self.file = open(self.path, 'w+b')
+        self.csv = filename.rsplit('.', 1)[-1].lower() == 'csv'
+        self.digest = hashlib.sha256()
+        self.detector = UniversalDetector()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.utf8_valid = True
+        self.sampled = 0
+        self.head = bytearray()
+        self.newlines = 0
+        self.last_byte = b'\n'
+        self.size = 0
+
+    def write(self, data):
+        self.digest.update(data)
+        self.size += len(data)
+
+        if self.csv and data:
+            self.newlines += data.count(b'\n')
+            self.last_byte = data[-1:]
+            if len(self.head) < UPLOAD_HEAD_BYTES:
+                self.head += data[:UPLOAD_HEAD_BYTES - len(self.head)]
+            if self.sampled < UPLOAD_ENCODING_SAMPLE and not self.detector.done:
+                sample = data[:UPLOAD_ENCODING_SAMPLE - self.sampled]
+                self.detector.feed(sample)
+                self.sampled += len(sample)
+                if self.utf8_valid:
+                    try:
+                        self.utf8.decode(sample)
+                    except UnicodeDecodeError:
+                        self.utf8_valid = False
+
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def finish(self):
+        """Ferme le fichier reçu et retourne son SHA-256."""
+        self.file.close()
+        return self.digest.hexdigest()
+
+    def close(self):
+        """Fin de requête: supprime le fichier s'il n'a pas été enregistré."""
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def encoding(self):
+        """Encodage détecté sur le début du fichier (utf-8 par défaut, voir detect_encoding)."""
+        if self.head.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if not self.sampled or self.utf8_valid:
+            return 'utf-8'
+        return normalize_encoding(self.detector.close()['encoding'])
+
+    def sniff(self, preview_rows=None):
+        """
+        Métadonnées d'un CSV reçu (comme sniff_source_file), tirées du début
+        gardé en mémoire et du comptage des lignes pendant la réception.
+        Retourne None si l'en-tête ne tient pas dans UPLOAD_HEAD_BYTES.
+        """
+        head = bytes(self.head)
+        truncated = self.size > len(head)
+        if truncated:
+            end = head.rfind(b'\n')
+            if end < 0:
+                return None
+            head = head[:end + 1]
+
+        dialect = detect_csv_dialect(head, self.encoding, truncated)
+        preview = pd.read_csv(io.BytesIO(head), nrows=preview_rows or MAX_PREVIEW_ROWS,
+                              **csv_read_options(dialect))
+        lines = self.newlines + (self.last_byte != b'\n')
+        return {
+            'sheets': [],
+            'headers': list(preview.columns),
+            'preview': preview,
+            'total_rows': max(0, lines - 1 - dialect['skiprows']),
+            'dialect': dialect,
+        }
+
+
+class UploadRequest(Request):
+    """Requête Flask dont les fichiers acceptés sont reçus dans un UploadSpool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spools = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename and allowed_file(filename):
+            spool = UploadSpool(filename)
+            self.spools.append(spool)
+            return spool
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+    def close(self):
+        # Réception interrompue (MAX_CONTENT_LENGTH dépassé en cours de flux,
+        # client déconnecté): le spool n'est pas dans request.files
+        super().close()
+        for spool in self.spools:
+            spool.close()
+
+
+app.request_class = UploadRequest
+
+
+# ============================================================================
+# REGISTRE DES UPLOADS (DÉDUPLICATION)
+# Les fichiers sont nommés d'après le hash de leur contenu. Le registre
+# compte les envois de chaque fichier (références) et garde les
+# métadonnées de /api/upload, réutilisées pour un contenu déjà reçu.
+# Les opérations sur un fichier se font sous verrou d'écriture SQLite
+# (BEGIN IMMEDIATE), partagé par les workers.
+# ============================================================================
+
+@contextmanager
+def _upload_registry_lock():
+    """Transaction d'écriture sur le registre des uploads."""
+    conn = get_state_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def register_upload(filename, tmp_path, file_hash):
+    """
+    Ajoute une référence à un upload. Si le contenu n'est pas encore sur
+    disque (ou a disparu), tmp_path devient le fichier et le compteur repart
+    de 1; sinon le fichier existant est gardé tel quel (mtime et caches).
+    """
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    now = time.time()
+
+    with _upload_registry_lock() as conn:
+        if os.path.exists(file_path):
+            conn.execute(
+                "INSERT INTO uploads (filename, refcount, created_at, last_used_at) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT(filename) DO UPDATE SET refcount = refcount + 1, last_used_at = excluded.last_used_at",
+                (filename, now, now)
+            )
+        else:
+            os.replace(tmp_path, file_path)
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (filename, refcount, metadata, created_at, last_used_at) "
+                "VALUES (?, 1, NULL, ?, ?)",
+                (filename, now, now)
+            )
+
+    remember_file_hash(file_path, file_hash)
+
+
+def release_upload(filename):
+    """
+    Retire une référence à un upload et supprime le fichier (et ses caches)
+    quand plus aucune session ne l'utilise. Les fichiers absents du registre
+    (envoyés avant la déduplication) sont supprimés directement.
+
+    Returns:
+        Nombre de références restantes (0: fichier supprimé)
+    """
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+
+    with _upload_registry_lock() as conn:
+        row = conn.execute("SELECT refcount FROM uploads WHERE filename = ?", (filename,)).fetchone()
+        if row is not None and row['refcount'] > 1:
+            conn.execute("UPDATE uploads SET refcount = refcount - 1 WHERE filename = ?", (filename,))
+            return row['refcount'] - 1
+
+        conn.execute("DELETE FROM uploads WHERE filename = ?", (filename,))
+        # Fichier déjà supprimé (nettoyage manuel, autre worker): on libère
+        # quand même la ligne du registre et les caches
+        with suppress(FileNotFoundError):
+            os.remove(file_path)
+
+    evict_parse_cache(file_path)
+    return 0
+
+
+def is_registered_upload(filename):
+    """Indique si un upload figure encore au registre (même si le fichier a disparu)."""
+    row = get_state_db().execute("SELECT 1 FROM uploads WHERE filename = ?", (filename,)).fetchone()
+    return row is not None
+
+
+def get_upload_metadata(filename):
+    """Métadonnées /api/upload déjà calculées pour ce contenu, ou None."""
+    row = get_state_db().execute("SELECT metadata FROM uploads WHERE filename = ?", (filename,)).fetchone()
+    return json.loads(row['metadata']) if row and row['metadata'] else None
+
+
+def get_upload_dialect(filename):
+    """Dialecte CSV gardé avec les métadonnées d'un upload, ou None."""
+    row = get_state_db().execute(
+        "SELECT CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.dialect') END AS dialect "
+        "FROM uploads WHERE filename = ?", (filename,)
+    ).fetchone()
+    return json.loads(row['dialect']) if row and row['dialect'] else None
+
+
+def store_upload_dialect(filename, dialect):
+    """Ajoute le dialecte CSV aux métadonnées d'un upload (sans effet hors registre)."""
+    get_state_db().execute(
+        "UPDATE uploads SET metadata = json_set("
+        "CASE WHEN json_valid(metadata) THEN metadata ELSE '{}' END, '$.dialect', json(?)) "
+        "WHERE filename = ?",
+        (json.dumps(dialect), filename)
+    )
+
+
+def store_upload_metadata(filename, metadata):
+    """Garde les métadonnées /api/upload d'un contenu (JSON sérialisé par Flask)."""
+    get_state_db().execute(
+        "UPDATE uploads SET metadata = ? WHERE filename = ?",
+        (app.json.dumps(metadata), filename)
+    )
+
+
+# ============================================================================
+# IMPORT UPSERT (CLÉS DE CONFLIT ET DIFF)
+# Pour les réimports quotidiens d'une même fenêtre de données: les lignes
+# sont envoyées en upsert sur des colonnes clés. Le hash de chaque ligne
+# envoyée est conservé par (table, clés); au réimport, seules les lignes
+# nouvelles ou modifiées sont renvoyées.
+# ============================================================================
+
+def hash_rows(df, key_columns):
+    """
+    Hash 64 bits des colonnes clés et de la ligne entière, par ligne.
+
+    Returns:
+        (hashes des clés, hashes des lignes), tableaux int64
+    """
+    key_hashes = pd.util.hash_pandas_object(df[key_columns], index=False).to_numpy().view('int64')
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy().view('int64')
+    return key_hashes, row_hashes
+
+
+class RowHashStore:
+    """
+    Hashes des lignes déjà envoyées dans une table, pour un jeu de colonnes
+    clés. Chargés une fois par import, mis à jour après chaque batch réussi.
+    """
+
+    def __init__(self, table_name, key_columns):
+        self.key = (table_name, ','.join(key_columns))
+        rows = get_state_db().execute(
+            "SELECT key_hash, row_hash FROM row_hashes WHERE table_name = ? AND key_columns = ?",
+            self.key
+        ).fetchall()
+        self.keys = pd.Index(np.array([row['key_hash'] for row in rows], dtype='int64'))
+        self.rows = np.array([row['row_hash'] for row in rows], dtype='int64')
+
+    def changed(self, key_hashes, row_hashes):
+        """Masque des lignes absentes du store ou dont le contenu a changé."""
+        positions = self.keys.get_indexer(key_hashes)
+        stored = self.rows[positions] if len(self.rows) else np.zeros(len(positions), dtype='int64')
+        return (positions < 0) | (stored != row_hashes)
+
+    def commit(self, key_hashes, row_hashes):
+        """Enregistre les hashes de lignes envoyées avec succès (une transaction)."""
+        conn = get_state_db()
+        conn.execute('BEGIN')
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO row_hashes (table_name, key_columns, key_hash, row_hash) "
+                "VALUES (?, ?, ?, ?)",
+                ((*self.key, int(k), int(r)) for k, r in zip(key_hashes, row_hashes))
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def parse_conflict_keys(value):
+    """Colonnes clés d'un upsert: liste JSON ou texte "col1,col2"."""
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(col).strip() for col in value or [] if str(col).strip()]
+
+
+# ============================================================================
+# CHARGEMENT DIRECT POSTGRES (COPY)
+# Quand DATABASE_URL est configurée, le mode Create peut remplir la table
+# avec COPY ... FROM STDIN au lieu des insert JSON via PostgREST: création
+# de la table et chargement du fichier dans une seule transaction.
+# ============================================================================
+
+# Marqueur NULL du format CSV (les chaînes vides restent des chaînes vides)
+_COPY_CSV_NULL = '\\N'
+
+# Type PostgreSQL (binaire) de chaque type inféré, hors NUMERIC(p,s)
+_COPY_BINARY_TYPES = {
+    'INTEGER': 'int4', 'BIGINT': 'int8', 'DOUBLE PRECISION': 'float8',
+    'DATE': 'date', 'TIME': 'time', 'BOOLEAN': 'bool',
+    'TIMESTAMP': 'timestamp', 'TEXT': 'text',
+}
+
+
+def copy_loader_available():
+    """Le chargeur COPY est utilisable (DATABASE_URL et psycopg présents)."""
+    return bool(DATABASE_URL) and psycopg is not None
+
+
+def choose_loader(data):
+    """
+    Chargeur d'un import Create: "loader" du job ('copy' ou 'postgrest'),
+    sinon COPY dès que la connexion directe est configurée.
+
+    Returns:
+        (chargeur, message d'erreur ou None)
+    """
+    loader = data.get('loader') or ('copy' if copy_loader_available() else 'postgrest')
+
+    if loader not in ('copy', 'postgrest'):
+        return loader, f"Chargeur inconnu: {loader} (copy ou postgrest)"
+    if loader == 'copy' and not copy_loader_available():
+        return loader, "Chargeur COPY indisponible: DATABASE_URL et psycopg requis"
+    return loader, None
+
+
+def _binary_column(series, sql_type):
+    """Valeurs Python d'une colonne pour COPY binaire (None pour les nulles)."""
+    values = series.astype(object).where(series.notna(), None)
+
+    if sql_type == 'DATE':
+        return [date.fromisoformat(v) if isinstance(v, str) else v for v in values]
+    if sql_type == 'TIME':
+        return [time_of_day.fromisoformat(v) if isinstance(v, str) else v for v in values]
+    if sql_type == 'TIMESTAMP':
+        return [v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in values]
+    if sql_type.startswith('NUMERIC'):
+        return [None if v is None else Decimal(repr(float(v))) for v in values]
+    if sql_type == 'TEXT':
+        return [None if v is None else str(v) for v in values]
+    return values.tolist()
+
+
+def _copy_rows(copy, df, inferred_types, copy_format):
+    """Écrit les lignes de df dans un COPY ouvert, par morceaux de COPY_CHUNK_ROWS."""
+    for start in range(0, len(df), COPY_CHUNK_ROWS):
+        chunk = df.iloc[start:start + COPY_CHUNK_ROWS]
+
+        if copy_format == 'binary':
+            columns = [_binary_column(chunk[col], inferred_types[col]['sql_type']) for col in chunk.columns]
+            for row in zip(*columns):
+                copy.write_row(row)
+        else:
+            copy.write(chunk.to_csv(header=False, index=False, na_rep=_COPY_CSV_NULL))
+
+
+def copy_dataframe(conn, table_name, df, inferred_types, ranges=None, copy_format=None):
+    """
+    Charge df (ou ses plages [start, end)) dans public.table_name avec
+    COPY ... FROM STDIN, en CSV ou en binaire, sur une connexion psycopg
+    dont la transaction est gérée par l'appelant.
+
+    Returns:
+        Nombre de lignes copiées
+    """
+    copy_format = copy_format or COPY_FORMAT
+    if ranges is not None:
+        df = pd.concat([df.iloc[start:end] for start, end in ranges]) if ranges else df.iloc[0:0]
+
+    columns = ', '.join(f'"{col}"' for col in df.columns)
+    if copy_format == 'binary':
+        options = 'FORMAT BINARY'
+    else:
+        options = f"FORMAT CSV, NULL '{_COPY_CSV_NULL}'"
+
+    with conn.cursor() as cursor:
+        with cursor.copy(f'COPY public."{table_name}" ({columns}) FROM STDIN ({options})') as copy:
+            if copy_format == 'binary':
+                copy.set_types([
+                    'numeric' if info['sql_type'].startswith('NUMERIC')
+                    else _COPY_BINARY_TYPES[info['sql_type']]
+                    for info in (inferred_types[col] for col in df.columns)
+                ])
+            _copy_rows(copy, df, inferred_types, copy_format)
+
+    return len(df)
+
+
+# ============================================================================
+# IMPORT MULTI-ONGLETS (PROCESSUS PARALLÈLES)
+# Les onglets sont lus et normalisés dans un pool de processus (spawn, pour
+# ne pas hériter des threads et connexions du worker). Chaque onglet revient
+# sous forme de fichier Arrow IPC relu en memory-map, sans pickle du
+# DataFrame. Les insertions suivent l'ordre des onglets demandés, pendant
+# que les onglets suivants sont encore en cours de préparation.
+# ============================================================================
+
+_sheet_pool = None
+_sheet_pool_pid = None
+_sheet_pool_lock = threading.Lock()
+
+
+def get_sheet_pool():
+    """Pool de processus du worker courant (créé au premier import multi-onglets)."""
+    global _sheet_pool, _sheet_pool_pid
+
+    with _sheet_pool_lock:
+        if _sheet_pool is None or _sheet_pool_pid != os.getpid():
+            _sheet_pool = ProcessPoolExecutor(
+                max_workers=SHEET_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _sheet_pool_pid = os.getpid()
+        return _sheet_pool
+
+
+def _reset_sheet_pool():
+    """Abandonne un pool cassé (processus tué): il sera recréé au prochain appel."""
+    global _sheet_pool
+
+    with _sheet_pool_lock:
+        if _sheet_pool is not None:
+            _sheet_pool.shutdown(wait=False, cancel_futures=True)
+        _sheet_pool = None
+
+
+def prepare_sheet(file_path, sheet_name, column_types, split_datetime, column_mapping, output_path):
+    """
+    Exécuté dans un processus du pool: lit et normalise un onglet, puis
+    l'écrit en Arrow IPC dans output_path pour le processus parent.
+
+    Returns:
+        (nombre de lignes, durée en secondes, formats de date retenus)
+    """
+    start = time.perf_counter()
+    date_formats = {}
+
+    df = normalize_dataframe(read_source_file(file_path, sheet_name), column_types, split_datetime, date_formats)
+    if column_mapping:
+        df = rename_columns(df, column_mapping)
+
+    table = _frame_to_arrow(df)
+    with pa.OSFile(output_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return table.num_rows, time.perf_counter() - start, date_formats
+
+
+def _read_arrow_frame(path):
+    """Relit un fichier Arrow IPC en DataFrame (memory-map)."""
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def parse_sheet_names(value, available):
+    """
+    Onglets demandés: "*" (tous), liste JSON ou texte "Janvier,Février".
+    Un texte qui est lui-même le nom d'un onglet (virgule comprise) est
+    gardé tel quel.
+    """
+    if value == '*':
+        return list(available)
+    if isinstance(value, str):
+        value = [value] if value in available else [name.strip() for name in value.split(',')]
+    return [str(name) for name in value or [] if str(name).strip()]
+
+
+def run_import_sheets(data, progress=None):
+    """
+    Import Append de plusieurs onglets d'un classeur vers une même table.
+    Lecture et normalisation en parallèle (SHEET_WORKERS processus), puis
+    insertion dans l'ordre de "sheet_names", avec checkpoints par onglet.
+    Un onglet inexistant est refusé (400) avant toute lecture.
+
+    Returns:
+        (réponse JSON avec le détail par onglet, code HTTP)
+    """
+    filename = data.get('filename')
+    table_name = data.get('table_name')
+    column_types = data.get('column_types', {})
+    column_mapping = data.get('column_mapping', {})
+    split_datetime = data.get('split_datetime', False)
+    resume = bool(data.get('resume', False))
+    sheet_names = data.get('sheet_names')
+
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+
+    if file_path.rsplit('.', 1)[1].lower() not in ('xlsx', 'xls'):
+        return {'error': "L'import multi-onglets est réservé aux fichiers Excel"}, 400
+
+    work_dir = os.path.join(os.path.dirname(STATE_DB_PATH), 'sheets')
+    Path(work_dir).mkdir(parents=True, exist_ok=True)
+
+    try:
+        available = sniff_source_file(file_path, preview_rows=1)['sheets']
+        sheet_names = parse_sheet_names(sheet_names, available)
+        unknown = [name for name in sheet_names if name not in available]
+        if unknown:
+            return {
+                'error': f"Onglet(s) introuvable(s): {', '.join(unknown)}",
+                'sheets': available
+            }, 400
+
+        supabase = get_supabase_client()
+        pool = get_sheet_pool()
+
+        outputs = [os.path.join(work_dir, f"{uuid.uuid4()}.arrow") for _ in sheet_names]
+        futures = [
+            pool.submit(prepare_sheet, file_path, name, column_types, split_datetime, column_mapping, output)
+            for name, output in zip(sheet_names, outputs)
+        ]
+
+        sheets = []
+        batch_count = 0
+
+        def prepare(df):
+            with stage_span('serialize'):
+                return JsonRecords(df)
+
+        try:
+            for name, future, output in zip(sheet_names, futures, outputs):
+                sheet = {'sheet_name': name}
+                sheets.append(sheet)
+
+                try:
+                    _, sheet['parse_seconds'], sheet['date_formats'] = future.result()
+                    record_stage('prepare_sheet', sheet['parse_seconds'])
+                    df = _read_arrow_frame(output)
+                except BrokenProcessPool:
+                    _reset_sheet_pool()
+                    raise
+                except Exception as e:
+                    sheet['error'] = str(e)
+                    continue
+
+                checkpoints = ImportCheckpoints(file_path, name, table_name, resume)
+                result = append_chunks(
+                    supabase, table_name, [df], prepare,
+                    checkpoints, progress, batch_count
+                )
+                del df
+
+                batch_count += result.pop('batches')
+                sheet.update(result)
+                sheet['parse_seconds'] = round(sheet['parse_seconds'], 3)
+        finally:
+            for future in futures:
+                future.cancel()
+            for output in outputs:
+                if os.path.exists(output):
+                    os.remove(output)
+
+        errors = [f"{sheet['sheet_name']}: {error}" for sheet in sheets
+                  for error in (sheet.get('errors') or []) + ([sheet['error']] if 'error' in sheet else [])]
+
+        return {
+            'success': True,
+            'table_name': table_name,
+            'rows_inserted': sum(sheet.get('rows_inserted', 0) for sheet in sheets),
+            'total_rows': sum(sheet.get('total_rows', 0) for sheet in sheets),
+            'rows_skipped': sum(sheet.get('rows_skipped', 0) for sheet in sheets),
+            'resumed': resume,
+            'sheets': sheets,
+            'errors': errors if errors else None
+        }, 200
+
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+
+# ============================================================================
+# FILE DE JOBS D'IMPORT
+# Les imports "async" sont enregistrés dans import_jobs puis exécutés par des
+# threads de fond, hors des timeouts Gunicorn / Nginx de la requête.
+# ============================================================================
+
+_job_worker_lock = threading.Lock()
+_job_worker_pid = None
+
+
+class ImportJobProgress:
+    """Compteurs de progression d'un job, écrits en base au plus une fois par seconde."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.counters = {'rows_parsed': 0, 'rows_inserted': 0, 'batches_inserted': 0, 'batches_failed': 0}
+        self.errors = []
+        self.last_flush = 0.0
+
+    def __call__(self, error=None, **increments):
+        for name, value in increments.items():
+            self.counters[name] += value
+        if error:
+            self.errors.append(error)
+        if time.time() - self.last_flush >= JOB_PROGRESS_INTERVAL:
+            self.flush()
+
+    def flush(self, **fields):
+        """Écrit les compteurs (et d'éventuels champs supplémentaires) en base."""
+        self.last_flush = time.time()
+        values = dict(self.counters, errors=json.dumps(self.errors), updated_at=self.last_flush, **fields)
+        assignments = ', '.join(f"{name} = ?" for name in values)
+        get_state_db().execute(
+            f"UPDATE import_jobs SET {assignments} WHERE id = ?",
+            list(values.values()) + [self.job_id]
+        )
+
+
+def enqueue_import_job(kind, data):
+    """Met un import en file et retourne immédiatement son identifiant (202)."""
+    invalid = _check_import_params(data)
+    if invalid:
+        return jsonify(invalid[0]), invalid[1]
+
+    job_id = str(uuid.uuid4())
+    now = time.time()
+    params = {key: value for key, value in data.items() if key != 'async'}
+
+    get_state_db().execute(
+        "INSERT INTO import_jobs (id, kind, params, status, created_at, updated_at) "
+        "VALUES (?, ?, ?, 'queued', ?, ?)",
+        (job_id, kind, json.dumps(params), now, now)
+    )
+    start_job_worker()
+
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f"/api/jobs/{job_id}"
+    }), 202
+
+
+def _claim_next_job():
+    """Réserve atomiquement le plus ancien job en file (ou None)."""
+    db = get_state_db()
+    now = time.time()
+
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        # Un job sans nouvelles depuis longtemps a perdu son worker: il est
+        # remis en file en mode reprise, puis abandonné après IMPORT_MAX_RETRIES
+        db.execute(
+            "UPDATE import_jobs SET status = 'failed', finished_at = ?, result = ? "
+            "WHERE status = 'running' AND updated_at < ? "
+            "AND COALESCE(json_extract(params, '$.attempts'), 0) >= ?",
+            (now, json.dumps({'error': 'Job interrompu (worker arrêté)'}),
+             now - JOB_STALE_SECONDS, IMPORT_MAX_RETRIES)
+        )
+        db.execute(
+            "UPDATE import_jobs SET status = 'queued', worker = NULL, updated_at = ?, "
+            "params = json_set(params, '$.resume', json('true'), "
+            "'$.attempts', COALESCE(json_extract(params, '$.attempts'), 0) + 1) "
+            "WHERE status = 'running' AND updated_at < ?",
+            (now, now - JOB_STALE_SECONDS)
+        )
+        row = db.execute(
+            "SELECT id, kind, params FROM import_jobs "
+            "WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row:
+            db.execute(
+                "UPDATE import_jobs SET status = 'running', worker = ?, started_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (f"{socket.gethostname()}:{os.getpid()}", now, now, row['id'])
+            )
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+
+    return row
+
+
+def _job_heartbeat(job_id, stop):
+    """
+    Rafraîchit updated_at d'un job tant qu'il tourne: une longue phase sans
+    progression (lecture d'un gros classeur, COPY) ne doit pas le faire
+    passer pour abandonné et relancer par un autre worker.
+    """
+    while not stop.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            get_state_db().execute(
+                "UPDATE import_jobs SET updated_at = ? WHERE id = ? AND status = 'running'",
+                (time.time(), job_id)
+            )
+        except sqlite3.Error:
+            app.logger.exception("Signal de vie du job %s non enregistré", job_id)
+
+
+def _run_job(row):
+    """Exécute un job réservé et enregistre son résultat."""
+    progress = ImportJobProgress(row['id'])
+    start_stage_timer(f"job_{row['kind']}")
+    stop_heartbeat = threading.Event()
+    threading.Thread(
+        target=_job_heartbeat, args=(row['id'], stop_heartbeat),
+        name=f"import-job-heartbeat-{row['id']}", daemon=True
+    ).start()
+
+    try:
+        payload, status = IMPORT_RUNNERS[row['kind']](json.loads(row['params']), progress)
+    except Exception as e:
+        payload, status = {'error': str(e)}, 500
+    finally:
+        stop_heartbeat.set()
+        finish_stage_timer()
+
+    failed = status >= 400 or 'error' in payload
+    progress.flush(
+        status='failed' if failed else 'succeeded',
+        result=json.dumps(payload, default=str),
+        finished_at=time.time()
+    )
+
+
+def _job_worker_loop():
+    """Boucle d'un thread de fond: réserve et exécute les jobs en file."""
+    while True:
+        try:
+            row = _claim_next_job()
+        except Exception:
+            app.logger.exception("File de jobs indisponible")
+            row = None
+
+        if row is None:
+            time.sleep(JOB_POLL_SECONDS)
+            continue
+
+        _run_job(row)
+
+
+def start_job_worker():
+    """Démarre les threads de fond de ce processus (une seule fois par PID)."""
+    global _job_worker_pid
+
+    if _job_worker_pid == os.getpid():
+        return
+
+    with _job_worker_lock:
+        if _job_worker_pid == os.getpid():
+            return
+        _job_worker_pid = os.getpid()
+        for i in range(JOB_WORKERS):
+            threading.Thread(target=_job_worker_loop, name=f"import-job-{i}", daemon=True).start()
+
+
+def get_import_job(job_id):
+    """Retourne l'état d'un job sous forme de dict (ou None)."""
+    row = get_state_db().execute("SELECT * FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+
+    job = dict(row)
+    job.pop('params')
+    job['errors'] = json.loads(job['errors']) if job['errors'] else []
+    job['result'] = json.loads(job['result']) if job['result'] else None
+
+    started = job['started_at']
+    elapsed = ((job['finished_at'] or time.time()) - started) if started else 0
+    job['elapsed_seconds'] = round(elapsed, 3)
+    job['throughput_rows_per_sec'] = round(job['rows_inserted'] / elapsed, 1) if elapsed > 0 else 0
+
+    for field in ('created_at', 'started_at', 'updated_at', 'finished_at'):
+        if job[field]:
+            job[field] = datetime.fromtimestamp(job[field]).isoformat()
+
+    return job
+
+
+@app.before_request
+def ensure_job_worker():
+    """Les threads de fond démarrent avec le premier appel reçu par le worker."""
+    start_job_worker()
+
+
+# ============================================================================
+# CACHE DU SCHÉMA SUPABASE
+# Tables et colonnes chargées par get_all_columns_with_types() (paginé sous
+# le max-rows de PostgREST), servies depuis la mémoire pendant SCHEMA_CACHE_TTL secondes. Invalidé dans
+# tous les workers via cache_versions (création de table, ?refresh=1).
+# ============================================================================
+
+_schema_cache_lock = threading.Lock()
+_schema_cache = {'version': None, 'loaded_at': 0.0, 'tables': None, 'etags': None}
+
+
+def _schema_rows(supabase):
+    """
+    Toutes les lignes de get_all_columns_with_types(), page par page jusqu'à
+    une page incomplète: PostgREST plafonne chaque réponse à max-rows.
+    """
+    rows = []
+    while True:
+        query = supabase.rpc('get_all_columns_with_types', {})
+        # rpc() n'a pas .range() dans postgrest-py 0.15 (supabase 2.3.4):
+        # mêmes paramètres offset/limit que range(début, fin)
+        query.params = query.params.add('offset', len(rows)).add('limit', SCHEMA_PAGE_ROWS)
+        page = query.execute().data or []
+        rows.extend(page)
+        if len(page) < SCHEMA_PAGE_ROWS:
+            return rows
+
+
+def _load_schema(supabase):
+    """Charge toutes les colonnes publiques: {table: [colonnes]} et ETags associés."""
+    tables = {}
+    for row in _schema_rows(supabase):
+        tables.setdefault(row['table_name'], []).append({
+            'column_name': row['column_name'],
+            'data_type': row['data_type'],
+            'is_nullable': row['is_nullable'],
+        })
+
+    etags = {
+        name: hashlib.md5(json.dumps(columns, sort_keys=True).encode()).hexdigest()
+        for name, columns in tables.items()
+    }
+    etags[None] = hashlib.md5(json.dumps(etags, sort_keys=True).encode()).hexdigest()
+    return tables, etags
+
+
+def get_schema(refresh=False):
+    """
+    Retourne (tables, etags) depuis le cache, rechargé si expiré ou invalidé.
+    etags[None] identifie la liste complète, etags[table] les colonnes d'une table.
+    """
+    version = get_cache_version('schema')
+
+    with _schema_cache_lock:
+        fresh = (
+            _schema_cache['tables'] is not None
+            and _schema_cache['version'] == version
+            and time.time() - _schema_cache['loaded_at'] < SCHEMA_CACHE_TTL
+        )
+        if fresh and not refresh:
+            return _schema_cache['tables'], _schema_cache['etags']
+
+        tables, etags = _load_schema(get_supabase_client())
+        _schema_cache.update(version=version, loaded_at=time.time(), tables=tables, etags=etags)
+        return tables, etags
+
+
+def invalidate_schema_cache():
+    """Force le rechargement du schéma au prochain appel, dans tous les workers."""
+    bump_cache_version('schema')
+
+
+def _conditional_response(payload, etag):
+    """Réponse JSON avec ETag: 304 si le client possède déjà cette version."""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+# ============================================================================
+# CACHE DES TEMPLATES
+# Table import_templates gardée en mémoire pendant TEMPLATE_CACHE_TTL
+# secondes, invalidée dans tous les workers à chaque création, modification
+# ou suppression de template.
+# ============================================================================
+
+_template_cache_lock = threading.Lock()
+_template_cache = {'version': None, 'loaded_at': 0.0, 'templates': None}
+
+
+def get_templates(refresh=False):
+    """Retourne tous les templates (plus récents d'abord), depuis le cache."""
+    version = get_cache_version('templates')
+
+    with _template_cache_lock:
+        fresh = (
+            _template_cache['templates'] is not None
+            and _template_cache['version'] == version
+            and time.time() - _template_cache['loaded_at'] < TEMPLATE_CACHE_TTL
+        )
+        if fresh and not refresh:
+            return _template_cache['templates']
+
+        result = get_supabase_client().table('import_templates')\
+            .select('*')\
+            .order('created_at', desc=True)\
+            .execute()
+        _template_cache.update(version=version, loaded_at=time.time(), templates=result.data or [])
+        return _template_cache['templates']
+
+
+def get_template(template_id):
+    """
+    Retourne un template par son id, ou None.
+    Un id absent du cache provoque un rechargement (template créé ailleurs).
+    """
+    for refresh in (False, True):
+        for template in get_templates(refresh):
+            if str(template['id']) == str(template_id):
+                return template
+    return None
+
+
+def invalidate_template_cache():
+    """Force le rechargement des templates au prochain appel, dans tous les workers."""
+    bump_cache_version('templates')
+
+
+# ============================================================================
+# MÉTRIQUES ET TEMPS PAR ÉTAPE
+# Chaque requête (ou job) mesure ses étapes: lecture, normalisation,
+# sérialisation JSON, batches d'insertion. Les durées sont renvoyées dans
+# l'en-tête Server-Timing et agrégées par endpoint et table cible pour
+# /api/metrics (format texte Prometheus). Les agrégats sont tenus dans la
+# base d'état SQLite: tous les workers d'une même machine (même
+# STATE_DB_PATH) sont cumulés. Plusieurs machines exposent chacune les leurs.
+# ============================================================================
+
+_LATENCY_QUANTILES = (0.5, 0.95)
+_ROWS_PER_SECOND_BUCKETS = (100, 1000, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+_BYTES_PER_SECOND_BUCKETS = (1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+_stage_timers = threading.local()
+
+
+class StageTimer:
+    """Durées cumulées par étape d'une requête ou d'un job."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.table = ''
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.stages = OrderedDict()  # étape -> [secondes, occurrences]
+
+    def add(self, stage, seconds):
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+        _metrics.observe_stage(self.endpoint, self.table, stage, seconds)
+
+    def server_timing(self, total):
+        """Valeur de l'en-tête Server-Timing (durées en millisecondes)."""
+        entries = [
+            f'{stage};dur={seconds * 1000:.1f}' + (f';desc="{count}x"' if count > 1 else '')
+            for stage, (seconds, count) in self.stages.items()
+        ]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def _format_labels(labels):
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float('nan')
+
+
+class MetricsRegistry:
+    """
+    Agrégats des requêtes et jobs mesurés, rendus au format Prometheus.
+
+    Les observations sont gardées en mémoire puis écrites dans la base
+    d'état par lots (flush): toutes les METRICS_FLUSH_SECONDS secondes par
+    un thread de fond, dès que METRICS_FLUSH_SIZE sont en attente, et
+    avant chaque rendu. Un flush cumule les compteurs (metric_counters),
+    ajoute les valeurs des résumés (metric_window) et ne garde que les
+    METRICS_WINDOW dernières par série pour les quantiles. /api/metrics
+    lit la base et voit donc tous les workers qui la partagent (au délai
+    de flush près), quel que soit celui qui répond.
+    """
+
+    # nom -> (type, aide, buckets ou None pour un résumé p50/p95)
+    METRICS = {
+        'rms_sync_request_duration_seconds': ('summary', 'Durée des requêtes et jobs', None),
+        'rms_sync_stage_duration_seconds': ('summary', 'Durée des étapes (read, normalize, serialize, insert_batch...)', None),
+        'rms_sync_rows_per_second': ('histogram', 'Débit en lignes par seconde', _ROWS_PER_SECOND_BUCKETS),
+        'rms_sync_bytes_per_second': ('histogram', 'Débit en octets du fichier source par seconde', _BYTES_PER_SECOND_BUCKETS),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []  # (nom, labels JSON, valeur)
+        self.flusher_pid = None
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            self.pending.append((name, json.dumps(labels), value))
+            if self.flusher_pid != os.getpid():
+                # Premier appel de ce processus: flush périodique et à l'arrêt
+                self.flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+                atexit.register(self.flush_quietly)
+
+    def observe_stage(self, endpoint, table, stage, seconds):
+        labels = (('endpoint', endpoint), ('table', table), ('stage', stage))
+        self.observe('rms_sync_stage_duration_seconds', labels, seconds)
+
+    def observe_request(self, timer, seconds):
+        labels = (('endpoint', timer.endpoint), ('table', timer.table))
+        self.observe('rms_sync_request_duration_seconds', labels, seconds)
+        if seconds > 0 and timer.rows:
+            self.observe('rms_sync_rows_per_second', labels, timer.rows / seconds)
+        if seconds > 0 and timer.bytes:
+            self.observe('rms_sync_bytes_per_second', labels, timer.bytes / seconds)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            self.flush_quietly()
+
+    def flush_quietly(self):
+        """flush() sans lever d'erreur SQLite (thread de fond, arrêt, fin de requête)."""
+        try:
+            self.flush()
+        except sqlite3.Error:
+            app.logger.exception("Métriques non enregistrées")
+
+    def maybe_flush(self):
+        """Flush immédiat si METRICS_FLUSH_SIZE observations sont en attente."""
+        if len(self.pending) >= METRICS_FLUSH_SIZE:
+            self.flush_quietly()
+
+    def flush(self):
+        """
+        Écrit les observations en attente dans la base d'état (une
+        transaction) et tronque les fenêtres des résumés.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return
+
+        counters = {}
+        for name, labels, value in pending:
+            fields = [('count', 1), ('sum', value)]
+            buckets = self.METRICS[name][2]
+            if buckets:
+                fields += [(f'le:{bound:g}', 1) for bound in buckets if value <= bound]
+            for field, increment in fields:
+                counters[(name, labels, field)] = counters.get((name, labels, field), 0) + increment
+
+        db = get_state_db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                "INSERT INTO metric_counters (name, labels, field, value) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name, labels, field) DO UPDATE SET value = value + excluded.value",
+                [key + (value,) for key, value in counters.items()]
+            )
+            db.executemany(
+                "INSERT INTO metric_window (name, labels, value) VALUES (?, ?, ?)",
+                [(name, labels, value) for name, labels, value in pending
+                 if self.METRICS[name][0] == 'summary']
+            )
+            db.execute(
+                "DELETE FROM metric_window WHERE id IN ("
+                "SELECT id FROM (SELECT id, ROW_NUMBER() OVER "
+                "(PARTITION BY name, labels ORDER BY id DESC) AS position FROM metric_window) "
+                "WHERE position > ?)",
+                (METRICS_WINDOW,)
+            )
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    def render(self):
+        self.flush()
+        db = get_state_db()
+        counters = {}
+        for row in db.execute("SELECT name, labels, field, value FROM metric_counters"):
+            counters.setdefault(row['name'], {}).setdefault(row['labels'], {})[row['field']] = row['value']
+        windows = {}
+        for row in db.execute("SELECT name, labels, value FROM metric_window"):
+            windows.setdefault((row['name'], row['labels']), []).append(row['value'])
+
+        lines = []
+        for name, (kind, help_text, buckets) in self.METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels_json, fields in sorted(counters.get(name, {}).items()):
+                labels = tuple(tuple(pair) for pair in json.loads(labels_json))
+                if kind == 'summary':
+                    values = windows.get((name, labels_json), [])
+                    for q in _LATENCY_QUANTILES:
+                        lines.append(f"{name}{_format_labels(labels + (('quantile', q),))} {_quantile(values, q):.6g}")
+                else:
+                    for bound in buckets:
+                        count = int(fields.get(f'le:{bound:g}', 0))
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {int(fields['count'])}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {fields['sum']:.6g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {int(fields['count'])}")
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = MetricsRegistry()
+
+
+def start_stage_timer(endpoint):
+    """Démarre la mesure des étapes du thread courant (requête ou job)."""
+    _stage_timers.current = StageTimer(endpoint)
+    return _stage_timers.current
+
+
+def finish_stage_timer():
+    """
+    Termine la mesure du thread courant et l'agrège dans les métriques.
+    Retourne (StageTimer, durée totale) ou (None, None) sans mesure en cours.
+    """
+    timer = getattr(_stage_timers, 'current', None)
+    _stage_timers.current = None
+    if timer is None:
+        return None, None
+
+    seconds = time.perf_counter() - timer.started
+    _metrics.observe_request(timer, seconds)
+    _metrics.maybe_flush()
+    return timer, seconds
+
+
+def annotate_stage_timer(table=None, file_path=None, rows=0):
+    """Renseigne la table cible, la taille du fichier source et les lignes traitées."""
+    timer = getattr(_stage_timers, 'current', None)
+    if timer is None:
+        return
+    if table is not None:
+        timer.table = table
+    if file_path is not None:
+        timer.bytes = os.path.getsize(file_path)
+    timer.rows += rows
+
+
+def record_stage(stage, seconds):
+    """Ajoute une durée déjà mesurée (par exemple un batch) à la mesure en cours."""
+    timer = getattr(_stage_timers, 'current', None)
+    if timer is not None:
+        timer.add(stage, seconds)
+
+
+@contextmanager
+def stage_span(stage):
+    """Mesure le bloc comme une étape de la requête ou du job en cours."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def timed_chunks(chunks, stage='read'):
+    """Itère sur des morceaux en comptant le temps de production de chacun comme une étape."""
+    iterator = iter(chunks)
+    while True:
+        with stage_span(stage):
+            chunk = next(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+@app.before_request
+def start_request_timer():
+    start_stage_timer(request.endpoint or 'unknown')
+
+
+@app.after_request
+def add_server_timing(response):
+    """Ajoute l'en-tête Server-Timing et agrège la requête (hors /api/metrics)."""
+    if request.endpoint in ('metrics', 'static'):
+        _stage_timers.current = None
+        return response
+
+    timer, seconds = finish_stage_timer()
+    if timer is not None:
+        response.headers['Server-Timing'] = timer.server_timing(seconds)
+    return response
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Métriques du processus au format texte Prometheus."""
+    return app.response_class(_metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 # ============================================================================
@@ -381,7 +3821,8 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'version': '2.0'
+        'version': '2.0',
+        'supabase_pool': get_supabase_pool_stats()
     })
 
 
@@ -391,55 +3832,50 @@ def upload_file():
     Upload d'un fichier source.
     Retourne les métadonnées (onglets pour Excel, headers).
     """
-    ensure_upload_folder()
-    
-    if 'file' not in request.files:
-        return jsonify({'error': 'Aucun fichier fourni'}), 400
+    invalid = check_uploaded_file(request.files)
+    if invalid:
+        return jsonify(invalid[0]), invalid[1]
     
     file = request.files['file']
     
-    if file.filename == '':
-        return jsonify({'error': 'Nom de fichier vide'}), 400
-    
-    if not allowed_file(file.filename):
-        return jsonify({'error': 'Type de fichier non autorisé. Formats acceptés: CSV, XLSX, XLS'}), 400
-    
-    # Générer un nom de fichier unique
-    file_ext = file.filename.rsplit('.', 1)[1].lower()
-    unique_filename = f"{uuid.uuid4()}.{file_ext}"
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    
     try:
-        file.save(file_path)
+        # Enregistrer sous le hash du contenu (un contenu déjà reçu est partagé)
+        unique_filename, file_ext = save_uploaded_file(file)
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+        
+        # Métadonnées du fichier: reprises d'un envoi identique si possible
+        content = get_upload_metadata(unique_filename)
+        if content is None or 'sheets' not in content:
+            # En-tête et premières lignes seulement (CSV: déjà reçus en mémoire)
+            sniffed = None
+            if isinstance(file.stream, UploadSpool):
+                sniffed = file.stream.sniff()
+                if sniffed is not None:
+                    remember_csv_dialect(file_path, sniffed['dialect'])
+            if sniffed is None:
+                sniffed = sniff_source_file(file_path)
+            content = {'sheets': sniffed['sheets'], 'headers': []}
+            if sniffed.get('dialect'):
+                # Réutilisé par toutes les lectures suivantes du fichier
+                content['dialect'] = sniffed['dialect']
+                content['encoding'] = sniffed['dialect']['encoding']
+            
+            # Premier onglet par défaut pour Excel
+            if sniffed['preview'] is not None:
+                content['headers'] = sniffed['headers']
+                content['preview'] = dataframe_to_json_records(sniffed['preview'])
+                content['total_rows'] = sniffed['total_rows']
+            
+            store_upload_metadata(unique_filename, content)
+            content = json.loads(app.json.dumps(content))
         
-        # Charger le fichier pour extraire les métadonnées
         metadata = {
             'filename': file.filename,
             'filepath': unique_filename,
             'file_type': file_ext,
-            'sheets': [],
-            'headers': []
+            **content
         }
         
-        if file_ext in ['xlsx', 'xls']:
-            # Lire les onglets Excel
-            xl = pd.ExcelFile(file_path)
-            metadata['sheets'] = xl.sheet_names
-            
-            # Charger le premier onglet par défaut
-            if xl.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=xl.sheet_names[0])
-                metadata['headers'] = list(df.columns)
-                metadata['preview'] = df.head(MAX_PREVIEW_ROWS).to_dict(orient='records')
-                metadata['total_rows'] = len(df)
-        
-        elif file_ext == 'csv':
-            # Lire le CSV
-            df = pd.read_csv(file_path)
-            metadata['headers'] = list(df.columns)
-            metadata['preview'] = df.head(MAX_PREVIEW_ROWS).to_dict(orient='records')
-            metadata['total_rows'] = len(df)
-        
         return jsonify(metadata)
     
     except Exception as e:
@@ -465,27 +3901,21 @@ def preview_file():
         return jsonify({'error': 'Fichier non trouvé'}), 404
     
     try:
-        file_ext = filename.rsplit('.', 1)[1].lower()
-        
-        if file_ext in ['xlsx', 'xls']:
-            # Spécifier l'onglet si fourni
-            if sheet_name:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-            else:
-                df = pd.read_excel(file_path)
-        elif file_ext == 'csv':
-            df = pd.read_csv(file_path)
+        # Charger le fichier (via le cache des fichiers parsés). L'instantané
+        # Arrow n'est écrit qu'au premier appel de /api/preview/page
+        df = read_source_file(file_path, sheet_name)
+        headers = [str(col) for col in df.columns]
         
         # Normaliser les colonnes
-        normalized_cols = {col: snake_case(col) for col in df.columns}
+        normalized_cols = {col: snake_case(col) for col in headers}
         
         return jsonify({
-            'headers': list(df.columns),
+            'headers': headers,
             'normalized_headers': list(normalized_cols.values()),
             'original_to_normalized': normalized_cols,
-            'preview': df.head(MAX_PREVIEW_ROWS).to_dict(orient='records'),
+            'preview': dataframe_to_json_records(df.head(MAX_PREVIEW_ROWS)),
             'total_rows': len(df),
-            'total_columns': len(df.columns)
+            'total_columns': len(headers)
         })
     
     except Exception as e:
@@ -514,32 +3944,96 @@ def process_file():
         return jsonify({'error': 'Fichier non trouvé'}), 404
     
     try:
-        file_ext = filename.rsplit('.', 1)[1].lower()
-        
-        # Charger le fichier
-        if file_ext in ['xlsx', 'xls']:
-            if sheet_name:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-            else:
-                df = pd.read_excel(file_path)
-        elif file_ext == 'csv':
-            df = pd.read_csv(file_path)
-        
-        # Appliquer la normalisation
-        df_normalized = normalize_dataframe(df, column_types, split_datetime)
+        # Normaliser une fois dans un instantané, puis n'en lire que l'aperçu
+        snapshot_path = build_snapshot(file_path, sheet_name, column_types, split_datetime)
+        page, total_processed, columns = read_snapshot_page(snapshot_path)
+        annotate_stage_timer(file_path=file_path, rows=total_processed)
+        metadata = read_snapshot_metadata(snapshot_path)
+        date_formats = metadata['date_formats']
         
         # Préparer les données
-        records = dataframe_to_json_records(df_normalized)
-        
-        return jsonify({
-            'processed_data': records[:MAX_PREVIEW_ROWS],  # Aperçu seulement
-            'total_processed': len(df_normalized),
-            'columns': list(df_normalized.columns),
-            'sample': records[0] if records else None
-        })
+        with stage_span('serialize'):
+            records = dataframe_to_json_records(page)
+            return jsonify({
+                'processed_data': records,  # Aperçu seulement
+                'total_processed': total_processed,
+                'columns': columns,
+                'sample': records[0] if records else None,
+                'date_formats': date_formats,
+                # Types SQL proposés pour le CREATE TABLE, avec leur confiance
+                'inferred_types': metadata['inferred_types'],
+                # Colonnes séparées en date_/heure_, à enregistrer dans un template
+                'datetime_columns': metadata['datetime_columns'],
+                # Règles avec formats explicites, à enregistrer dans un template
+                'column_types': pin_date_formats(column_types, date_formats)
+            })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/preview/page', methods=['POST'])
+def preview_page():
+    """
+    Page d'un fichier, brut ou normalisé, lue depuis son instantané Arrow.
+    
+    Paramètres: filename, sheet_name, offset, limit (max PREVIEW_PAGE_MAX_ROWS),
+    columns (liste), filters ({colonne: valeur}), sort, descending.
+    Avec "normalized": true (défaut), column_types et split_datetime
+    s'appliquent comme pour /api/process.
+    """
+    data = request.get_json()
+    
+    filename = data.get('filename')
+    
+    if not filename:
+        return jsonify({'error': 'Nom de fichier requis'}), 400
+    
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    
+    if not os.path.exists(file_path):
+        return jsonify({'error': 'Fichier non trouvé'}), 404
+    
+    try:
+        offset = max(0, int(data.get('offset', 0)))
+        limit = min(max(1, int(data.get('limit', MAX_PREVIEW_ROWS))), PREVIEW_PAGE_MAX_ROWS)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'offset et limit doivent être des entiers'}), 400
+    
+    try:
+        snapshot_path = build_snapshot(
+            file_path,
+            data.get('sheet_name'),
+            data.get('column_types', {}),
+            data.get('split_datetime', False),
+            data.get('normalized', True)
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    try:
+        page, total_rows, columns = read_snapshot_page(
+            snapshot_path, offset, limit,
+            columns=data.get('columns'),
+            filters=data.get('filters'),
+            sort=data.get('sort'),
+            descending=bool(data.get('descending', False))
+        )
     
+    except (ValueError, pa.ArrowNotImplementedError) as e:
+        # Colonne inconnue ou valeur de filtre incompatible avec la colonne
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'rows': dataframe_to_json_records(page),
+        'offset': offset,
+        'limit': limit,
+        'total_rows': total_rows,
+        'columns': list(page.columns),
+        'all_columns': columns
+    })
 
 
 # ============================================================================
@@ -549,17 +4043,16 @@ def process_file():
 @app.route('/api/tables', methods=['GET'])
 def get_tables():
     """
-    Liste les tables disponibles dans Supabase.
+    Liste les tables disponibles dans Supabase (depuis le cache du schéma).
+    Supporte If-None-Match; ?refresh=1 force le rechargement.
     """
     try:
-        supabase = get_supabase_client()
-        
-        # Utiliser la fonction RPC
-        result = supabase.rpc('get_public_tables').execute()
+        if request.args.get('refresh'):
+            invalidate_schema_cache()
         
-        tables = [row['table_name'] for row in result.data] if result.data else []
+        tables, etags = get_schema()
         
-        return jsonify({'tables': tables})
+        return _conditional_response({'tables': sorted(tables)}, etags[None])
     
     except Exception as e:
         # Si les fonctions RPC ne sont pas encore créées, fallback
@@ -573,20 +4066,19 @@ def get_tables():
 @app.route('/api/tables/<table_name>/columns', methods=['GET'])
 def get_table_columns(table_name):
     """
-    Retourne les colonnes d'une table spécifique.
+    Retourne les colonnes d'une table spécifique (depuis le cache du schéma).
+    Supporte If-None-Match; ?refresh=1 force le rechargement.
     """
     try:
-        supabase = get_supabase_client()
-        
-        # Utiliser la fonction RPC
-        result = supabase.rpc('get_table_columns', {'t_name': table_name}).execute()
+        if request.args.get('refresh'):
+            invalidate_schema_cache()
         
-        columns = result.data if result.data else []
+        tables, etags = get_schema()
         
-        return jsonify({
+        return _conditional_response({
             'table_name': table_name,
-            'columns': columns
-        })
+            'columns': tables.get(table_name, [])
+        }, etags.get(table_name, etags[None]))
     
     except Exception as e:
         return jsonify({
@@ -597,12 +4089,86 @@ def get_table_columns(table_name):
         })
 
 
-@app.route('/api/import/append', methods=['POST'])
-def import_append():
+def append_chunks(supabase, table_name, chunks, prepare, checkpoints, progress=None, first_batch=0):
+    """
+    Insère une suite de morceaux de DataFrame d'un même onglet.
+    prepare(df) retourne les records à insérer; les morceaux déjà couverts
+    par les checkpoints ne sont pas préparés.
+
+    Returns:
+        dict: total_rows, rows_inserted, rows_skipped, batches, errors
+    """
+    def on_batch(inserted, error, start, end):
+        if error is None:
+            checkpoints.commit(start, end)
+        if progress:
+            progress(rows_inserted=inserted, batches_inserted=0 if error else 1,
+                     batches_failed=1 if error else 0, error=error)
+    
+    result = {'total_rows': 0, 'rows_inserted': 0, 'rows_skipped': 0, 'batches': 0, 'errors': []}
+    
+    for df in chunks:
+        if progress:
+            progress(rows_parsed=len(df))
+        annotate_stage_timer(rows=len(df))
+        
+        # Plages de ce morceau restant à insérer (tout, hors reprise)
+        first_row = result['total_rows']
+        ranges = checkpoints.pending(first_row, first_row + len(df))
+        result['total_rows'] += len(df)
+        result['rows_skipped'] += len(df) - sum(end - start for start, end in ranges)
+        if not ranges:
+            continue
+        
+        records = prepare(df)
+        
+        # Insérer dans Supabase (en batches pour éviter les timeouts)
+        inserted, batch_errors, batches = insert_records(
+            supabase, table_name, records, first_batch + result['batches'], on_batch=on_batch,
+            ranges=ranges, first_row=first_row
+        )
+        
+        result['rows_inserted'] += inserted
+        result['batches'] += batches
+        result['errors'].extend(batch_errors)
+    
+    return result
+
+
+def _check_import_params(data):
+    """
+    Vérifie les paramètres communs aux imports.
+    Retourne (réponse d'erreur, code HTTP) ou None si tout est valide.
+    """
+    if not all([data.get('filename'), data.get('table_name')]):
+        return {'error': 'Paramètres requis: filename, table_name'}, 400
+
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], data['filename'])
+
+    if not os.path.exists(file_path):
+        return {'error': 'Fichier non trouvé'}, 404
+
+    return None
+
+
+def run_import_append(data, progress=None):
     """
     Insère les données dans une table existante (mode Append).
+    Utilisé par la route synchrone et par les jobs en arrière-plan.
+    Avec "resume": true, seules les lignes absentes des checkpoints sont envoyées.
+    Avec "sheet_names" (liste, texte "Janvier,Février" ou "*" pour tous),
+    plusieurs onglets sont importés en parallèle (voir run_import_sheets).
+
+    Args:
+        data: Paramètres de la requête d'import
+        progress: Callback optionnel progress(**compteurs) pour le suivi
+
+    Returns:
+        (réponse JSON, code HTTP)
     """
-    data = request.get_json()
+    invalid = _check_import_params(data)
+    if invalid:
+        return invalid
     
     filename = data.get('filename')
     sheet_name = data.get('sheet_name')
@@ -610,71 +4176,81 @@ def import_append():
     column_types = data.get('column_types', {})
     column_mapping = data.get('column_mapping', {})
     split_datetime = data.get('split_datetime', False)
-    
-    if not all([filename, table_name]):
-        return jsonify({'error': 'Paramètres requis: filename, table_name'}), 400
+    streaming = data.get('streaming')  # None: automatique selon la taille
+    resume = bool(data.get('resume', False))
     
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    annotate_stage_timer(table=table_name, file_path=file_path)
     
-    if not os.path.exists(file_path):
-        return jsonify({'error': 'Fichier non trouvé'}), 404
+    if data.get('sheet_names'):
+        return run_import_sheets(data, progress)
+    
+    if streaming is None:
+        streaming = os.path.getsize(file_path) > STREAM_AUTO_BYTES
+    
+    date_formats = {}
+    datetime_columns = []
+    
+    def prepare(df):
+        # Normaliser, appliquer le mapping des colonnes, convertir en records.
+        # Les formats de date et les colonnes datetime déduits du premier
+        # morceau valent pour les suivants.
+        nonlocal split_datetime
+        with stage_span('normalize'):
+            df_normalized = normalize_dataframe(
+                df, pin_date_formats(column_types, date_formats), split_datetime,
+                date_formats, datetime_columns
+            )
+            # Même vide, la liste détectée est figée: pas de nouvelle détection
+            if split_datetime:
+                split_datetime = list(datetime_columns)
+            if column_mapping:
+                df_normalized = rename_columns(df_normalized, column_mapping)
+        with stage_span('serialize'):
+            return JsonRecords(df_normalized)
     
     try:
         supabase = get_supabase_client()
+        checkpoints = ImportCheckpoints(file_path, sheet_name, table_name, resume)
         
-        file_ext = filename.rsplit('.', 1)[1].lower()
-        
-        # Charger le fichier
-        if file_ext in ['xlsx', 'xls']:
-            if sheet_name:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-            else:
-                df = pd.read_excel(file_path)
-        elif file_ext == 'csv':
-            df = pd.read_csv(file_path)
-        
-        # Normaliser
-        df_normalized = normalize_dataframe(df, column_types, split_datetime)
-        
-        # Appliquer le mapping des colonnes
-        if column_mapping:
-            df_normalized = df_normalized.rename(columns=column_mapping)
-        
-        # Convertir en records
-        records = dataframe_to_json_records(df_normalized)
-        
-        # Insérer dans Supabase (en batches pour éviter les timeouts)
-        batch_size = 1000
-        total_inserted = 0
-        errors = []
+        if streaming:
+            # Lire, normaliser et insérer morceau par morceau (mémoire bornée)
+            chunks = timed_chunks(iter_source_chunks(file_path, sheet_name))
+        else:
+            # Charger le fichier (via le cache des fichiers parsés)
+            with stage_span('read'):
+                chunks = [read_source_file(file_path, sheet_name)]
         
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i + batch_size]
-            try:
-                result = supabase.table(table_name).insert(batch).execute()
-                if result.data:
-                    total_inserted += len(result.data)
-            except Exception as e:
-                errors.append(f"Batch {i//batch_size + 1}: {str(e)}")
+        result = append_chunks(supabase, table_name, chunks, prepare, checkpoints, progress)
         
-        return jsonify({
+        return {
             'success': True,
             'table_name': table_name,
-            'rows_inserted': total_inserted,
-            'total_rows': len(records),
-            'errors': errors if errors else None
-        })
+            'rows_inserted': result['rows_inserted'],
+            'total_rows': result['total_rows'],
+            'rows_skipped': result['rows_skipped'],
+            'resumed': resume,
+            'streaming': bool(streaming),
+            'date_formats': date_formats,
+            'datetime_columns': datetime_columns,
+            'errors': result['errors'] if result['errors'] else None
+        }, 200
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return {'error': str(e)}, 500
 
 
-@app.route('/api/import/create', methods=['POST'])
-def import_create():
+def run_import_create(data, progress=None):
     """
     Crée une nouvelle table et insère les données (mode Create).
+    Utilisé par la route synchrone et par les jobs en arrière-plan.
+
+    Returns:
+        (réponse JSON, code HTTP)
     """
-    data = request.get_json()
+    invalid = _check_import_params(data)
+    if invalid:
+        return invalid
     
     filename = data.get('filename')
     sheet_name = data.get('sheet_name')
@@ -682,51 +4258,51 @@ def import_create():
     column_types = data.get('column_types', {})
     column_mapping = data.get('column_mapping', {})
     split_datetime = data.get('split_datetime', False)
+    resume = bool(data.get('resume', False))
     
-    if not all([filename, table_name]):
-        return jsonify({'error': 'Paramètres requis: filename, table_name'}), 400
+    loader, loader_error = choose_loader(data)
+    if loader_error:
+        return {'error': loader_error}, 400
     
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    
-    if not os.path.exists(file_path):
-        return jsonify({'error': 'Fichier non trouvé'}), 404
+    annotate_stage_timer(table=table_name, file_path=file_path)
     
     try:
-        supabase = get_supabase_client()
+        checkpoints = ImportCheckpoints(file_path, sheet_name, table_name, resume)
         
-        file_ext = filename.rsplit('.', 1)[1].lower()
+        def on_batch(inserted, error, start, end):
+            if error is None:
+                checkpoints.commit(start, end)
+            if progress:
+                progress(rows_inserted=inserted, batches_inserted=0 if error else 1,
+                         batches_failed=1 if error else 0, error=error)
         
-        # Charger le fichier
-        if file_ext in ['xlsx', 'xls']:
-            if sheet_name:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-            else:
-                df = pd.read_excel(file_path)
-        elif file_ext == 'csv':
-            df = pd.read_csv(file_path)
+        # Charger le fichier (via le cache des fichiers parsés)
+        with stage_span('read'):
+            df = read_source_file(file_path, sheet_name)
+        if progress:
+            progress(rows_parsed=len(df))
+        annotate_stage_timer(rows=len(df))
         
         # Normaliser
-        df_normalized = normalize_dataframe(df, column_types, split_datetime)
+        date_formats = {}
+        datetime_columns = []
+        with stage_span('normalize'):
+            df_normalized = normalize_dataframe(df, column_types, split_datetime, date_formats, datetime_columns)
         
         # Appliquer le mapping des colonnes
         if column_mapping:
-            df_normalized = df_normalized.rename(columns=column_mapping)
+            df_normalized = rename_columns(df_normalized, column_mapping)
+        
+        # Inférer les types SQL sur toute la colonne (les colonnes forcées
+        # en 'text' restent en TEXT), puis convertir les valeurs en conséquence
+        with stage_span('infer_types'):
+            mapped_types = {column_mapping.get(col, col): rule for col, rule in (column_types or {}).items()}
+            inferred_types = infer_column_types(df_normalized, mapped_types)
+            df_normalized = apply_inferred_types(df_normalized, inferred_types)
         
         # Générer le schéma SQL
-        columns_sql = []
-        for col in df_normalized.columns:
-            dtype = df_normalized[col].dtype
-            
-            if pd.api.types.is_integer_dtype(dtype):
-                sql_type = 'BIGINT'
-            elif pd.api.types.is_float_dtype(dtype):
-                sql_type = 'DOUBLE PRECISION'
-            elif pd.api.types.is_datetime64_any_dtype(dtype):
-                sql_type = 'TIMESTAMP'
-            else:
-                sql_type = 'TEXT'
-            
-            columns_sql.append(f'"{col}" {sql_type}')
+        columns_sql = [f'"{col}" {inferred_types[col]["sql_type"]}' for col in df_normalized.columns]
         
         create_table_sql = f"""
         CREATE TABLE IF NOT EXISTS public."{table_name}" (
@@ -736,37 +4312,272 @@ def import_create():
         );
         """
         
+        if loader == 'copy':
+            # Création et COPY dans une seule transaction: tout ou rien
+            ranges = checkpoints.pending(0, len(df_normalized))
+            with stage_span('copy'), psycopg.connect(DATABASE_URL) as conn:
+                conn.execute(create_table_sql)
+                total_inserted = copy_dataframe(conn, table_name, df_normalized, inferred_types, ranges)
+            invalidate_schema_cache()
+            
+            for start, end in ranges:
+                checkpoints.commit(start, end)
+            if progress:
+                progress(rows_inserted=total_inserted, batches_inserted=1 if ranges else 0)
+            
+            return {
+                'success': True,
+                'table_name': table_name,
+                'loader': loader,
+                'rows_inserted': total_inserted,
+                'total_rows': len(df_normalized),
+                'rows_skipped': len(df_normalized) - total_inserted,
+                'resumed': resume,
+                'date_formats': date_formats,
+                'datetime_columns': datetime_columns,
+                'inferred_types': inferred_types,
+                'schema_created': True
+            }, 200
+        
+        supabase = get_supabase_client()
+        
         # Exécuter la création de table via RPC ou raw query
         # Note: Cela nécessite des droits suffisants
         try:
-            supabase.rpc('execute_sql', {'sql': create_table_sql}).execute()
+            with stage_span('create_table'):
+                supabase.rpc('execute_sql', {'sql': create_table_sql}).execute()
+            invalidate_schema_cache()
         except Exception as sql_error:
             # Si RPC execute_sql n'existe pas, on retourne le SQL à exécuter manuellement
-            return jsonify({
+            return {
                 'warning': 'Impossible de créer la table automatiquement',
                 'sql_script': create_table_sql,
                 'error': str(sql_error),
-                'data_preview': df_normalized.head(10).to_dict(orient='records')
-            })
-        
-        # Insérer les données
-        records = dataframe_to_json_records(df_normalized)
-        batch_size = 1000
-        total_inserted = 0
+                'inferred_types': inferred_types,
+                'data_preview': dataframe_to_json_records(df_normalized.head(10))
+            }, 200
         
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i + batch_size]
-            result = supabase.table(table_name).insert(batch).execute()
-            if result.data:
-                total_inserted += len(result.data)
+        # Insérer les données (en reprise: seulement les plages manquantes)
+        with stage_span('serialize'):
+            records = JsonRecords(df_normalized)
+        ranges = checkpoints.pending(0, len(records))
+        total_inserted, _, _ = insert_records(
+            supabase, table_name, records, stop_on_error=True, on_batch=on_batch, ranges=ranges
+        )
         
-        return jsonify({
+        return {
             'success': True,
             'table_name': table_name,
+            'loader': loader,
             'rows_inserted': total_inserted,
             'total_rows': len(records),
+            'rows_skipped': len(records) - sum(end - start for start, end in ranges),
+            'resumed': resume,
+            'date_formats': date_formats,
+            'datetime_columns': datetime_columns,
+            'inferred_types': inferred_types,
             'schema_created': True
-        })
+        }, 200
+    
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+
+def run_import_upsert(data, progress=None):
+    """
+    Insère ou met à jour les lignes d'une table existante (mode Upsert),
+    sur les colonnes "conflict_keys" (noms dans la table cible, couverts par
+    une contrainte unique). Les doublons de clé d'un même morceau sont
+    réduits à leur dernière occurrence.
+    
+    Avec "diff" (par défaut), seules les lignes dont le hash diffère de
+    celui du dernier envoi sont transmises. "diff": false renvoie tout et
+    rafraîchit les hashes (par exemple après une purge manuelle de la table).
+    
+    Returns:
+        (réponse JSON, code HTTP)
+    """
+    invalid = _check_import_params(data)
+    if invalid:
+        return invalid
+    
+    conflict_keys = parse_conflict_keys(data.get('conflict_keys'))
+    if not conflict_keys:
+        return {'error': 'Paramètre requis: conflict_keys'}, 400
+    
+    filename = data.get('filename')
+    sheet_name = data.get('sheet_name')
+    table_name = data.get('table_name')
+    column_types = data.get('column_types', {})
+    column_mapping = data.get('column_mapping', {})
+    split_datetime = data.get('split_datetime', False)
+    streaming = data.get('streaming')  # None: automatique selon la taille
+    diff = as_bool(data.get('diff', True))
+    
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    
+    if streaming is None:
+        streaming = os.path.getsize(file_path) > STREAM_AUTO_BYTES
+    annotate_stage_timer(table=table_name, file_path=file_path)
+    
+    try:
+        supabase = get_supabase_client()
+        store = RowHashStore(table_name, conflict_keys)
+        
+        if streaming:
+            chunks = timed_chunks(iter_source_chunks(file_path, sheet_name))
+        else:
+            with stage_span('read'):
+                chunks = [read_source_file(file_path, sheet_name)]
+        
+        date_formats = {}
+        datetime_columns = []
+        result = {'total_rows': 0, 'rows_sent': 0, 'rows_unchanged': 0, 'rows_duplicate': 0,
+                  'rows_upserted': 0, 'batches': 0, 'errors': []}
+        
+        for df in chunks:
+            if progress:
+                progress(rows_parsed=len(df))
+            result['total_rows'] += len(df)
+            annotate_stage_timer(rows=len(df))
+            
+            with stage_span('normalize'):
+                df_normalized = normalize_dataframe(
+                    df, pin_date_formats(column_types, date_formats), split_datetime,
+                    date_formats, datetime_columns
+                )
+                # Colonnes datetime du premier morceau figées (même vide)
+                if split_datetime:
+                    split_datetime = list(datetime_columns)
+                if column_mapping:
+                    df_normalized = rename_columns(df_normalized, column_mapping)
+            
+            missing = [col for col in conflict_keys if col not in df_normalized.columns]
+            if missing:
+                return {'error': f"Colonnes clés absentes du fichier: {', '.join(missing)}"}, 400
+            
+            # Dernière occurrence de chaque clé, puis lignes nouvelles ou modifiées
+            with stage_span('diff'):
+                key_hashes, row_hashes = hash_rows(df_normalized, conflict_keys)
+                keep = ~pd.Series(key_hashes).duplicated(keep='last').to_numpy()
+                result['rows_duplicate'] += int((~keep).sum())
+                if diff:
+                    changed = store.changed(key_hashes, row_hashes)
+                    result['rows_unchanged'] += int((keep & ~changed).sum())
+                    keep &= changed
+            
+            key_hashes, row_hashes = key_hashes[keep], row_hashes[keep]
+            with stage_span('serialize'):
+                records = JsonRecords(df_normalized[keep])
+            result['rows_sent'] += len(records)
+            if not records:
+                continue
+            
+            def on_batch(inserted, error, start, end):
+                if error is None:
+                    store.commit(key_hashes[start:end], row_hashes[start:end])
+                if progress:
+                    progress(rows_inserted=inserted, batches_inserted=0 if error else 1,
+                             batches_failed=1 if error else 0, error=error)
+            
+            inserted, batch_errors, batches = insert_records(
+                supabase, table_name, records, result['batches'], on_batch=on_batch,
+                on_conflict=','.join(conflict_keys)
+            )
+            result['rows_upserted'] += inserted
+            result['batches'] += batches
+            result['errors'].extend(batch_errors)
+        
+        return {
+            'success': True,
+            'table_name': table_name,
+            'conflict_keys': conflict_keys,
+            'diff': diff,
+            'rows_upserted': result['rows_upserted'],
+            'rows_sent': result['rows_sent'],
+            'rows_unchanged': result['rows_unchanged'],
+            'rows_duplicate': result['rows_duplicate'],
+            'total_rows': result['total_rows'],
+            'streaming': bool(streaming),
+            'date_formats': date_formats,
+            'datetime_columns': datetime_columns,
+            'errors': result['errors'] if result['errors'] else None
+        }, 200
+    
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+
+IMPORT_RUNNERS = {
+    'append': run_import_append,
+    'create': run_import_create,
+    'upsert': run_import_upsert,
+}
+
+
+@app.route('/api/import/append', methods=['POST'])
+def import_append():
+    """
+    Insère les données dans une table existante (mode Append).
+    Avec "async": true, l'import est mis en file et un job_id est retourné.
+    """
+    data = request.get_json()
+    
+    if data.get('async'):
+        return enqueue_import_job('append', data)
+    
+    payload, status = run_import_append(data)
+    return jsonify(payload), status
+
+
+@app.route('/api/import/create', methods=['POST'])
+def import_create():
+    """
+    Crée une nouvelle table et insère les données (mode Create).
+    Avec "async": true, l'import est mis en file et un job_id est retourné.
+    """
+    data = request.get_json()
+    
+    if data.get('async'):
+        return enqueue_import_job('create', data)
+    
+    payload, status = run_import_create(data)
+    return jsonify(payload), status
+
+
+@app.route('/api/import/upsert', methods=['POST'])
+def import_upsert():
+    """
+    Insère ou met à jour les lignes d'une table existante sur des colonnes
+    clés (mode Upsert), en n'envoyant que les lignes modifiées.
+    Avec "async": true, l'import est mis en file et un job_id est retourné.
+    """
+    data = request.get_json()
+    
+    if data.get('async'):
+        return enqueue_import_job('upsert', data)
+    
+    payload, status = run_import_upsert(data)
+    return jsonify(payload), status
+
+
+# ============================================================================
+# ROUTES API - JOBS
+# ============================================================================
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Retourne l'état d'un job d'import: lignes lues, batches insérés,
+    débit et erreurs.
+    """
+    try:
+        job = get_import_job(job_id)
+        
+        if job is None:
+            return jsonify({'error': 'Job non trouvé'}), 404
+        
+        return jsonify(job)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -779,17 +4590,10 @@ def import_create():
 @app.route('/api/templates', methods=['GET'])
 def list_templates():
     """
-    Liste tous les templates disponibles.
+    Liste tous les templates disponibles (depuis le cache des templates).
     """
     try:
-        supabase = get_supabase_client()
-        
-        result = supabase.table('import_templates')\
-            .select('*')\
-            .order('created_at', desc=True)\
-            .execute()
-        
-        return jsonify({'templates': result.data})
+        return jsonify({'templates': get_templates()})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -819,10 +4623,15 @@ def create_template():
             'column_mapping': data['column_mapping'],
             'column_types': data['column_types']
         }
+        if data.get('conflict_keys'):
+            template_data['conflict_keys'] = parse_conflict_keys(data['conflict_keys'])
+        if data.get('datetime_columns'):
+            template_data['datetime_columns'] = data['datetime_columns']
         
         result = supabase.table('import_templates')\
             .insert(template_data)\
             .execute()
+        invalidate_template_cache()
         
         return jsonify({
             'success': True,
@@ -850,6 +4659,8 @@ def update_template(template_id):
             'sheet_name': data.get('sheet_name'),
             'column_mapping': data.get('column_mapping'),
             'column_types': data.get('column_types'),
+            'conflict_keys': parse_conflict_keys(data['conflict_keys']) if 'conflict_keys' in data else None,
+            'datetime_columns': data.get('datetime_columns'),
             'updated_at': datetime.now().isoformat()
         }
         
@@ -860,6 +4671,7 @@ def update_template(template_id):
             .update(update_data)\
             .eq('id', template_id)\
             .execute()
+        invalidate_template_cache()
         
         return jsonify({
             'success': True,
@@ -882,6 +4694,7 @@ def delete_template(template_id):
             .delete()\
             .eq('id', template_id)\
             .execute()
+        invalidate_template_cache()
         
         return jsonify({'success': True})
     
@@ -903,19 +4716,12 @@ def apply_template(template_id):
         return jsonify({'error': 'Nom de fichier requis'}), 400
     
     try:
-        supabase = get_supabase_client()
-        
-        # Récupérer le template
-        result = supabase.table('import_templates')\
-            .select('*')\
-            .eq('id', template_id)\
-            .execute()
+        # Récupérer le template (depuis le cache)
+        template = get_template(template_id)
         
-        if not result.data:
+        if template is None:
             return jsonify({'error': 'Template non trouvé'}), 404
         
-        template = result.data[0]
-        
         # Retourner la configuration du template pour l'interface
         return jsonify({
             'template': template,
@@ -923,6 +4729,7 @@ def apply_template(template_id):
             'sheet_name': sheet_name or template.get('sheet_name'),
             'column_mapping': template['column_mapping'],
             'column_types': template['column_types'],
+            'datetime_columns': template.get('datetime_columns') or [],
             'target_table': template['target_table']
         })
     
@@ -930,6 +4737,78 @@ def apply_template(template_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/templates/<template_id>/import', methods=['POST'])
+def import_with_template(template_id):
+    """
+    Importe un fichier avec la configuration d'un template, en un seul appel.
+    
+    Accepte un JSON {"filename": ...} pour un fichier déjà uploadé, ou un
+    formulaire multipart avec le fichier ("file") et les options en champs.
+    Options: mode ("append" par défaut, "create" ou "upsert"), sheet_name,
+    sheet_names (append multi-onglets), conflict_keys et diff (upsert, clés
+    par défaut celles du template), split_datetime (par défaut: colonnes
+    datetime du template, sans nouvelle détection), streaming, resume, async.
+    """
+    if request.files:
+        invalid = check_uploaded_file(request.files)
+        if invalid:
+            return jsonify(invalid[0]), invalid[1]
+        options = request.form.to_dict()
+    else:
+        options = request.get_json(silent=True) or {}
+    
+    mode = options.get('mode', 'append')
+    if mode not in IMPORT_RUNNERS:
+        return jsonify({'error': f"Mode inconnu: {mode}"}), 400
+    
+    if not request.files and not options.get('filename'):
+        return jsonify({'error': 'Nom de fichier requis'}), 400
+    
+    try:
+        template = get_template(template_id)
+        
+        if template is None:
+            return jsonify({'error': 'Template non trouvé'}), 404
+        
+        filename = options.get('filename')
+        if request.files:
+            filename, _ = save_uploaded_file(request.files['file'])
+        
+        # Colonnes datetime enregistrées dans le template, sinon détection
+        datetime_columns = template.get('datetime_columns') or []
+        split_datetime = as_bool(options.get('split_datetime', bool(datetime_columns)))
+        
+        data = {
+            'filename': filename,
+            'sheet_name': options.get('sheet_name') or template.get('sheet_name'),
+            'table_name': template['target_table'],
+            'column_mapping': template['column_mapping'] or {},
+            'column_types': template['column_types'] or {},
+            'split_datetime': (datetime_columns or True) if split_datetime else False,
+            'resume': as_bool(options.get('resume', False)),
+        }
+        if options.get('streaming') is not None:
+            data['streaming'] = as_bool(options['streaming'])
+        if options.get('sheet_names'):
+            data['sheet_names'] = options['sheet_names']
+        if mode == 'upsert':
+            data['conflict_keys'] = parse_conflict_keys(
+                options.get('conflict_keys') or template.get('conflict_keys')
+            )
+            data['diff'] = as_bool(options.get('diff', True))
+        
+        if as_bool(options.get('async', False)):
+            response, status = enqueue_import_job(mode, data)
+            payload = dict(response.get_json(), filename=filename, template_id=template_id)
+            return jsonify(payload), status
+        
+        payload, status = IMPORT_RUNNERS[mode](data)
+        return jsonify(dict(payload, filename=filename, template_id=template_id)), status
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # ============================================================================
 # ROUTES DE NETTOYAGE
 # ============================================================================
@@ -937,14 +4816,15 @@ def apply_template(template_id):
 @app.route('/api/cleanup/<filename>', methods=['DELETE'])
 def cleanup_file(filename):
     """
-    Supprime un fichier uploadé temporairement.
+    Libère un fichier uploadé temporairement. Le fichier n'est supprimé
+    qu'une fois libéré par toutes les sessions qui l'ont envoyé.
     """
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return jsonify({'success': True})
+        if os.path.exists(file_path) or is_registered_upload(filename):
+            references = release_upload(filename)
+            return jsonify({'success': True, 'deleted': references == 0, 'references': references})
         else:
             return jsonify({'error': 'Fichier non trouvé'}), 404
     except Exception as e:
@@ -974,12 +4854,17 @@ if __name__ == '__main__':
 ║  Endpoints principaux:                                           ║
 ║    - POST /api/upload          : Upload de fichier               ║
 ║    - POST /api/preview         : Prévisualisation                ║
+║    - POST /api/preview/page    : Aperçu paginé (Arrow)           ║
 ║    - POST /api/process         : Traitement ETL                  ║
 ║    - GET  /api/tables          : Liste des tables                ║
 ║    - POST /api/import/append   : Insertion dans table existante  ║
 ║    - POST /api/import/create   : Création + insertion            ║
+║    - POST /api/import/upsert   : Upsert des lignes modifiées     ║
+║    - GET  /api/jobs/<id>       : Suivi d'un import asynchrone    ║
+║    - GET  /api/metrics         : Métriques (Prometheus)          ║
 ║    - GET  /api/templates       : Liste des templates             ║
 ║    - POST /api/templates       : Créer un template               ║
+║    - POST /api/templates/<id>/import : Import via un template    ║
 ║                                                                  ║
 ║  IMPORTANT: Exécutez setup_db.sql dans Supabase Dashboard       ║
 ╚══════════════════════════════════════════════════════════════════╝
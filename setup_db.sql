@@ -19,6 +19,12 @@ CREATE TABLE IF NOT EXISTS public.import_templates (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
 );
 
+-- Colonnes clés du mode Upsert (bases créées avant son ajout)
+ALTER TABLE public.import_templates ADD COLUMN IF NOT EXISTS conflict_keys JSONB;
+
+-- Colonnes date + heure à séparer (split_datetime), sans nouvelle détection
+ALTER TABLE public.import_templates ADD COLUMN IF NOT EXISTS datetime_columns JSONB;
+
 -- ============================================================================
 -- FONCTION: get_public_tables()
 -- Liste toutes les tables du schéma public
@@ -128,6 +134,8 @@ CREATE INDEX IF NOT EXISTS idx_import_templates_target_table
 COMMENT ON TABLE public.import_templates IS 'Stocke les configurations d import réutilisables pour RMS Sync';
 COMMENT ON COLUMN public.import_templates.column_mapping IS 'Mapping JSON { "col_source": "col_target" }';
 COMMENT ON COLUMN public.import_templates.column_types IS 'Types JSON { "col_source": "date|numeric|text" }';
+COMMENT ON COLUMN public.import_templates.conflict_keys IS 'Colonnes clés JSON [ "col_target", ... ] du mode Upsert (contrainte unique requise sur la table cible)';
+COMMENT ON COLUMN public.import_templates.datetime_columns IS 'Colonnes JSON [ "col_source", ... ] séparées en date_ / heure_ (noms en snake_case)';
 COMMENT ON FUNCTION public.get_public_tables() IS 'Liste les tables du schéma public pour RMS Sync';
 COMMENT ON FUNCTION public.get_table_columns(t_name TEXT) IS 'Retourne les colonnes d une table spécifique';
 
@@ -0,0 +1,298 @@
+"""
+Configuration pytest et outillage partagé par les tests (et réutilisé par
+benchmark.py): valeurs délicates FR / EN / Excel, exports RMS synthétiques,
+ancienne normalisation cellule par cellule et faux serveur PostgREST.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+# ============================================================================
+# DONNÉES DE TEST
+# ============================================================================
+
+# Valeurs délicates pour les contrôles de parité (FR / EN / Excel)
+NUMBER_SAMPLES = [
+    '1 000,50', '1\xa0000,50 €', '12,5', '12.5', '1,000.50', '1.000,50',
+    '€ 99', '$1,5', '£3', '¥7', '-4,2', '+3', '.5', '5.', '1e3', '1_000',
+    'inf', 'nan', 'NaN', '', '   ', 'abc', '12 %', '1,2,3', '٣', None,
+    np.nan, 0, 42, -7, 3.14, True, False, datetime(2026, 1, 21),
+]
+
+DATE_SAMPLES = [
+    '2026-01-21', '2026-1-5', '21/01/2026', '1/2/2026', '21/01/26', '01/21/2026',
+    '2026/01/21', '21-01-2026', '21.01.2026', '31/02/2026', '29/02/2024',
+    '2026-01-21 10:30:00', '20260121', '0026-01-21', '21/01/0026', '2026-01- 5',
+    ' 21/01/2026 ', '', 'abc', '13/13/2026', None, np.nan, 45000, 45000.75,
+    -10, 0, 1e9, float('inf'), True, datetime(2026, 1, 21, 8, 15),
+    pd.Timestamp('2026-03-01'),
+]
+
+TEXT_SAMPLES = [
+    'Chambre Double', '  Hôtel Étoilé  ', 'Çà et là', 'naïve\tcafé', 'ﬁ ligature',
+    'Ångström', '\x01ctrl\x1f', '', '   ', 'ẞ', '日本語', 'é', None, np.nan,
+    0, 1.0, 1.5, True, datetime(2026, 1, 21), pd.Timestamp('2026-01-21 10:00'),
+]
+
+# Types de colonnes d'un export RMS (noms après snake_case)
+RMS_COLUMN_TYPES = {
+    'date_sejour': 'date', 'date_reservation': 'date', 'prix_ttc': 'numeric',
+    'nuitees': 'numeric', 'type_chambre': 'text', 'code_tarif': 'text',
+}
+
+
+def make_rms_frame(rows, seed=42):
+    """Génère un DataFrame proche d'un export RMS (formats français, devises, accents)."""
+    rng = np.random.default_rng(seed)
+    stay = pd.Timestamp('2026-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    prices = rng.uniform(50, 900, rows).round(2)
+
+    return pd.DataFrame({
+        'Date séjour': stay.strftime('%d/%m/%Y'),
+        'Date réservation': stay.strftime('%Y-%m-%d'),
+        'Prix TTC': [f"{p:,.2f} €".replace(',', ' ').replace('.', ',') for p in prices],
+        'Nuitées': rng.integers(1, 15, rows),
+        'Type chambre': rng.choice(['Double Supérieure', 'Twin Économique', 'Suite Présidentielle'], rows),
+        'Code tarif': rng.choice(['BAR', 'NANR', 'CORP', 'GRP'], rows),
+    })
+
+
+# Variantes réalistes des exports RMS (benchmark par étape, tests)
+MIXED_DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y', '%d.%m.%Y']
+AMOUNT_FORMATS = ['{fr} €', '€ {fr}', '{fr}', '{en}', '$ {en}', '{fr} EUR']
+GUEST_NAMES = ['Élodie Lefèvre', 'François Nguyễn', 'Zoë Müller', 'Jérôme Çelik', 'Ana Peña', 'Søren Åberg']
+
+
+def make_etl_frame(rows, seed=42):
+    """
+    Export RMS plus hétérogène que make_rms_frame: dates de formats mélangés
+    dans une même colonne, montants FR/EN avec devises, horodatages à
+    séparer (split_datetime), texte accentué et cellules vides.
+    """
+    rng = np.random.default_rng(seed)
+    base = make_rms_frame(rows, seed)
+
+    stay = pd.Timestamp('2026-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    formats = rng.integers(0, len(MIXED_DATE_FORMATS), rows)
+    mixed_dates = np.empty(rows, dtype=object)
+    for i, fmt in enumerate(MIXED_DATE_FORMATS):
+        mixed_dates[formats == i] = stay[formats == i].strftime(fmt)
+
+    amounts = rng.uniform(-50, 5000, rows).round(2)
+    styles = rng.integers(0, len(AMOUNT_FORMATS), rows)
+    amount_text = [
+        AMOUNT_FORMATS[style].format(
+            fr=f"{amount:,.2f}".replace(',', ' ').replace('.', ','), en=f"{amount:,.2f}"
+        )
+        for amount, style in zip(amounts, styles)
+    ]
+
+    booked = stay - pd.to_timedelta(rng.integers(0, 180 * 24 * 60, rows), unit='min')
+    empty = rng.random(rows) < 0.05
+
+    base['Date arrivée'] = mixed_dates
+    base['Montant'] = np.where(empty, '', np.array(amount_text, dtype=object))
+    base['Horodatage réservation'] = booked.strftime('%d/%m/%Y %H:%M')
+    base['Client'] = rng.choice(GUEST_NAMES, rows)
+    return base
+
+
+def legacy_normalize(df, column_types):
+    """Référence: l'ancien parcours cellule par cellule (apply)."""
+    df = df.copy()
+    df.columns = [app.snake_case(col) for col in df.columns]
+
+    for col, col_type in column_types.items():
+        if col not in df.columns:
+            continue
+        if col_type == 'date':
+            df[col] = df[col].apply(app.parse_date)
+        elif col_type == 'numeric':
+            df[col] = df[col].apply(app.clean_number)
+        elif col_type == 'text':
+            df[col] = df[col].apply(app.clean_text)
+
+    return df.where(pd.notnull(df), None)
+
+
+# ============================================================================
+# FAUX SERVEUR POSTGREST
+# Simule l'API REST de Supabase en local: chaque insertion coûte une latence
+# fixe plus un coût par ligne, ce qui permet de mesurer le débit hors ligne.
+# Les tests y injectent des erreurs (server.failures) et relisent les lignes
+# reçues (keep_rows). Les fonctions RPC renvoient server.rpc[nom], par pages
+# de server.max_rows lignes au plus.
+# ============================================================================
+
+class FakePostgrestHandler(BaseHTTPRequestHandler):
+    """Répond aux POST /rest/v1/<table> comme PostgREST (return=representation)."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        url = urlsplit(self.path)
+        if url.path.startswith('/rest/v1/rpc/'):
+            self._send_rpc(url.path.rsplit('/', 1)[1], parse_qs(url.query))
+            return
+
+        rows = json.loads(body)
+        rows = rows if isinstance(rows, list) else [rows]
+
+        time.sleep(self.server.latency + self.server.row_cost * len(rows))
+        with self.server.lock:
+            self.server.requests += 1
+            failure = self.server.failures.popleft() if self.server.failures else None
+            if failure is None:
+                self.server.rows_received += len(rows)
+                if self.server.received is not None:
+                    self.server.received.extend(rows)
+
+        if failure is not None:
+            self._send_error(failure)
+            return
+
+        payload = body if 'return=representation' in self.headers.get('Prefer', '') else b''
+        self.send_response(201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_rpc(self, name, query):
+        """Résultat d'une fonction RPC, avec offset/limit et le plafond max-rows."""
+        with self.server.lock:
+            self.server.requests += 1
+        offset = int(query.get('offset', ['0'])[0])
+        limit = min(int(query.get('limit', [self.server.max_rows])[0]), self.server.max_rows)
+        payload = json.dumps(self.server.rpc[name][offset:offset + limit]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, failure):
+        """
+        Répond par une erreur: un statut HTTP seul (passerelle, corps non JSON)
+        ou un code SQLSTATE (erreur PostgREST en 400, corps JSON).
+        """
+        if isinstance(failure, int):
+            status, payload = failure, b'Service Unavailable'
+        else:
+            status, payload = 400, json.dumps({'code': failure, 'message': f"erreur simulée {failure}"}).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def fake_postgrest(latency=0.05, row_cost=0.00002, keep_rows=False):
+    """
+    Démarre un faux PostgREST local et retourne un client Supabase pointé
+    dessus. Avec keep_rows, les lignes acceptées sont gardées dans
+    server.received. Chaque élément de server.failures (statut HTTP ou code
+    SQLSTATE) fait échouer la requête suivante; None la laisse passer.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakePostgrestHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.row_cost = row_cost
+    server.rows_received = 0
+    server.requests = 0
+    server.received = [] if keep_rows else None
+    server.failures = deque()
+    server.rpc = {}
+    server.max_rows = 1000
+    server.lock = threading.Lock()
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = app._build_supabase_client(f"http://127.0.0.1:{server.server_port}", 'bench.fake.key')
+        yield client, server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def legacy_insert(supabase, table_name, records, batch_size=1000):
+    """Référence: l'ancienne boucle séquentielle à batches fixes."""
+    total_inserted = 0
+    for i in range(0, len(records), batch_size):
+        result = supabase.table(table_name).insert(records[i:i + batch_size]).execute()
+        total_inserted += len(result.data or [])
+    return total_inserted
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+@pytest.fixture
+def rms_frame():
+    """Export RMS synthétique de 5000 lignes."""
+    return make_rms_frame(5000)
+
+
+@pytest.fixture
+def postgrest():
+    """Faux PostgREST sans latence qui garde les lignes reçues: (client, server)."""
+    with fake_postgrest(latency=0, row_cost=0, keep_rows=True) as (client, server):
+        yield client, server
+
+
+@pytest.fixture(scope='session', autouse=True)
+def state_dir(tmp_path_factory):
+    """Uploads, caches et base d'état locale dans un dossier temporaire."""
+    path = tmp_path_factory.mktemp('uploads')
+    app.app.config['UPLOAD_FOLDER'] = str(path)
+    app.STATE_DB_PATH = str(path / '.state' / 'rms_sync.db')
+    return path
+
+
+@pytest.fixture
+def supabase(postgrest, monkeypatch):
+    """Pointe get_supabase_client() sur le faux PostgREST: retourne le serveur."""
+    _, server = postgrest
+    monkeypatch.setenv('SUPABASE_URL', f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setenv('SUPABASE_KEY', 'bench.fake.key')
+    monkeypatch.setattr(app, 'IMPORT_RETRY_BASE_DELAY', 0)
+    return server
+
+
+@pytest.fixture
+def client():
+    """Client de test Flask."""
+    return app.app.test_client()
+
+
+@pytest.fixture
+def write_upload(state_dir):
+    """write_upload(df, name) écrit un CSV dans UPLOAD_FOLDER et retourne son chemin."""
+    def write(df, name):
+        path = state_dir / name
+        df.to_csv(path, index=False)
+        return path
+    return write
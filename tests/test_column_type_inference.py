@@ -0,0 +1,64 @@
+"""
+Inférence du type SQL des colonnes (infer_column_type) : DATE, TIME,
+NUMERIC(p,s), entiers, booléens et repli en TEXT sous le seuil de confiance.
+"""
+
+import pandas as pd
+import pytest
+
+import app
+
+
+def text(values):
+    return pd.Series(values, dtype=object)
+
+
+def test_date_column_carries_its_format():
+    inferred = app.infer_column_type(text(['21/01/2026', '05/02/2026', None]))
+
+    assert inferred['sql_type'] == 'DATE'
+    assert inferred['rule'] == {'type': 'date', 'format': '%d/%m/%Y'}
+    assert inferred['confidence'] == 1.0
+
+
+def test_time_column():
+    inferred = app.infer_column_type(text(['10:30', '23:15:05']))
+
+    assert (inferred['sql_type'], inferred['rule']) == ('TIME', 'time')
+
+
+@pytest.mark.parametrize('values, sql_type', [
+    (['12,50', '1 234,75', '-3,1'], 'NUMERIC(9,2)'),
+    (['1', '2', '3'], 'INTEGER'),
+    (['3000000000', '1'], 'BIGINT'),
+], ids=['decimal', 'integer', 'bigint'])
+def test_numeric_precision_and_scale(values, sql_type):
+    inferred = app.infer_column_type(text(values))
+
+    assert (inferred['sql_type'], inferred['rule']) == (sql_type, 'numeric')
+
+
+def test_boolean_and_leading_zeros():
+    assert app.infer_column_type(text(['oui', 'non', 'Oui']))['sql_type'] == 'BOOLEAN'
+    # Codes à zéros en tête: les convertir en nombre perdrait les zéros
+    assert app.infer_column_type(text(['00123', '00456']))['sql_type'] == 'TEXT'
+
+
+def test_below_the_confidence_threshold_stays_text(monkeypatch):
+    mostly_numbers = text(['1'] * 99 + ['x'])
+
+    inferred = app.infer_column_type(mostly_numbers)
+    assert (inferred['sql_type'], inferred['rule']) == ('TEXT', None)
+    assert inferred['confidence'] == 0.99
+    assert inferred['scores']['NUMERIC'] == 0.99
+
+    monkeypatch.setattr(app, 'TYPE_INFERENCE_MIN_CONFIDENCE', 0.95)
+    inferred = app.infer_column_type(mostly_numbers)
+    assert (inferred['sql_type'], inferred['rule']) == ('INTEGER', 'numeric')
+
+
+def test_explicit_rule_wins():
+    inferred = app.infer_column_type(text(['1', '2']), 'text')
+
+    assert inferred['sql_type'] == 'TEXT'
+    assert inferred['confidence'] == 1.0
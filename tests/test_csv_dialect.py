@@ -0,0 +1,70 @@
+"""
+Détection du dialecte des CSV (encodage, séparateur, guillemets, séparateur
+décimal, lignes avant l'en-tête) et lectures qui le réutilisent.
+"""
+
+import pandas as pd
+import pytest
+
+import app
+
+
+EXPORT_CP1252 = (
+    'Export RMS du 21/01/2026;;\n'
+    'Date séjour;Hôtel;Prix TTC\n'
+    '21/01/2026;Étoile;120,50\n'
+    '22/01/2026;Château;99,00\n'
+    '23/01/2026;Genève;1234,75\n'
+).encode('cp1252')
+
+
+def test_cp1252_semicolon_decimal_comma_and_title_line():
+    assert app.detect_csv_dialect(EXPORT_CP1252) == {
+        'encoding': 'cp1252', 'delimiter': ';', 'quotechar': '"', 'decimal': ',', 'skiprows': 1,
+    }
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['full', 'chunks'])
+def test_reads_use_the_detected_dialect(state_dir, streaming):
+    path = state_dir / 'dialect_cp1252.csv'
+    path.write_bytes(EXPORT_CP1252)
+
+    if streaming:
+        df = pd.concat(app.iter_source_chunks(str(path), chunk_rows=2), ignore_index=True)
+    else:
+        df = app.read_source_file(str(path))
+
+    assert list(df.columns) == ['Date séjour', 'Hôtel', 'Prix TTC']
+    assert df['Hôtel'].tolist() == ['Étoile', 'Château', 'Genève']
+    assert df['Prix TTC'].tolist() == [120.5, 99.0, 1234.75]
+
+
+def test_sniff_counts_rows_after_the_header(state_dir):
+    path = state_dir / 'dialect_sniff.csv'
+    path.write_bytes(EXPORT_CP1252)
+
+    sniffed = app.sniff_source_file(str(path))
+
+    assert sniffed['headers'] == ['Date séjour', 'Hôtel', 'Prix TTC']
+    assert sniffed['total_rows'] == 3
+    assert sniffed['dialect']['skiprows'] == 1
+
+
+@pytest.mark.parametrize('sample, expected', [
+    # Court UTF-8 accentué: chardet seul y voit du MacRoman
+    ('Date séjour;Prix TTC\n21/01/2026;120,50\n'.encode(), {'encoding': 'utf-8', 'delimiter': ';', 'decimal': ','}),
+    ('﻿Code,Montant\nBAR,12.5\nGRP,8.25\n'.encode(), {'encoding': 'utf-8-sig', 'delimiter': ',', 'decimal': '.'}),
+    (b'Code\tMontant\nBAR\t12,5\nGRP\t8,25\n', {'encoding': 'utf-8', 'delimiter': '\t', 'decimal': ','}),
+    (b'Code|Libelle\nBAR|"Tarif, public"\nGRP|Groupe\n', {'encoding': 'utf-8', 'delimiter': '|', 'decimal': '.'}),
+    # Virgules dans des champs entre guillemets: le séparateur reste ';'
+    (b'Client;Adresse\n"Dupont";"1, rue de la Paix"\n"Martin";"2, quai Nord"\n', {'delimiter': ';'}),
+], ids=['utf8-court', 'utf8-bom', 'tabulation', 'pipe', 'guillemets'])
+def test_dialect_variants(sample, expected):
+    dialect = app.detect_csv_dialect(sample)
+    assert {key: dialect[key] for key in expected} == expected
+
+
+def test_truncated_sample_ignores_the_partial_last_line():
+    sample = 'Date;Prix\n21/01/2026;12,5\n22/01/2026;13,5\n23/01/20'.encode()
+    dialect = app.detect_csv_dialect(sample, truncated=True)
+    assert (dialect['delimiter'], dialect['decimal'], dialect['skiprows']) == (';', ',', 0)
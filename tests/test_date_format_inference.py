@@ -0,0 +1,52 @@
+"""
+Inférence du format des dates textuelles : JJ/MM contre MM/JJ, départage par
+l'ordre de DATE_FORMATS et réutilisation du format dans normalize_dataframe.
+"""
+
+import pandas as pd
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('values, expected', [
+    (['01/02/2026', '03/04/2026', '05/13/2026'], '%m/%d/%Y'),
+    (['01/02/2026', '03/04/2026', '13/05/2026'], '%d/%m/%Y'),
+    (['2026-01-02', '2026-03-04'], '%Y-%m-%d'),
+    (['02.01.2026', '04.03.2026'], '%d.%m.%Y'),
+], ids=['mois-jour', 'jour-mois', 'iso', 'points'])
+def test_a_single_day_above_12_decides_the_order(values, expected):
+    assert app.infer_date_format(pd.Series(values)) == expected
+
+
+def test_ambiguous_dates_fall_back_to_the_french_format():
+    ambiguous = pd.Series(['01/02/2026', '03/04/2026', '12/11/2026'])
+
+    assert app.infer_date_format(ambiguous) == '%d/%m/%Y'
+
+
+def test_no_format_for_text_or_empty_columns():
+    assert app.infer_date_format(pd.Series(['Étoile', 'Château'])) is None
+    assert app.infer_date_format(pd.Series([None, ''], dtype=object)) is None
+
+
+def test_normalize_applies_and_reports_the_inferred_format():
+    df = pd.DataFrame({'d': ['01/02/2026', '03/04/2026', '05/13/2026']})
+    formats = {}
+
+    out = app.normalize_dataframe(df, {'d': 'date'}, date_formats=formats)
+
+    assert formats == {'d': '%m/%d/%Y'}
+    assert out['d'].tolist() == ['2026-01-02', '2026-03-04', '2026-05-13']
+
+
+def test_normalize_keeps_a_pinned_format_for_later_chunks():
+    formats = {'d': '%m/%d/%Y'}
+    chunk = pd.DataFrame({'d': ['01/02/2026', '03/04/2026']})
+
+    out = app.normalize_dataframe(
+        chunk, app.pin_date_formats({'d': 'date'}, formats), date_formats=formats
+    )
+
+    assert out['d'].tolist() == ['2026-01-02', '2026-03-04']
+    assert formats == {'d': '%m/%d/%Y'}
@@ -0,0 +1,62 @@
+"""
+Séparation des dates avec heure en date_* / heure_* : split_datetime_series,
+detect_datetime_columns et split_datetime de normalize_dataframe.
+"""
+
+import pandas as pd
+
+import app
+
+
+def test_split_series_mixed_values():
+    series = pd.Series([
+        '21/01/2026 14:30', '2026-01-22T08:05:00', None, '23/01/2026',
+        pd.Timestamp('2026-01-24 09:00'), 45678.5,
+    ], dtype=object)
+
+    dates, times = app.split_datetime_series(series)
+
+    assert dates.tolist() == [
+        '2026-01-21', '2026-01-22', None, '2026-01-23', '2026-01-24', '2025-01-21',
+    ]
+    # Date seule: pas d'heure; date série Excel: minuit
+    assert times.tolist() == ['14:30:00', '08:05:00', None, None, '09:00:00', '00:00:00']
+
+
+def test_detects_only_columns_with_a_time_of_day():
+    df = pd.DataFrame({
+        'arrivee': ['21/01/2026 14:30', '22/01/2026 08:05'],
+        'depart': ['22/01/2026 00:00', '23/01/2026'],
+        'serie': [45678.5, 45679.25],
+        'nom': ['Étoile', 'Château'],
+        'ts': pd.to_datetime(['2026-01-01 10:00', '2026-01-02 00:00']),
+    })
+
+    # depart: toujours minuit; serie: numérique, jamais détectée
+    assert app.detect_datetime_columns(df) == ['arrivee', 'ts']
+
+
+def test_normalize_splits_into_date_and_heure_columns():
+    df = pd.DataFrame({
+        'Arrivée': ['21/01/2026 14:30', '22/01/2026 08:05'],
+        'Départ': ['22/01/2026 00:00', '23/01/2026'],
+    })
+    split = []
+
+    out = app.normalize_dataframe(df, split_datetime=True, datetime_columns=split)
+
+    assert split == ['arrivee']
+    assert list(out.columns) == ['depart', 'date_arrivee', 'heure_arrivee']
+    assert out['date_arrivee'].tolist() == ['2026-01-21', '2026-01-22']
+    assert out['heure_arrivee'].tolist() == ['14:30:00', '08:05:00']
+    assert out['depart'].tolist() == ['22/01/2026 00:00', '23/01/2026']
+
+
+def test_explicit_list_splits_excel_serials():
+    df = pd.DataFrame({'date_sejour': [45678.5, 45679.25], 'nom': ['Étoile', 'Château']})
+
+    out = app.normalize_dataframe(df, split_datetime=['date_sejour'])
+
+    # Colonne déjà préfixée date_: garde son nom pour la partie date
+    assert list(out.columns) == ['nom', 'date_sejour', 'heure_date_sejour']
+    assert out['date_sejour'].tolist() == ['2025-01-21', '2025-01-22']
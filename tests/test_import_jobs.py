@@ -0,0 +1,162 @@
+"""
+Imports asynchrones ("async": true): file de jobs SQLite, suivi via
+/api/jobs/<id>, signal de vie et reprise des jobs abandonnés.
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+import app
+from conftest import make_rms_frame
+
+
+ROWS = 1500
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(app, 'JOB_POLL_SECONDS', 0.05)
+    monkeypatch.setattr(app, 'JOB_PROGRESS_INTERVAL', 0)
+
+
+@pytest.fixture
+def claim(monkeypatch):
+    """
+    File vidée des jobs en attente et threads de fond à l'arrêt: retourne
+    le vrai _claim_next_job, appelé par le test seul.
+    """
+    claim_next_job = app._claim_next_job
+    monkeypatch.setattr(app, '_claim_next_job', lambda: None)
+    app.get_state_db().execute("DELETE FROM import_jobs WHERE status IN ('queued', 'running')")
+    return claim_next_job
+
+
+def _wait_for_job(client, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").get_json()
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.05)
+    pytest.fail(f"job {job_id} toujours {job['status']}")
+
+
+def _insert_job(status, updated_at, **params):
+    job_id = f"test-{time.time_ns()}"
+    app.get_state_db().execute(
+        "INSERT INTO import_jobs (id, kind, params, status, created_at, updated_at) "
+        "VALUES (?, 'append', ?, ?, ?, ?)",
+        (job_id, json.dumps(params), status, updated_at, updated_at)
+    )
+    return job_id
+
+
+def test_async_append_succeeds(client, supabase, write_upload):
+    write_upload(make_rms_frame(ROWS), 'async.csv')
+
+    response = client.post('/api/import/append', json={
+        'filename': 'async.csv', 'table_name': 'reservations', 'async': True
+    })
+    assert response.status_code == 202
+    queued = response.get_json()
+    assert queued['status'] == 'queued'
+    assert queued['status_url'] == f"/api/jobs/{queued['job_id']}"
+
+    job = _wait_for_job(client, queued['job_id'])
+
+    assert job['status'] == 'succeeded'
+    assert job['rows_parsed'] == job['rows_inserted'] == ROWS
+    assert job['errors'] == []
+    assert job['batches_failed'] == 0
+    assert job['result']['rows_inserted'] == ROWS
+    assert job['finished_at'] and job['elapsed_seconds'] >= 0
+    assert supabase.rows_received == ROWS
+
+
+def test_async_append_reports_batch_errors(client, supabase, write_upload, monkeypatch):
+    for name in ('IMPORT_BATCH_SIZE', 'IMPORT_BATCH_MIN_ROWS', 'IMPORT_BATCH_MAX_ROWS'):
+        monkeypatch.setattr(app, name, 500)
+    monkeypatch.setattr(app, 'IMPORT_CONCURRENCY', 1)
+    write_upload(make_rms_frame(ROWS), 'async_errors.csv')
+    supabase.failures.extend([None, '23502'])
+
+    response = client.post('/api/import/append', json={
+        'filename': 'async_errors.csv', 'table_name': 'reservations', 'async': True
+    })
+    job = _wait_for_job(client, response.get_json()['job_id'])
+
+    assert job['status'] == 'succeeded'
+    assert job['rows_inserted'] == ROWS - 500
+    assert job['batches_inserted'] == 2 and job['batches_failed'] == 1
+    assert len(job['errors']) == 1 and job['errors'][0].startswith('Batch 2:')
+    assert job['result']['errors'] == job['errors']
+
+
+def test_async_job_failure_is_recorded(client, supabase, write_upload):
+    write_upload(make_rms_frame(10), 'async_failed.csv')
+
+    response = client.post('/api/import/upsert', json={
+        'filename': 'async_failed.csv', 'table_name': 'reservations',
+        'conflict_keys': 'inconnue', 'async': True
+    })
+    job = _wait_for_job(client, response.get_json()['job_id'])
+
+    assert job['status'] == 'failed'
+    assert 'inconnue' in job['result']['error']
+
+
+def test_unknown_job_and_missing_file(client):
+    assert client.get('/api/jobs/inconnu').status_code == 404
+    response = client.post('/api/import/append', json={
+        'filename': 'absent.csv', 'table_name': 'reservations', 'async': True
+    })
+    assert response.status_code == 404
+
+
+def test_stale_job_is_requeued_then_abandoned(claim):
+    stale = time.time() - app.JOB_STALE_SECONDS - 1
+
+    job_id = _insert_job('running', stale, filename='x.csv', table_name='t')
+    row = claim()
+    assert row['id'] == job_id
+    params = json.loads(row['params'])
+    assert params['resume'] is True and params['attempts'] == 1
+    assert app.get_import_job(job_id)['status'] == 'running'
+
+    job_id = _insert_job('running', stale, filename='x.csv', table_name='t', attempts=app.IMPORT_MAX_RETRIES)
+    assert claim() is None
+    job = app.get_import_job(job_id)
+    assert job['status'] == 'failed'
+    assert job['result'] == {'error': 'Job interrompu (worker arrêté)'}
+
+
+def test_heartbeat_keeps_a_silent_job_alive(claim, monkeypatch):
+    monkeypatch.setattr(app, 'JOB_HEARTBEAT_SECONDS', 0.05)
+    monkeypatch.setattr(app, 'JOB_STALE_SECONDS', 0.5)
+
+    release = threading.Event()
+
+    def silent_runner(data, progress=None):
+        # Longue phase sans appel à progress (lecture d'un gros classeur)
+        release.wait(5)
+        return {'success': True}, 200
+
+    monkeypatch.setitem(app.IMPORT_RUNNERS, 'append', silent_runner)
+    job_id = _insert_job('queued', time.time(), filename='x.csv', table_name='t')
+    row = claim()
+    assert row['id'] == job_id
+
+    runner = threading.Thread(target=app._run_job, args=(row,))
+    runner.start()
+    time.sleep(1.0)
+    try:
+        assert claim() is None
+        assert app.get_import_job(job_id)['status'] == 'running'
+    finally:
+        release.set()
+        runner.join()
+
+    assert app.get_import_job(job_id)['status'] == 'succeeded'
@@ -0,0 +1,73 @@
+"""
+Reprise d'un import interrompu (ImportCheckpoints, "resume": true) contre
+le faux PostgREST: seules les plages non confirmées sont renvoyées.
+"""
+
+import pytest
+
+import app
+from conftest import make_rms_frame
+
+
+ROWS = 2000
+
+
+@pytest.fixture(autouse=True)
+def fixed_batches(monkeypatch):
+    # Batches de 100 lignes, un à la fois: l'échec des 7 derniers est déterministe
+    for name in ('IMPORT_BATCH_SIZE', 'IMPORT_BATCH_MIN_ROWS', 'IMPORT_BATCH_MAX_ROWS'):
+        monkeypatch.setattr(app, name, 100)
+    monkeypatch.setattr(app, 'IMPORT_CONCURRENCY', 1)
+
+
+def _append(client, filename, **params):
+    response = client.post('/api/import/append', json={'filename': filename, 'table_name': 'reservations', **params})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_resume_sends_only_failed_batches(client, supabase, write_upload):
+    write_upload(make_rms_frame(ROWS), 'resume.csv')
+    supabase.failures.extend([None] * 13 + ['23502'] * 7)
+
+    first = _append(client, 'resume.csv')
+    assert first['rows_inserted'] == 1300
+    assert len(first['errors']) == 7
+
+    sent = list(supabase.received)
+    supabase.received.clear()
+    resumed = _append(client, 'resume.csv', resume=True)
+
+    assert resumed['resumed'] is True
+    assert resumed['rows_skipped'] == 1300
+    assert resumed['rows_inserted'] == 700
+    assert resumed['errors'] is None
+    assert len(supabase.received) == 700
+    assert sorted(sent + supabase.received, key=repr) == sorted(
+        app.dataframe_to_json_records(app.normalize_dataframe(make_rms_frame(ROWS), {})), key=repr
+    )
+
+
+def test_resume_after_file_change_sends_everything(client, supabase, write_upload):
+    write_upload(make_rms_frame(ROWS), 'changed.csv')
+    supabase.failures.extend([None] * 13 + ['23502'] * 7)
+    assert _append(client, 'changed.csv')['rows_inserted'] == 1300
+
+    # Même nom, contenu différent: les checkpoints de l'ancien contenu ne valent plus
+    write_upload(make_rms_frame(ROWS, seed=7), 'changed.csv')
+    supabase.received.clear()
+    resumed = _append(client, 'changed.csv', resume=True)
+
+    assert resumed['rows_skipped'] == 0
+    assert resumed['rows_inserted'] == ROWS
+    assert len(supabase.received) == ROWS
+
+
+def test_without_resume_checkpoints_are_reset(client, supabase, write_upload):
+    write_upload(make_rms_frame(ROWS), 'restart.csv')
+    supabase.failures.extend([None] * 13 + ['23502'] * 7)
+    _append(client, 'restart.csv')
+
+    again = _append(client, 'restart.csv')
+    assert again['rows_skipped'] == 0
+    assert again['rows_inserted'] == ROWS
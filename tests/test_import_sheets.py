@@ -0,0 +1,52 @@
+"""
+Import Append multi-onglets: sheet_names en liste, texte "A,B" ou "*", et
+refus (400) des onglets absents du classeur.
+"""
+
+import pandas as pd
+import pytest
+
+import app
+from conftest import make_rms_frame
+
+
+SHEETS = {'Janvier': 30, 'Février': 20, 'Mars, avril': 10}
+
+
+@pytest.fixture(scope='module')
+def workbook(state_dir):
+    with pd.ExcelWriter(state_dir / 'sheets.xlsx', engine='openpyxl') as writer:
+        for seed, (name, rows) in enumerate(SHEETS.items()):
+            make_rms_frame(rows, seed=seed).to_excel(writer, sheet_name=name, index=False)
+    return 'sheets.xlsx'
+
+
+@pytest.mark.parametrize('sheet_names, imported', [
+    ('Janvier,Février', ['Janvier', 'Février']),
+    (' Février , Janvier ', ['Février', 'Janvier']),
+    ('Mars, avril', ['Mars, avril']),
+    (['Mars, avril', 'Janvier'], ['Mars, avril', 'Janvier']),
+    ('*', list(SHEETS)),
+], ids=['texte', 'espaces', 'virgule-dans-le-nom', 'liste', 'tous'])
+def test_sheet_names_forms(client, supabase, workbook, sheet_names, imported):
+    response = client.post('/api/import/append', json={
+        'filename': workbook, 'table_name': 'bench', 'sheet_names': sheet_names,
+    })
+
+    body = response.get_json()
+    assert response.status_code == 200, body
+    assert [sheet['sheet_name'] for sheet in body['sheets']] == imported
+    assert body['rows_inserted'] == sum(SHEETS[name] for name in imported)
+    assert body['errors'] is None
+
+
+def test_unknown_sheet_is_a_bad_request(client, supabase, workbook):
+    response = client.post('/api/import/append', json={
+        'filename': workbook, 'table_name': 'bench', 'sheet_names': 'Janvier,Fevrier',
+    })
+
+    body = response.get_json()
+    assert response.status_code == 400
+    assert body['error'] == 'Onglet(s) introuvable(s): Fevrier'
+    assert body['sheets'] == list(SHEETS)
+    assert supabase.requests == 0
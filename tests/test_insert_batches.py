@@ -0,0 +1,97 @@
+"""
+Insertion par batches (insert_records) contre le faux PostgREST:
+lignes reçues, taille des batches, plages de reprise, relances et erreurs.
+"""
+
+import pytest
+from postgrest.exceptions import APIError
+
+import app
+from conftest import legacy_insert, make_rms_frame
+
+
+ROWS = 3500
+
+
+@pytest.fixture(params=['dicts', 'json'])
+def records(request):
+    df = app.normalize_dataframe(make_rms_frame(ROWS), {'prix_ttc': 'numeric', 'date_sejour': 'date'})
+    if request.param == 'json':
+        return app.JsonRecords(df)
+    return app.dataframe_to_json_records(df)
+
+
+def test_concurrent_insert_matches_legacy(records, postgrest):
+    client, server = postgrest
+
+    rows = records.rows(0, ROWS) if isinstance(records, app.JsonRecords) else records
+    assert legacy_insert(client, 'bench', rows) == ROWS
+    legacy_rows = list(server.received)
+    server.received.clear()
+    server.requests = 0
+
+    inserted, errors, batches = app.insert_records(client, 'bench', records, concurrency=4)
+
+    assert (inserted, errors) == (ROWS, [])
+    assert batches == server.requests
+    assert sorted(server.received, key=repr) == sorted(legacy_rows, key=repr)
+
+
+def test_batch_size_capped_by_json_size(records, postgrest, monkeypatch):
+    client, server = postgrest
+    row_bytes = app._estimate_row_bytes(records)
+    monkeypatch.setattr(app, 'IMPORT_BATCH_TARGET_BYTES', row_bytes * 250)
+
+    inserted, errors, batches = app.insert_records(client, 'bench', records, concurrency=2)
+
+    assert (inserted, errors) == (ROWS, [])
+    assert batches == server.requests == -(-ROWS // 250)
+
+
+def test_data_errors_are_reported_per_batch(records, postgrest):
+    client, server = postgrest
+    server.failures.append('23502')
+
+    inserted, errors, batches = app.insert_records(client, 'bench', records, concurrency=1, first_batch=5)
+
+    assert len(errors) == 1 and errors[0].startswith('Batch 6:')
+    assert inserted == server.rows_received < ROWS
+    assert server.requests == batches
+
+
+def test_stop_on_error_raises(records, postgrest):
+    client, server = postgrest
+    server.failures.append('23502')
+
+    with pytest.raises(APIError):
+        app.insert_records(client, 'bench', records, concurrency=1, stop_on_error=True)
+    assert server.requests == 1
+
+
+def test_ranges_limit_rows_and_batches(records, postgrest):
+    client, server = postgrest
+    ranges = [(0, 10), (1500, 2600)]
+    seen = []
+
+    inserted, errors, _ = app.insert_records(
+        client, 'bench', records, ranges=ranges, first_row=100,
+        on_batch=lambda rows, error, start, end: seen.append((start, end, rows, error))
+    )
+
+    assert (inserted, errors) == (1110, [])
+    assert server.rows_received == 1110
+    for start, end, rows, error in seen:
+        assert error is None and rows == end - start
+        assert any(low + 100 <= start and end <= high + 100 for low, high in ranges)
+    assert sum(end - start for start, end, _, _ in seen) == 1110
+
+
+def test_transient_errors_are_retried(records, postgrest, monkeypatch):
+    client, server = postgrest
+    monkeypatch.setattr(app, 'IMPORT_RETRY_BASE_DELAY', 0)
+    server.failures.extend([503, '40001'])
+
+    inserted, errors, _ = app.insert_records(client, 'bench', records, concurrency=1)
+
+    assert (inserted, errors) == (ROWS, [])
+    assert server.rows_received == ROWS
@@ -0,0 +1,71 @@
+"""
+Sérialisation des batches (JsonRecords.payload): null pour les valeurs
+manquantes, dates en texte, noms de colonnes en double.
+"""
+
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import orjson
+import pandas as pd
+
+import app
+
+
+def test_missing_values_become_null():
+    df = pd.DataFrame({
+        'prix': [120.5, np.nan, 99.0],
+        'nuits': pd.array([1, None, 3], dtype='Int64'),
+        'hotel': ['Étoile', None, np.nan],
+    })
+
+    rows = orjson.loads(app.JsonRecords(df).payload(0, 3))
+
+    assert rows == [
+        {'prix': 120.5, 'nuits': 1, 'hotel': 'Étoile'},
+        {'prix': None, 'nuits': None, 'hotel': None},
+        {'prix': 99.0, 'nuits': 3, 'hotel': None},
+    ]
+
+
+def test_dates_are_serialized_as_text():
+    df = pd.DataFrame({
+        'arrivee': pd.to_datetime(['2026-01-21 14:30', None]),
+        'duree': pd.to_timedelta(['1 days', '2 hours']),
+        'mixte': pd.Series([pd.Timestamp('2026-01-22'), Decimal('1.50')], dtype=object),
+        'jour': [datetime.date(2026, 1, 23), None],
+    })
+
+    rows = orjson.loads(app.JsonRecords(df).payload(0, 2))
+
+    assert rows == [
+        {'arrivee': '2026-01-21 14:30:00', 'duree': '1 days 00:00:00',
+         'mixte': '2026-01-22 00:00:00', 'jour': '2026-01-23'},
+        {'arrivee': None, 'duree': '0 days 02:00:00', 'mixte': '1.50', 'jour': None},
+    ]
+
+
+def test_duplicate_column_names_keep_the_last_value():
+    df = pd.DataFrame([[1, 'a', 2], [3, 'b', 4]], columns=['prix_ttc', 'hotel', 'prix_ttc'])
+
+    records = app.JsonRecords(df)
+
+    # Comme to_dict(orient='records'): la dernière colonne du nom l'emporte
+    assert orjson.loads(records.payload(0, 2)) == [
+        {'prix_ttc': 2, 'hotel': 'a'}, {'prix_ttc': 4, 'hotel': 'b'},
+    ]
+
+
+def test_payload_slices_match_the_dict_rows():
+    df = app.normalize_dataframe(pd.DataFrame({
+        'Prix TTC': ['120,50', '', '1 234,75', 'n/a'],
+        'Date séjour': ['21/01/2026', '22/01/2026', None, '24/01/2026'],
+    }), {'prix_ttc': 'numeric', 'date_sejour': 'date'})
+    records = app.JsonRecords(df)
+
+    assert orjson.loads(records.payload(1, 3)) == records.rows(1, 3) == [
+        {'prix_ttc': None, 'date_sejour': '2026-01-22'},
+        {'prix_ttc': 1234.75, 'date_sejour': None},
+    ]
+    assert records.payload(4, 4) == b'[]'
@@ -0,0 +1,75 @@
+"""
+Métriques: observations gardées en mémoire, écrites par lots dans la base
+d'état (seuil de taille, rendu) et fenêtres des quantiles tronquées.
+"""
+
+import json
+
+import pytest
+
+import app
+
+
+def stored(endpoint):
+    """Compteur 'count' des durées de requête de endpoint dans la base d'état."""
+    labels = json.dumps((('endpoint', endpoint), ('table', 'bench')))
+    row = app.get_state_db().execute(
+        "SELECT value FROM metric_counters WHERE name = ? AND labels = ? AND field = 'count'",
+        ('rms_sync_request_duration_seconds', labels)
+    ).fetchone()
+    return int(row['value']) if row else 0
+
+
+def window(endpoint):
+    labels = json.dumps((('endpoint', endpoint), ('table', 'bench')))
+    return app.get_state_db().execute(
+        "SELECT COUNT(*) FROM metric_window WHERE name = ? AND labels = ?",
+        ('rms_sync_request_duration_seconds', labels)
+    ).fetchone()[0]
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setattr(app, 'METRICS_FLUSH_SECONDS', 3600)
+    monkeypatch.setattr(app, 'METRICS_FLUSH_SIZE', 10)
+    registry = app.MetricsRegistry()
+    yield registry
+    registry.flush()
+
+
+def observe(registry, endpoint, count):
+    timer = app.StageTimer(endpoint)
+    timer.table = 'bench'
+    for _ in range(count):
+        registry.observe_request(timer, 0.01)
+        registry.maybe_flush()
+
+
+def test_requests_are_buffered_until_the_size_threshold(metrics):
+    observe(metrics, 'test_buffer', 9)
+    assert stored('test_buffer') == 0
+    assert len(metrics.pending) == 9
+
+    observe(metrics, 'test_buffer', 1)
+    assert stored('test_buffer') == 10
+    assert metrics.pending == []
+
+
+def test_render_flushes_pending_observations(metrics):
+    observe(metrics, 'test_render', 3)
+
+    text = metrics.render()
+
+    assert stored('test_render') == 3
+    assert 'rms_sync_request_duration_seconds_count{endpoint="test_render",table="bench"} 3' in text
+
+
+def test_flush_trims_each_window(metrics, monkeypatch):
+    monkeypatch.setattr(app, 'METRICS_WINDOW', 4)
+
+    observe(metrics, 'test_window', 10)
+    observe(metrics, 'test_window_other', 3)
+    metrics.flush()
+
+    assert (window('test_window'), window('test_window_other')) == (4, 3)
+    assert stored('test_window') == 10
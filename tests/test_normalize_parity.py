@@ -0,0 +1,57 @@
+"""
+Parité du moteur de normalisation vectorisé avec les fonctions unitaires
+(clean_number, parse_date, clean_text) et l'ancien parcours apply.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+from conftest import DATE_SAMPLES, NUMBER_SAMPLES, RMS_COLUMN_TYPES, TEXT_SAMPLES, legacy_normalize
+
+
+def _same(expected, actual):
+    return expected == actual or (pd.isna(expected) and pd.isna(actual))
+
+
+@pytest.mark.parametrize('samples, scalar, vectorized', [
+    (NUMBER_SAMPLES, app.clean_number, app.clean_number_series),
+    (DATE_SAMPLES, app.parse_date, app.parse_date_series),
+    (TEXT_SAMPLES, app.clean_text, app.clean_text_series),
+], ids=['numeric', 'date', 'text'])
+def test_series_match_scalar_functions(samples, scalar, vectorized):
+    series = pd.Series(samples, dtype=object)
+    expected = series.apply(scalar)
+    actual = vectorized(series)
+
+    mismatches = [
+        (value, exp, act) for value, exp, act in zip(samples, expected, actual)
+        if not _same(exp, act)
+    ]
+    assert mismatches == []
+
+
+TYPED = pd.DataFrame({
+    'entiers': [45000, 1, -3, 106752],
+    'reels': [45000.9, np.nan, 2.5, -0.5],
+    'dates': pd.to_datetime(['2026-01-21 00:00', None, '2025-12-31 23:59', '2000-02-29 12:00']),
+    'vide': [np.nan] * 4,
+})
+
+
+@pytest.mark.parametrize('col_type', ['numeric', 'date', 'text'])
+@pytest.mark.parametrize('col', list(TYPED.columns))
+def test_typed_columns_match_legacy(col, col_type):
+    frame = TYPED[[col]]
+    pd.testing.assert_frame_equal(
+        legacy_normalize(frame, {col: col_type}),
+        app.normalize_dataframe(frame, {col: col_type}),
+    )
+
+
+def test_rms_frame_matches_legacy(rms_frame):
+    pd.testing.assert_frame_equal(
+        legacy_normalize(rms_frame, RMS_COLUMN_TYPES),
+        app.normalize_dataframe(rms_frame, RMS_COLUMN_TYPES),
+    )
@@ -0,0 +1,47 @@
+"""
+Aperçu d'un upload: /api/preview lit le cache des fichiers parsés, et
+l'instantané Arrow n'est écrit qu'à la première page demandée.
+"""
+
+import glob
+
+import app
+from conftest import make_rms_frame
+
+
+ROWS = 250
+
+
+def snapshots(path):
+    return glob.glob(f"{glob.escape(str(path))}.*.snapshot.arrow")
+
+
+def test_preview_reads_the_parse_cache_without_a_snapshot(client, write_upload):
+    path = write_upload(make_rms_frame(ROWS), 'preview_lazy.csv')
+
+    response = client.post('/api/preview', json={'filename': 'preview_lazy.csv'})
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['total_rows'] == ROWS
+    assert len(body['preview']) == app.MAX_PREVIEW_ROWS
+    assert body['headers'][:2] == ['Date séjour', 'Date réservation']
+    assert body['normalized_headers'][:2] == ['date_sejour', 'date_reservation']
+    assert snapshots(path) == []
+
+
+def test_first_page_builds_the_raw_snapshot(client, write_upload):
+    path = write_upload(make_rms_frame(ROWS), 'preview_page.csv')
+    preview = client.post('/api/preview', json={'filename': 'preview_page.csv'}).get_json()
+
+    response = client.post('/api/preview/page', json={
+        'filename': 'preview_page.csv', 'normalized': False, 'offset': 0, 'limit': app.MAX_PREVIEW_ROWS,
+    })
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['total_rows'] == ROWS
+    assert body['all_columns'] == preview['headers']
+    assert len(snapshots(path)) == 1
+    # Pas d'inférence de types pour l'instantané brut
+    assert app.read_snapshot_metadata(snapshots(path)[0])['inferred_types'] == {}
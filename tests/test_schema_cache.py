@@ -0,0 +1,33 @@
+"""
+Chargement du schéma Supabase (get_all_columns_with_types) page par page
+sous le plafond max-rows de PostgREST.
+"""
+
+import pytest
+
+import app
+
+
+def schema_rows(tables, columns):
+    return [
+        {'table_name': f'table_{t:02d}', 'column_name': f'col_{c:03d}',
+         'data_type': 'text', 'is_nullable': 'YES'}
+        for t in range(tables) for c in range(columns)
+    ]
+
+
+@pytest.mark.parametrize('tables, requests', [(25, 3), (20, 3), (3, 1)], ids=['2500', '2000', '300'])
+def test_schema_is_read_past_max_rows(postgrest, tables, requests):
+    client, server = postgrest
+    server.rpc['get_all_columns_with_types'] = schema_rows(tables, 100)
+
+    loaded, etags = app._load_schema(client)
+
+    assert server.requests == requests
+    assert sorted(loaded) == [f'table_{t:02d}' for t in range(tables)]
+    assert all(len(columns) == 100 for columns in loaded.values())
+    assert loaded['table_00'][:2] == [
+        {'column_name': 'col_000', 'data_type': 'text', 'is_nullable': 'YES'},
+        {'column_name': 'col_001', 'data_type': 'text', 'is_nullable': 'YES'},
+    ]
+    assert set(etags) == set(loaded) | {None}
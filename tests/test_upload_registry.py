@@ -0,0 +1,82 @@
+"""
+Déduplication des uploads par hash du contenu et libération par compteur
+de références (/api/upload, /api/cleanup).
+"""
+
+import io
+import os
+
+import app
+
+
+CSV = b'Date sejour;Prix TTC\n21/01/2026;120,50\n22/01/2026;99,00\n'
+
+
+def _upload(client, content, name='export.csv'):
+    response = client.post('/api/upload', data={'file': (io.BytesIO(content), name)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _cached_copies(path):
+    return [name for name in os.listdir(os.path.dirname(path)) if name.startswith(os.path.basename(path) + '.')]
+
+
+def test_identical_uploads_share_one_file(client, state_dir):
+    first = _upload(client, CSV, 'janvier.csv')
+    second = _upload(client, CSV, 'copie.csv')
+
+    assert first['filepath'] == second['filepath']
+    assert second['headers'] == first['headers'] == ['Date sejour', 'Prix TTC']
+    path = state_dir / first['filepath']
+    assert path.exists()
+    assert not [name for name in os.listdir(state_dir) if name.endswith('.upload')]
+
+    app.read_source_file(str(path))
+    response = client.delete(f"/api/cleanup/{first['filepath']}")
+    assert response.get_json() == {'success': True, 'deleted': False, 'references': 1}
+    assert path.exists()
+
+    response = client.delete(f"/api/cleanup/{first['filepath']}")
+    assert response.get_json() == {'success': True, 'deleted': True, 'references': 0}
+    assert not path.exists()
+    assert not app.is_registered_upload(first['filepath'])
+    assert _cached_copies(str(path)) == []
+
+    assert client.delete(f"/api/cleanup/{first['filepath']}").status_code == 404
+
+
+def test_different_content_gets_its_own_file(client):
+    first = _upload(client, CSV)
+    second = _upload(client, CSV + b'23/01/2026;80,00\n')
+
+    assert first['filepath'] != second['filepath']
+    for upload in (first, second):
+        assert client.delete(f"/api/cleanup/{upload['filepath']}").get_json()['deleted']
+
+
+def test_release_when_file_is_already_gone(client, state_dir):
+    upload = _upload(client, b'Code;Nuitees\nBAR;2\n')
+    path = state_dir / upload['filepath']
+    app.read_source_file(str(path))
+    assert _cached_copies(str(path))
+
+    os.remove(path)
+    response = client.delete(f"/api/cleanup/{upload['filepath']}")
+
+    assert response.status_code == 200
+    assert response.get_json()['deleted'] is True
+    assert not app.is_registered_upload(upload['filepath'])
+    assert _cached_copies(str(path)) == []
+
+
+def test_reupload_after_file_loss_restores_it(client, state_dir):
+    content = b'Code;Montant\nGRP;10\n'
+    upload = _upload(client, content)
+    os.remove(state_dir / upload['filepath'])
+
+    again = _upload(client, content)
+
+    assert again['filepath'] == upload['filepath']
+    assert (state_dir / again['filepath']).read_bytes() == content
@@ -0,0 +1,111 @@
+"""
+Réception des uploads en flux (UploadSpool, UploadRequest): fichier écrit
+directement sur disque, hash et métadonnées CSV calculés à la réception.
+"""
+
+import hashlib
+import io
+import os
+
+import pytest
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+import app
+
+
+EXPORT_CP1252 = (
+    'Export RMS du 21/01/2026;;\n'
+    'Date séjour;Hôtel;Prix TTC\n'
+    '21/01/2026;Étoile;120,50\n'
+    '22/01/2026;Château;99,00\n'
+).encode('cp1252')
+
+
+def _upload(client, content, name='export.csv'):
+    return client.post('/api/upload', data={'file': (io.BytesIO(content), name)},
+                       content_type='multipart/form-data')
+
+
+def _spools(state_dir):
+    return [name for name in os.listdir(state_dir) if name.endswith('.upload')]
+
+
+def _cleanup(client, metadata):
+    client.delete(f"/api/cleanup/{metadata['filepath']}")
+
+
+def test_csv_metadata_from_the_received_head(client, state_dir):
+    response = _upload(client, EXPORT_CP1252)
+    metadata = response.get_json()
+
+    assert response.status_code == 200
+    assert metadata['filepath'] == hashlib.sha256(EXPORT_CP1252).hexdigest() + '.csv'
+    assert (state_dir / metadata['filepath']).read_bytes() == EXPORT_CP1252
+    assert metadata['headers'] == ['Date séjour', 'Hôtel', 'Prix TTC']
+    assert metadata['total_rows'] == 2
+    assert metadata['dialect'] == {
+        'encoding': 'cp1252', 'delimiter': ';', 'quotechar': '"', 'decimal': ',', 'skiprows': 1,
+    }
+    assert metadata['preview'][0] == {'Date séjour': '21/01/2026', 'Hôtel': 'Étoile', 'Prix TTC': 120.5}
+    assert _spools(state_dir) == []
+    _cleanup(client, metadata)
+
+
+def test_short_utf8_upload_keeps_its_accents(client):
+    metadata = _upload(client, 'Date séjour;Nuitées\n21/01/2026;2\n'.encode()).get_json()
+
+    assert metadata['encoding'] == 'utf-8'
+    assert metadata['headers'] == ['Date séjour', 'Nuitées']
+    _cleanup(client, metadata)
+
+
+def test_file_larger_than_the_kept_head(client, state_dir, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_HEAD_BYTES', 64)
+    monkeypatch.setattr(app, 'UPLOAD_ENCODING_SAMPLE', 64)
+    content = 'Code;Montant\n'.encode() + b''.join(f'C{i};{i},5\n'.encode() for i in range(5000))
+
+    metadata = _upload(client, content).get_json()
+
+    assert metadata['headers'] == ['Code', 'Montant']
+    assert metadata['total_rows'] == 5000
+    assert metadata['dialect']['decimal'] == ','
+    assert _spools(state_dir) == []
+    _cleanup(client, metadata)
+
+
+def test_upload_over_the_size_limit_with_content_length(client, state_dir, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'MAX_CONTENT_LENGTH', 1024)
+
+    response = _upload(client, b'Code;Montant\n' + b'BAR;12,5\n' * 500)
+
+    assert response.status_code == 413
+    assert _spools(state_dir) == []
+
+
+def test_streamed_upload_over_the_size_limit_removes_the_spool(state_dir, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'MAX_CONTENT_LENGTH', 1024)
+    content = b'Code;Montant\n' + b'BAR;12,5\n' * 500
+
+    # Sans Content-Length (transfert par morceaux): la limite est atteinte
+    # pendant la réception, une fois le spool déjà créé
+    environ = EnvironBuilder(
+        path='/api/upload', method='POST', content_type='multipart/form-data',
+        data={'file': (io.BytesIO(content), 'flux.csv')}
+    ).get_environ()
+    body = environ['wsgi.input'].read()
+    del environ['CONTENT_LENGTH']
+    environ['wsgi.input'] = io.BytesIO(body)
+    environ['wsgi.input_terminated'] = True
+
+    _, status, _ = run_wsgi_app(app.app.wsgi_app, environ)
+
+    assert status.startswith('413')
+    assert _spools(state_dir) == []
+
+
+@pytest.mark.parametrize('name', ['notes.txt', 'script.py'])
+def test_rejected_extensions_are_not_spooled(client, state_dir, name):
+    response = _upload(client, b'hello', name)
+
+    assert response.status_code == 400
+    assert _spools(state_dir) == []
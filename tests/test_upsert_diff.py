@@ -0,0 +1,86 @@
+"""
+Upsert avec diff par hash de ligne (RowHashStore, hash_rows): seules les
+lignes nouvelles ou modifiées depuis le dernier envoi sont renvoyées.
+"""
+
+import pandas as pd
+import pytest
+
+import app
+from conftest import make_rms_frame
+
+
+ROWS = 2000
+
+
+@pytest.fixture
+def bookings():
+    df = make_rms_frame(ROWS)
+    df.insert(0, 'Réservation', range(ROWS))
+    return df
+
+
+def _upsert(client, filename, table, **params):
+    response = client.post('/api/import/upsert', json={
+        'filename': filename, 'table_name': table, 'conflict_keys': 'reservation', **params
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_unchanged_rows_are_skipped(client, supabase, write_upload, bookings):
+    write_upload(bookings, 'upsert_same.csv')
+
+    first = _upsert(client, 'upsert_same.csv', 'upsert_same')
+    assert (first['rows_sent'], first['rows_upserted'], first['rows_unchanged']) == (ROWS, ROWS, 0)
+
+    supabase.received.clear()
+    second = _upsert(client, 'upsert_same.csv', 'upsert_same')
+    assert (second['rows_sent'], second['rows_unchanged']) == (0, ROWS)
+    assert supabase.received == []
+
+    # diff: false renvoie tout
+    forced = _upsert(client, 'upsert_same.csv', 'upsert_same', diff=False)
+    assert (forced['rows_sent'], forced['rows_unchanged']) == (ROWS, 0)
+
+
+def test_changed_and_new_rows_are_sent(client, supabase, write_upload, bookings):
+    write_upload(bookings, 'upsert_v1.csv')
+    _upsert(client, 'upsert_v1.csv', 'upsert_changed')
+
+    updated = bookings.copy()
+    updated.loc[:149, 'Code tarif'] = 'PROMO'
+    extra = make_rms_frame(50, seed=3)
+    extra.insert(0, 'Réservation', range(ROWS, ROWS + 50))
+    write_upload(pd.concat([updated, extra], ignore_index=True), 'upsert_v2.csv')
+
+    supabase.received.clear()
+    second = _upsert(client, 'upsert_v2.csv', 'upsert_changed')
+
+    assert second['total_rows'] == ROWS + 50
+    assert (second['rows_sent'], second['rows_unchanged']) == (200, ROWS - 150)
+    assert sorted(row['reservation'] for row in supabase.received) == \
+        list(range(150)) + list(range(ROWS, ROWS + 50))
+    assert all(row['code_tarif'] == 'PROMO' for row in supabase.received if row['reservation'] < 150)
+
+
+def test_duplicate_keys_keep_last_occurrence(client, supabase, write_upload, bookings):
+    duplicates = bookings.iloc[:100].copy()
+    duplicates['Code tarif'] = 'DERNIER'
+    write_upload(pd.concat([bookings, duplicates], ignore_index=True), 'upsert_dup.csv')
+
+    result = _upsert(client, 'upsert_dup.csv', 'upsert_dup')
+
+    assert result['total_rows'] == ROWS + 100
+    assert result['rows_duplicate'] == 100
+    assert result['rows_sent'] == ROWS
+    assert len(supabase.received) == ROWS
+    assert {row['code_tarif'] for row in supabase.received if row['reservation'] < 100} == {'DERNIER'}
+
+
+def test_missing_conflict_key_is_rejected(client, supabase, write_upload, bookings):
+    write_upload(bookings, 'upsert_nokey.csv')
+    response = client.post('/api/import/upsert', json={
+        'filename': 'upsert_nokey.csv', 'table_name': 'upsert_nokey', 'conflict_keys': 'inconnue'
+    })
+    assert response.status_code == 400